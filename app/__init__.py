@@ -1,12 +1,20 @@
 """Flask application factory."""
 
-from flask import Flask
+import atexit
+import threading
+import time
+
 from config import Config
 
 
 def create_app(config_class=Config):
     """Create and configure the Flask application."""
+    # Imported here so that `python run.py agent` never loads Flask
+    from flask import Flask
+    from app.jsonprovider import FastJSONProvider
+
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     app.config.from_object(config_class)
 
     # Register blueprints
@@ -15,5 +23,105 @@ def create_app(config_class=Config):
 
     app.register_blueprint(dashboard_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
+    instrument_requests(app)
+
+    from app.services.metrics import MetricsCollector
+    collector = MetricsCollector()
+    if app.config.get('METRICS_SHARED_PATH'):
+        if collector._shared is None:
+            collector.set_history_size(app.config['METRICS_HISTORY_SIZE'])
+            collector.use_shared_history(app.config['METRICS_SHARED_PATH'])
+    else:
+        collector.set_history_size(app.config['METRICS_HISTORY_SIZE'])
+    if app.config.get('METRICS_STORE_PATH') and collector._store is None:
+        collector.use_store(app.config['METRICS_STORE_PATH'], {
+            'raw': app.config['METRICS_RETENTION_RAW'],
+            '1m': app.config['METRICS_RETENTION_1M'],
+            '1h': app.config['METRICS_RETENTION_1H'],
+        })
+
+    if app.config['COLLECTORS']:
+        from app.services.collectors import PluginSource, parse_collectors
+        source = PluginSource(parse_collectors(app.config['COLLECTORS'],
+                                               app.config['METRICS_INTERVAL']))
+        collector.set_source(source)
+        app.extensions['collector_source'] = source
+
+    if app.config['ANOMALY_WARMUP'] not in ('background', 'lazy'):
+        raise ValueError("ANOMALY_WARMUP must be 'background' or 'lazy'")
+    if app.config['ANOMALY_WARMUP'] == 'background':
+        # Serve /health right away; scikit-learn loads while it does
+        threading.Thread(target=warm_up_models, name='anomaly-warm-up', daemon=True).start()
+
+    if app.config.get('METRICS_SAMPLER_ENABLED'):
+        start_services(app)
 
     return app
+
+
+def instrument_requests(app):
+    """Record the latency of every request per route.
+
+    Measured until the response object is returned, so a streamed
+    response only counts the time to its first byte.
+    """
+    from flask import g, request
+    from app.services.perf import perf
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+            perf.record(f'http {request.method} {rule}', time.perf_counter() - started)
+        return response
+
+
+def warm_up_models():
+    """Load scikit-learn and the anomaly model snapshot, if there is one."""
+    from app.routes.api import anomaly_detector
+    from app.services.anomaly import warm_up
+
+    warm_up()
+    anomaly_detector.load_snapshot()
+
+
+def start_services(app):
+    """Start background services and register their shutdown hooks."""
+    from app.services.metrics import MetricsCollector
+    from app.services.sampler import MetricsSampler
+    from app.services.wheel import TimerWheel
+
+    source = app.extensions.get('collector_source')
+    if source is None:
+        sampler = MetricsSampler(MetricsCollector(), interval=app.config['METRICS_INTERVAL'])
+    else:
+        # One thread refreshes every plugin at its interval and samples;
+        # readers of shared history leave collection to the writer
+        collector = MetricsCollector()
+        sampler = TimerWheel(app.config['COLLECTOR_TICK'],
+                             budget=app.config['COLLECTOR_TICK_BUDGET'])
+        source.schedule(sampler, paused=lambda: collector.is_reader)
+        sampler.schedule('metrics.sample', app.config['METRICS_INTERVAL'], collector.sample)
+    sampler.start()
+    app.extensions['metrics_sampler'] = sampler
+    atexit.register(stop_services, app)
+
+
+def stop_services(app):
+    """Stop background services started by start_services."""
+    sampler = app.extensions.pop('metrics_sampler', None)
+    if sampler is not None:
+        sampler.stop(timeout=5)
+
+    from app.routes.api import forecast_scheduler, notifier, profiler
+    forecast_scheduler.shutdown()
+    notifier.stop()
+    profiler.stop()
+
+    from app.services.metrics import MetricsCollector
+    MetricsCollector().flush()
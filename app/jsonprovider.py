@@ -0,0 +1,54 @@
+"""JSON provider that encodes responses with orjson when it is installed."""
+
+import math
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+from app.services.perf import perf
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _finite(obj):
+    """``obj`` with NaN and infinities as None and numpy values as lists."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return _finite(obj.tolist())
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default provider with an orjson fast path.
+
+    Output matches the default provider (sorted keys, dates as HTTP
+    dates) except that NaN becomes ``null``, which keeps the payload
+    valid JSON. numpy arrays and scalars are encoded natively. Without
+    orjson, and for indented output (used in debug mode), the standard
+    library encodes instead, with the same NaN and numpy handling.
+    """
+
+    @perf.timed('serialize.json')
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent') is not None:
+            return self._dumps_stdlib(obj, **kwargs)
+        option = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                  | orjson.OPT_PASSTHROUGH_DATETIME)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def _dumps_stdlib(self, obj, **kwargs):
+        try:
+            return super().dumps(obj, allow_nan=False, **kwargs)
+        except (TypeError, ValueError):
+            # Non-finite floats or numpy values: convert them and retry
+            return super().dumps(_finite(obj), **kwargs)
@@ -1,110 +1,674 @@
 """REST API routes."""
 
-from flask import Blueprint, jsonify, current_app
-from app.services.metrics import MetricsCollector
+import socket
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from flask import Blueprint, Response, jsonify, current_app, request, stream_with_context
+from app.services.alerts import AlertEngine, default_rules, parse_rules
+from app.services.broadcast import Broadcaster
+from app.services.cache import CachedResponse, ResponseCache
+from app.services.downsample import METHODS, downsample
+from app.services.encoding import FORMATS, JSON, MIMETYPES, UnsupportedEncoding, encode
+from app.services.exposition import Exposition
+from app.services.hosts import (
+    MAX_RECORD_BYTES, HostRegistry, IngestError, decode_msgpack, decode_ndjson, gunzip,
+)
+from app.services.notify import FileTarget, NotificationDispatcher, WebhookTarget
+from app.services.perf import SamplingProfiler, perf
+from app.services.metrics import (
+    HISTORY_FIELDS, SUMMARY_FIELDS, MetricsCollector, format_timestamp, lists_from_columns,
+    parse_timestamp, rows_from_columns,
+)
 from app.services.anomaly import AnomalyDetector
+from app.services.features import FeaturePipeline
+from app.services.processes import ProcessMonitor
+from app.services.predictor import FORECAST_MODELS, Predictor, forecast_series
+from app.services.scheduler import JobScheduler
+from app.services.streaming import StreamingAnomalyDetector
 
 api_bp = Blueprint('api', __name__)
 
 # Initialize services
 metrics_collector = MetricsCollector()
 anomaly_detector = AnomalyDetector()
+streaming_detector = StreamingAnomalyDetector()
+metrics_collector.add_enricher(streaming_detector.enrich)
+predictor = Predictor()
+forecast_scheduler = JobScheduler()
+alert_engine = AlertEngine()
+notifier = NotificationDispatcher()
+alert_engine.add_listener(notifier.submit)
+broadcaster = Broadcaster()
+response_cache = ResponseCache()
+host_registry = HostRegistry()
+profiler = SamplingProfiler()
+process_monitor = ProcessMonitor()
+
+# Name of the machine this process samples itself; ``host=`` with this
+# name (or no ``host``) selects the local collector
+LOCAL_HOST = socket.gethostname()
+exposition = Exposition(LOCAL_HOST)
+
+# Config of the app the blueprint was last registered on, for work done
+# outside a request (the stream producer runs on the sampling thread)
+_service_config = {}
+# JSON provider of that app, so streamed samples encode like responses
+_service_json = {'provider': None}
+_forecast_state = {'submitted_at': None}
+_SUMMARY_NAMES = {field: name for name, field in SUMMARY_FIELDS.items()}
+
+
+@api_bp.record_once
+def _configure_services(state):
+    """Apply application config to the shared services.
+
+    Runs once per app (on its first registration of the blueprint). The
+    services are process-wide, so the most recently created app's config
+    applies.
+    """
+    config = state.app.config
+    anomaly_detector.refit_interval = config['ANOMALY_REFIT_INTERVAL']
+    anomaly_detector.refit_samples = config['ANOMALY_REFIT_SAMPLES']
+    anomaly_detector.drift_threshold = config['ANOMALY_DRIFT_THRESHOLD']
+    anomaly_detector.background = config['ANOMALY_BACKGROUND_FIT']
+    anomaly_detector.snapshot_path = config['ANOMALY_MODEL_PATH']
+    if not anomaly_detector.snapshot_path and config['METRICS_SHARED_PATH']:
+        # Readers of shared history follow the writer's model through it
+        anomaly_detector.snapshot_path = f"{config['METRICS_SHARED_PATH']}.anomaly.joblib"
+    if config['ANOMALY_FEATURES'] not in ('windowed', 'raw'):
+        raise ValueError("ANOMALY_FEATURES must be 'windowed' or 'raw'")
+    anomaly_detector.set_feature_pipeline(
+        FeaturePipeline(config['ANOMALY_WINDOW_SIZE'])
+        if config['ANOMALY_FEATURES'] == 'windowed' else None)
+    streaming_detector.threshold = config['ANOMALY_STREAMING_THRESHOLD']
+    response_cache.max_entries = config['RESPONSE_CACHE_SIZE']
+    broadcaster.max_subscribers = config['STREAM_MAX_SUBSCRIBERS'] or None
+    predictor.horizon = config['PREDICTION_HORIZON']
+    predictor.confidence = config['PREDICTION_CONFIDENCE']
+    if config['FORECAST_MODEL'] not in FORECAST_MODELS:
+        raise ValueError(f"FORECAST_MODEL must be one of: {', '.join(FORECAST_MODELS)}")
+    forecast_scheduler.max_workers = config['FORECAST_WORKERS']
+    forecast_scheduler.budget = config['FORECAST_BUDGET']
+    hysteresis = config['ALERT_HYSTERESIS']
+    if config['ALERT_RULES']:
+        alert_engine.set_rules(parse_rules(config['ALERT_RULES'], hysteresis))
+    else:
+        alert_engine.set_rules(default_rules(config, hysteresis))
+    notifier.max_queue = config['ALERT_NOTIFY_QUEUE']
+    notifier.batch_size = config['ALERT_NOTIFY_BATCH']
+    notifier.flush_interval = config['ALERT_NOTIFY_INTERVAL']
+    notifier.retries = config['ALERT_NOTIFY_RETRIES']
+    targets = [WebhookTarget(url.strip(), config['ALERT_NOTIFY_TIMEOUT'])
+               for url in config['ALERT_WEBHOOK_URLS'].split(',') if url.strip()]
+    if config['ALERT_NOTIFY_FILE']:
+        targets.append(FileTarget(config['ALERT_NOTIFY_FILE']))
+    notifier.configure(targets)
+    host_registry.capacity = config['METRICS_HISTORY_SIZE']
+    host_registry.max_hosts = config['INGEST_MAX_HOSTS']
+    perf.enabled = config['PERF_ENABLED']
+    profiler.interval = config['PERF_PROFILER_INTERVAL']
+    process_monitor.top_n = config['PROCESS_TOP_N']
+    process_monitor.interval = config['PROCESS_REFRESH_INTERVAL']
+    process_monitor.io = config['PROCESS_IO_ENABLED']
+    _service_config.update(config)
+    _service_json['provider'] = state.app.json
+    metrics_collector.add_listener(_evaluate_alerts)
+    metrics_collector.add_listener(_render_exposition)
+    metrics_collector.add_listener(_refresh_processes)
+    metrics_collector.add_listener(_update_predictor)
+    metrics_collector.add_listener(_schedule_forecasts)
+    metrics_collector.add_listener(_refresh_anomaly_model)
+    metrics_collector.add_listener(_broadcast_sample)
+
+
+class UnknownHost(LookupError):
+    """``host=`` names a host that has not sent any samples."""
+
+
+@api_bp.errorhandler(UnknownHost)
+def _unknown_host(error):
+    return jsonify({'error': f'Unknown host: {error}'}), 404
+
+
+def _requested_host():
+    """The ingested series named by ``host=``, or None for this machine."""
+    host = request.args.get('host')
+    if host is None or host == LOCAL_HOST:
+        return None
+    series = host_registry.get(host)
+    if series is None:
+        raise UnknownHost(host)
+    return series
 
 
 @api_bp.route('/metrics')
 def get_metrics():
-    """Get current system metrics."""
-    metrics = metrics_collector.get_current_metrics()
+    """Get the latest sampled system metrics (``?host=`` for another host)."""
+    series = _requested_host()
+    if series is not None:
+        return jsonify(series.get_latest())
+    metrics = metrics_collector.get_latest()
     return jsonify(metrics)
 
 
 @api_bp.route('/metrics/history')
 def get_metrics_history():
-    """Get historical metrics data."""
-    history = metrics_collector.get_history()
-    return jsonify(history)
+    """Get historical metrics data.
+
+    Optional query parameters:
+        from, to: Time range as epoch seconds or ISO 8601. Ranges reaching
+            past the in-memory history are served from the persistent
+            store's coarsest adequate tier.
+        metrics: Comma-separated fields to return; rows are then flat.
+        max_points: Downsample to at most this many rows.
+        downsample: ``lttb`` (default) or ``minmax``.
+        host: Ingested host to read instead of this machine; its range is
+            limited to the in-memory history.
+        layout: ``rows`` (default), a list of samples, or ``columns``,
+            one list per field with epoch-second timestamps.
+
+    The encoding is negotiated from ``Accept`` (or ``?format=``): JSON,
+    msgpack or, for the columnar layout, Arrow IPC.
+    """
+    series = _requested_host()
+    layout = request.args.get('layout', 'rows')
+    if layout not in ('rows', 'columns'):
+        return jsonify({'error': 'layout must be rows or columns'}), 400
+    to_layout = lists_from_columns if layout == 'columns' else rows_from_columns
+    if not request.args.keys() - {'host', 'layout', 'format'}:
+        if series is not None:
+            return _cached_json(('history', layout, series.host),
+                                lambda: (to_layout(series.get_window()), None), series)
+        return _cached_json(('history', layout),
+                            lambda: (to_layout(metrics_collector.get_window(copy=True)), None))
+
+    try:
+        start = _parse_time(request.args.get('from'))
+        end = _parse_time(request.args.get('to'))
+        fields = _parse_fields(request.args.get('metrics'))
+        max_points = request.args.get('max_points', type=int)
+        method = request.args.get('downsample', 'lttb')
+        if max_points is not None and max_points < 1:
+            raise ValueError('max_points must be positive')
+        if method not in METHODS:
+            raise ValueError(f'downsample must be one of: {", ".join(METHODS)}')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def compute():
+        tier = 'raw'
+        if series is not None:
+            columns = _filter_range(series.get_window(), start, end)
+        elif start is None and end is None:
+            columns = metrics_collector.get_window(copy=True)
+        else:
+            tier, columns = metrics_collector.get_range(
+                0.0 if start is None else start,
+                time.time() if end is None else end,
+                max_points,
+            )
+        if max_points is not None:
+            selected = fields or ['cpu_percent', 'memory_percent', 'disk_percent']
+            columns = downsample(columns, selected, max_points, method)
+        return to_layout(columns, fields), {'X-History-Tier': tier}
+
+    key = ('history', tuple(sorted(request.args.items(multi=True))))
+    return _cached_json(key, compute, series)
+
+
+def _filter_range(columns, start, end):
+    """Select the rows of a columnar window within ``[start, end]``."""
+    if start is None and end is None:
+        return columns
+    timestamps = columns['timestamp']
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        mask &= timestamps >= start
+    if end is not None:
+        mask &= timestamps <= end
+    return {name: values[mask] for name, values in columns.items()}
+
+
+@api_bp.route('/summary')
+def get_summary():
+    """Get rolling summary statistics over the metrics history."""
+    series = _requested_host()
+    if series is not None:
+        return _cached_json(('summary', series.host), lambda: (series.get_summary(), None), series)
+    return jsonify(metrics_collector.get_summary())
 
 
 @api_bp.route('/anomalies')
 def get_anomalies():
-    """Get detected anomalies."""
-    history = metrics_collector.get_history()
-    anomalies = anomaly_detector.detect(history)
-    return jsonify(anomalies)
+    """Get detected anomalies.
+
+    By default this looks up the flags the streaming detector stored with
+    each sample. ``?method=isolation_forest`` runs the batch model instead.
+    """
+    method = request.args.get('method', 'streaming')
+    series = _requested_host()
+    if series is not None:
+        if method not in ('streaming', 'isolation_forest'):
+            return jsonify({'error': f'Unknown method: {method}'}), 400
+        return _cached_json(('anomalies', method, series.host),
+                            lambda: (_host_anomalies(series, method), None), series)
+    if method == 'streaming':
+        key = ('anomalies', method)
+    elif method == 'isolation_forest':
+        # A finished background fit changes the result without a new sample
+        key = ('anomalies', method, anomaly_detector.generation)
+    else:
+        return jsonify({'error': f'Unknown method: {method}'}), 400
+
+    def compute():
+        version, history = metrics_collector.get_versioned_window()
+        if method == 'streaming':
+            anomalies = streaming_detector.detect(history)
+        else:
+            # Only the shared-history writer fits; readers use its snapshot
+            anomalies = anomaly_detector.detect(history, version=version,
+                                                fit=not metrics_collector.is_reader)
+        anomalies['method'] = method
+        return anomalies, None
+
+    return _cached_json(key, compute)
+
+
+def _host_anomalies(series, method):
+    """Anomalies of an ingested host, computed from its window on demand.
+
+    Ingest stays a bulk append, so the streaming detector is replayed over
+    the window here instead of scoring each sample as it arrives.
+    """
+    history = {name: np.array(values) for name, values in series.get_window().items()}
+    if method == 'isolation_forest':
+        # Without a version the pipeline is stateless, so it can be shared
+        detector = AnomalyDetector(contamination=anomaly_detector.contamination,
+                                   feature_pipeline=anomaly_detector.feature_pipeline)
+        anomalies = detector.detect(history)
+    else:
+        detector = StreamingAnomalyDetector(threshold=streaming_detector.threshold)
+        rows = np.column_stack([history[name] for name in detector.fields])
+        for i, row in enumerate(rows):
+            scored = detector.score(dict(zip(detector.fields, row.tolist())))
+            history['anomaly_score'][i] = scored['anomaly_score']
+            history['anomaly'][i] = scored['anomaly']
+        anomalies = detector.detect(history)
+    anomalies['method'] = method
+    return anomalies
+
+
+def _refresh_anomaly_model(metrics):
+    """Collector listener: keep the model readers of shared history follow.
+
+    Readers do not fit, so the writer refits on its own schedule rather
+    than only when a detection request happens to reach it.
+    """
+    if not _service_config.get('METRICS_SHARED_PATH') or metrics_collector.is_reader:
+        return
+    version, history = metrics_collector.get_versioned_window()
+    anomaly_detector.refresh(history, version)
 
 
 @api_bp.route('/predictions')
 def get_predictions():
-    """Get resource usage predictions."""
-    history = metrics_collector.get_history()
-    predictions = {
-        'cpu': _predict_trend(history, 'cpu_percent'),
-        'memory': _predict_trend(history, 'memory_percent'),
-        'disk': _predict_trend(history, 'disk_percent'),
+    """Get resource usage forecasts with confidence bands.
+
+    Optional query parameters:
+        horizon: Samples ahead to forecast (default ``PREDICTION_HORIZON``).
+    """
+    horizon = request.args.get('horizon', type=int)
+    if horizon is not None and horizon < 1:
+        return jsonify({'error': 'horizon must be positive'}), 400
+    series = _requested_host()
+    if series is not None:
+        def compute():
+            host_predictor = Predictor(horizon=predictor.horizon, confidence=predictor.confidence)
+            host_predictor.fit(series.get_window())
+            return host_predictor.predictions(horizon), None
+        return _cached_json(('predictions', horizon, series.host), compute, series)
+    generation, forecasts = _background_forecasts()
+    key = ('predictions', horizon, generation)
+    return _cached_json(key, lambda: (_compute_predictions(horizon, forecasts), None))
+
+
+def _background_forecasts():
+    """Finished background forecasts and a token that changes with them.
+
+    Readers of shared history get the ones the writer published.
+
+    Returns:
+        ``(generation, forecasts)``, forecasts keyed by summary name.
+    """
+    if metrics_collector.is_reader:
+        shared = metrics_collector.get_shared('forecasts') or {}
+        return ('shared', shared.get('generation')), shared.get('results', {})
+    results = forecast_scheduler.results
+    return forecast_scheduler.generation, {
+        name: result.value for name, result in results.items() if result.value is not None
     }
-    return jsonify(predictions)
+
+
+def _compute_predictions(horizon=None, forecasts=None):
+    """Incremental forecasts, overlaid with finished background forecasts."""
+    # Normally a no-op: the listener already folded in each sample
+    predictor.sync(*metrics_collector.get_versioned_window())
+    predictions = predictor.predictions(horizon)
+    if horizon is None or horizon == predictor.horizon:
+        if forecasts is None:
+            forecasts = _background_forecasts()[1]
+        predictions.update(forecasts)
+    return predictions
+
+
+def _update_predictor(metrics):
+    """Collector listener: update the forecast fit with the new sample."""
+    predictor.sync(*metrics_collector.get_versioned_window())
+
+
+def _schedule_forecasts(metrics):
+    """Collector listener: every FORECAST_INTERVAL, refit the heavy model.
+
+    One job per metric runs in the scheduler's worker processes; a new
+    round supersedes jobs still pending from the previous one. With shared
+    history only the writer submits jobs, and it shares finished forecasts
+    with the readers (they go out with the next sample).
+    """
+    if not _service_config.get('FORECAST_JOBS_ENABLED') or metrics_collector.is_reader:
+        return
+    if _service_config.get('METRICS_SHARED_PATH'):
+        generation, forecasts = _background_forecasts()
+        metrics_collector.share('forecasts', {'generation': generation, 'results': forecasts})
+    now = time.monotonic()
+    submitted_at = _forecast_state['submitted_at']
+    if submitted_at is not None and now - submitted_at < _service_config['FORECAST_INTERVAL']:
+        return
+    _forecast_state['submitted_at'] = now
+
+    version, history = metrics_collector.get_versioned_window()
+    timestamps = np.array(history['timestamp'])
+    for field in predictor.fields:
+        forecast_scheduler.submit(
+            _SUMMARY_NAMES.get(field, field), forecast_series,
+            _service_config['FORECAST_MODEL'], timestamps, np.array(history[field]),
+            predictor.horizon, predictor.confidence, version=version,
+        )
 
 
 @api_bp.route('/alerts')
 def get_alerts():
-    """Get active alerts."""
-    metrics = metrics_collector.get_current_metrics()
-    alerts = []
-
-    cpu_threshold = current_app.config.get('CPU_ALERT_THRESHOLD', 80.0)
-    memory_threshold = current_app.config.get('MEMORY_ALERT_THRESHOLD', 85.0)
-    disk_threshold = current_app.config.get('DISK_ALERT_THRESHOLD', 90.0)
-
-    if metrics['cpu_percent'] > cpu_threshold:
-        alerts.append({
-            'type': 'cpu',
-            'severity': 'warning' if metrics['cpu_percent'] < 90 else 'critical',
-            'message': f"CPU usage is high: {metrics['cpu_percent']:.1f}%",
-            'value': metrics['cpu_percent'],
-            'threshold': cpu_threshold,
-        })
+    """Get active alerts, as evaluated when the latest sample arrived."""
+    series = _requested_host()
+    if series is not None:
+        return _cached_json(('alerts', series.host),
+                            lambda: (_host_alerts(series), None), series)
+    if not alert_engine.evaluations:
+        # Nothing evaluated yet, e.g. the background sampler is disabled
+        metrics = metrics_collector.get_latest()
+        if not alert_engine.evaluations:
+            _evaluate_alerts(metrics)
+    return jsonify(dict(alert_engine.state))
 
-    if metrics['memory_percent'] > memory_threshold:
-        alerts.append({
-            'type': 'memory',
-            'severity': 'warning' if metrics['memory_percent'] < 95 else 'critical',
-            'message': f"Memory usage is high: {metrics['memory_percent']:.1f}%",
-            'value': metrics['memory_percent'],
-            'threshold': memory_threshold,
-        })
 
-    if metrics['disk_percent'] > disk_threshold:
-        alerts.append({
-            'type': 'disk',
-            'severity': 'warning' if metrics['disk_percent'] < 95 else 'critical',
-            'message': f"Disk usage is high: {metrics['disk_percent']:.1f}%",
-            'value': metrics['disk_percent'],
-            'threshold': disk_threshold,
-        })
+def _host_alerts(series):
+    """Alerts of an ingested host, replaying its window through the rules."""
+    engine = AlertEngine(alert_engine.rules)
+    history = series.get_window()
+    names = [name for name in HISTORY_FIELDS if name in history]
+    rows = np.column_stack([history[name] for name in names]).tolist()
+    state = engine.state
+    for ts, row in zip(history['timestamp'].tolist(), rows):
+        state = engine.evaluate(ts, dict(zip(names, row)))
+    return dict(state)
+
+
+@api_bp.route('/processes')
+def get_processes():
+    """Get the top processes by CPU, memory and IO of this host.
+
+    Rankings are refreshed on the sampling thread every
+    ``PROCESS_REFRESH_INTERVAL`` seconds; CPU and IO are averaged over
+    the ``interval`` between the last two refreshes.
+
+    Optional query parameters:
+        by: Only this ranking: cpu, memory or io.
+        limit: Processes per ranking (default and maximum
+            ``PROCESS_TOP_N``).
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    try:
+        return jsonify(process_monitor.snapshot(request.args.get('by'), limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+def _refresh_processes(metrics):
+    """Collector listener: re-rank processes every PROCESS_REFRESH_INTERVAL."""
+    process_monitor.maybe_refresh()
+
 
-    return jsonify({'alerts': alerts, 'count': len(alerts)})
+@api_bp.route('/alerts/notifications')
+def get_alert_notifications():
+    """Get per-target alert delivery counters and latency."""
+    return jsonify(notifier.stats())
 
 
-def _predict_trend(history, metric_key):
-    """Simple trend prediction based on recent history."""
-    if not history or len(history) < 5:
-        return {'trend': 'stable', 'prediction': None}
+@api_bp.route('/debug/perf')
+def get_perf():
+    """Latency histograms of the hot paths and routes of this process."""
+    return jsonify({
+        'enabled': perf.enabled,
+        'timings': perf.snapshot(),
+        'response_cache': {'entries': len(response_cache), 'hits': response_cache.hits,
+                           'misses': response_cache.misses},
+        'profiler': profiler.status(),
+    })
 
-    values = [h.get(metric_key, 0) for h in history[-10:]]
-    avg_recent = sum(values[-5:]) / 5
-    avg_older = sum(values[:5]) / 5
 
-    diff = avg_recent - avg_older
-    if diff > 5:
-        trend = 'increasing'
-    elif diff < -5:
-        trend = 'decreasing'
+@api_bp.route('/debug/perf', methods=['DELETE'])
+def reset_perf():
+    """Clear the latency histograms."""
+    perf.reset()
+    return '', 204
+
+
+@api_bp.route('/debug/profiler', methods=['GET'])
+def get_profile():
+    """Stacks sampled by the profiler, in folded flame graph format."""
+    return current_app.response_class(profiler.folded(), mimetype='text/plain')
+
+
+@api_bp.route('/debug/profiler', methods=['POST'])
+def toggle_profiler():
+    """Start or stop the sampling profiler.
+
+    JSON body: ``{"running": true|false, "interval": seconds,
+    "duration": seconds}``; ``interval`` and ``duration`` are optional.
+    Starting discards the previous profile.
+    """
+    if not current_app.config['PERF_PROFILER_ENABLED']:
+        return jsonify({'error': 'The profiler is disabled (PERF_PROFILER_ENABLED)'}), 403
+    body = request.get_json(silent=True) or {}
+    if body.get('running', True):
+        try:
+            profiler.start(body.get('interval'), body.get('duration'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
     else:
-        trend = 'stable'
+        profiler.stop()
+    return jsonify(profiler.status())
+
+
+def _evaluate_alerts(metrics):
+    """Collector listener: run the alert rules on the new sample."""
+    alert_engine.evaluate(parse_timestamp(metrics['timestamp']), metrics)
+
+
+def _render_exposition(metrics):
+    """Collector listener: pre-render the Prometheus payload of the sample."""
+    rules = [(rule.name, rule.severity) for rule in alert_engine.rules]
+    exposition.update(metrics, metrics_collector.get_summary(), alert_engine.state, rules)
+
+
+@api_bp.route('/ingest', methods=['POST'])
+def ingest():
+    """Store batched samples pushed by remote hosts.
 
-    return {
-        'trend': trend,
-        'current': avg_recent,
-        'predicted': min(100, max(0, avg_recent + diff)),
-        'change': diff,
+    The body is NDJSON (one ``{"host", "timestamp", <metrics>...}`` object
+    per line) or, with the optional ``msgpack`` package installed, a
+    msgpack array or stream of such maps (``Content-Type:
+    application/msgpack``), optionally sent with ``Content-Encoding:
+    gzip``. Valid samples are stored even when others in the batch are
+    rejected.
+    """
+    max_batch = current_app.config['INGEST_MAX_BATCH']
+    try:
+        body = request.get_data(cache=False)
+        if request.content_encoding == 'gzip':
+            body = gunzip(body, max_batch * MAX_RECORD_BYTES)
+        if request.mimetype in ('application/msgpack', 'application/x-msgpack'):
+            records = decode_msgpack(body)
+        else:
+            records = decode_ndjson(body)
+    except ImportError:
+        return jsonify({'error': 'msgpack support is not installed'}), 415
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if len(records) > max_batch:
+        return jsonify({'error': f'Batch exceeds {max_batch} samples'}), 413
+
+    result = host_registry.ingest(records)
+    status = 400 if result['rejected'] and not result['accepted'] else 200
+    return jsonify(result), status
+
+
+@api_bp.route('/hosts')
+def get_hosts():
+    """List this machine and every host that has sent samples."""
+    local_samples = len(metrics_collector.get_window()['timestamp'])
+    hosts = [{'host': LOCAL_HOST, 'local': True, 'samples': local_samples}]
+    for series in sorted(host_registry.hosts(), key=lambda s: s.host):
+        hosts.append({
+            'host': series.host,
+            'local': False,
+            'samples': len(series.history),
+            'last_seen': format_timestamp(series.last_seen),
+        })
+    return jsonify(hosts)
+
+
+@api_bp.route('/stream')
+def stream():
+    """Push each new sample with alerts, predictions and anomalies (SSE).
+
+    Every ``sample`` event carries ``{"metrics", "alerts", "predictions",
+    "anomalies"}``, computed once per sample for all subscribers. Beyond
+    ``STREAM_MAX_SUBSCRIBERS`` open streams per process, answers 503.
+    """
+    subscription = broadcaster.subscribe()
+    if subscription is None:
+        # Every stream holds a worker thread; leave the rest to other routes
+        response = jsonify({'error': 'Too many open streams; poll the REST endpoints'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    keepalive = current_app.config.get('STREAM_KEEPALIVE', 15.0)
+    response = Response(
+        stream_with_context(broadcaster.stream(subscription, keepalive)),
+        mimetype='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _broadcast_sample(metrics):
+    """Collector listener: publish the stream payload for a new sample."""
+    if not broadcaster.subscriber_count:
+        return
+    anomalies = streaming_detector.detect(metrics_collector.get_window())
+    anomalies['method'] = 'streaming'
+    payload = {
+        'metrics': metrics,
+        'alerts': dict(alert_engine.state),
+        'predictions': _compute_predictions(),
+        'anomalies': anomalies,
     }
+    broadcaster.publish('sample', _service_json['provider'].dumps(payload))
+
+
+def _cached_json(key, compute, series=None):
+    """Serve a result derived from history through the response cache.
+
+    ``compute`` returns ``(value, headers)`` and only runs when no result
+    is cached for ``key`` and the negotiated encoding at the current
+    revision of the history (or of the ingested host ``series``). The response
+    carries an ETag, so clients that send it back get ``304 Not Modified``
+    until a new sample arrives.
+    """
+    mimetype = _negotiate()
+    if mimetype is None:
+        return jsonify({'error': f'Acceptable types: {", ".join(MIMETYPES)}'}), 406
+
+    def build():
+        value, headers = compute()
+        if mimetype == JSON:
+            return CachedResponse.build(value, current_app.json.dumps, headers)
+        return CachedResponse.build(value, lambda v: encode(v, mimetype), headers)
+
+    revision = metrics_collector.revision() if series is None else series.revision
+    try:
+        entry = response_cache.get_or_compute((revision, mimetype) + key, build)
+    except UnsupportedEncoding as e:
+        return jsonify({'error': str(e)}), 406
+    response = current_app.response_class(entry.body, mimetype=mimetype)
+    response.headers.update(entry.headers)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept')
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+
+def _negotiate():
+    """The response mimetype from ``?format=`` or ``Accept``, or None."""
+    name = request.args.get('format')
+    if name is not None:
+        return FORMATS.get(name)
+    if not request.accept_mimetypes:
+        return JSON
+    return request.accept_mimetypes.best_match(MIMETYPES)
+
+
+def _parse_time(value):
+    """Parse an epoch-seconds or ISO 8601 query parameter."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid time: {value}') from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _parse_fields(value):
+    """Parse and validate the ``metrics`` field projection."""
+    if value is None:
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown metrics: {", ".join(unknown)}')
+    return fields
+
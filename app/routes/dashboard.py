@@ -1,6 +1,9 @@
 """Dashboard routes."""
 
-from flask import Blueprint, render_template
+from flask import Blueprint, current_app, render_template, request
+
+from app.routes.api import exposition
+from app.services.exposition import OPENMETRICS, PROMETHEUS_TEXT
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -15,3 +18,22 @@ def index():
 def health():
     """Health check endpoint for Cloud Run."""
     return {'status': 'healthy'}, 200
+
+
+@dashboard_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint.
+
+    Serves the payload rendered when the latest sample arrived, in
+    OpenMetrics format when the scraper accepts it and the classic text
+    format otherwise.
+    """
+    # Matched by hand: scrapers send version parameters that best_match
+    # does not compare
+    openmetrics = any(value.split(';')[0].strip() == 'application/openmetrics-text' and quality
+                      for value, quality in request.accept_mimetypes)
+    response = current_app.response_class(exposition.payload(openmetrics),
+                                          content_type=OPENMETRICS if openmetrics
+                                          else PROMETHEUS_TEXT)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,269 @@
+"""Push agent: collects metrics on a monitored host and sends them to a server.
+
+The agent runs only the collection half of :class:`MetricsCollector` and
+must stay light, so this module (and what it imports) never loads Flask
+or the ML stack.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Sequence, Tuple
+
+from app.services.metrics import MetricsCollector
+from app.services.notify import DeliveryError, HTTPClient, redact_url
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = '.ndjson.gz'
+
+
+class Spool:
+    """Compressed batches awaiting delivery, oldest first.
+
+    With a directory, each batch is one file written atomically (temp file
+    plus rename), so batches survive agent restarts and server outages;
+    without one they are kept in memory. Beyond ``max_bytes`` the oldest
+    batches are dropped.
+    """
+
+    def __init__(self, path: str = '', max_bytes: int = 64 * 1024 * 1024):
+        """Initialize the spool.
+
+        Args:
+            path: Spool directory, created if missing; empty keeps batches
+                in memory.
+            max_bytes: Total size of the batches kept.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._memory: Deque[Tuple[str, bytes]] = deque()
+        self._counter = 0
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def put(self, body: bytes) -> None:
+        """Append a batch, then drop the oldest ones beyond ``max_bytes``."""
+        self._counter += 1
+        name = f'{time.time_ns():020d}-{self._counter:06d}{SPOOL_SUFFIX}'
+        if self.path:
+            tmp = os.path.join(self.path, f'.{name}.tmp')
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, os.path.join(self.path, name))
+        else:
+            self._memory.append((name, body))
+        self._trim()
+
+    def pending(self) -> List[str]:
+        """Names of the spooled batches, oldest first."""
+        if not self.path:
+            return [name for name, _ in self._memory]
+        return sorted(name for name in os.listdir(self.path) if name.endswith(SPOOL_SUFFIX))
+
+    def read(self, name: str) -> bytes:
+        if not self.path:
+            return next(body for n, body in self._memory if n == name)
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return f.read()
+
+    def remove(self, name: str) -> None:
+        if not self.path:
+            self._memory = deque(item for item in self._memory if item[0] != name)
+            return
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def size(self) -> int:
+        """Total bytes spooled."""
+        return sum(self._size(name) for name in self.pending())
+
+    def _size(self, name: str) -> int:
+        if not self.path:
+            return len(self.read(name))
+        try:
+            return os.path.getsize(os.path.join(self.path, name))
+        except FileNotFoundError:
+            return 0
+
+    def _trim(self) -> None:
+        names = self.pending()
+        sizes = [self._size(name) for name in names]
+        total = sum(sizes)
+        # The newest batch is always kept
+        for name, size in zip(names[:-1], sizes):
+            if total <= self.max_bytes:
+                break
+            self.remove(name)
+            total -= size
+            self.dropped += 1
+            logger.warning('Spool over %d bytes; dropped batch %s', self.max_bytes, name)
+
+
+def to_record(host: str, timestamp: float, metrics: dict) -> dict:
+    """Flatten a sample into the record format of ``POST /api/ingest``."""
+    record = {key: value for key, value in metrics.items() if key != 'network'}
+    record.update(metrics.get('network') or {})
+    record['host'] = host
+    record['timestamp'] = timestamp
+    return record
+
+
+def encode_batch(records: Sequence[dict]) -> bytes:
+    """Gzip-compressed NDJSON, one record per line."""
+    body = '\n'.join(json.dumps(record, separators=(',', ':')) for record in records)
+    return gzip.compress(body.encode(), compresslevel=6)
+
+
+class PushAgent:
+    """Samples this host and pushes batches to a monitor server.
+
+    Samples are buffered for ``flush_interval`` seconds, then compressed
+    into one batch, spooled, and sent with the rest of the spool over a
+    single keep-alive connection, oldest first. A batch stays spooled
+    until the server accepts it; one the server rejects outright (a 4xx
+    other than 408/429) is dropped, since resending would not help.
+    """
+
+    def __init__(self, server_url: str, host: Optional[str] = None, interval: float = 5.0,
+                 flush_interval: float = 30.0, spool: Optional[Spool] = None,
+                 timeout: float = 10.0,
+                 read_metrics: Callable[[], Tuple[float, dict]] = MetricsCollector.read_metrics):
+        """Initialize the agent.
+
+        Args:
+            server_url: Base URL of the monitor, or its full ingest URL.
+            host: Name the samples are reported under (default: hostname).
+            interval: Seconds between samples.
+            flush_interval: Seconds between pushes.
+            spool: Where batches wait for delivery (default: in memory).
+            timeout: Socket timeout per request, in seconds.
+            read_metrics: Sample source returning ``(timestamp, metrics)``.
+        """
+        if interval <= 0 or flush_interval <= 0:
+            raise ValueError('interval and flush_interval must be positive')
+        url = server_url.rstrip('/')
+        if not url.endswith('/ingest'):
+            url += '/api/ingest'
+        self.host = host or socket.gethostname()
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.spool = spool if spool is not None else Spool()
+        self.read_metrics = read_metrics
+        self.sent = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self._client = HTTPClient(url, timeout)
+        self._buffer: List[dict] = []
+        self._stop = threading.Event()
+
+    def collect(self) -> dict:
+        """Take one sample into the buffer."""
+        timestamp, metrics = self.read_metrics()
+        record = to_record(self.host, timestamp, metrics)
+        self._buffer.append(record)
+        return record
+
+    def flush(self) -> bool:
+        """Spool the buffered samples and send the spool.
+
+        Returns:
+            Whether the spool is empty afterwards.
+        """
+        if self._buffer:
+            self.spool.put(encode_batch(self._buffer))
+            self._buffer = []
+        for name in self.spool.pending():
+            try:
+                self._client.post(self.spool.read(name), {
+                    'Content-Type': 'application/x-ndjson',
+                    'Content-Encoding': 'gzip',
+                })
+            except DeliveryError as e:
+                self.last_error = str(e)
+                if e.retryable:
+                    logger.warning('Push to %s failed (%s); %d batches spooled',
+                                   redact_url(self._client.url), e, len(self.spool.pending()))
+                    return False
+                logger.error('Server rejected batch %s (%s); dropping it', name, e)
+                self.rejected += 1
+            else:
+                self.sent += 1
+            self.spool.remove(name)
+        return True
+
+    def run(self) -> None:
+        """Sample and push on a drift-free schedule until :meth:`stop`."""
+        self._stop.clear()
+        next_sample = next_flush = time.monotonic()
+        next_flush += self.flush_interval
+        while not self._stop.is_set():
+            try:
+                self.collect()
+            except Exception:
+                logger.exception('Metrics sampling failed')
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush += self.flush_interval
+                if next_flush < time.monotonic():
+                    next_flush = time.monotonic() + self.flush_interval
+
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay < 0:
+                # Fell behind (e.g. a slow push); skip missed ticks
+                next_sample = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+        self.flush()
+        self._client.close()
+
+    def stop(self) -> None:
+        """Make :meth:`run` push what is buffered and return."""
+        self._stop.set()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entry point of ``python run.py agent``."""
+    from config import Config
+
+    parser = argparse.ArgumentParser(prog='run.py agent',
+                                     description='Push this host\'s metrics to a monitor server.')
+    parser.add_argument('--server', default=Config.AGENT_SERVER_URL,
+                        help='monitor base URL (AGENT_SERVER_URL)')
+    parser.add_argument('--host', default=Config.AGENT_HOST or None,
+                        help='name to report samples under (AGENT_HOST, default: hostname)')
+    parser.add_argument('--interval', type=float, default=Config.METRICS_INTERVAL,
+                        help='seconds between samples (METRICS_INTERVAL)')
+    parser.add_argument('--flush-interval', type=float, default=Config.AGENT_FLUSH_INTERVAL,
+                        help='seconds between pushes (AGENT_FLUSH_INTERVAL)')
+    parser.add_argument('--spool-dir', default=Config.AGENT_SPOOL_DIR,
+                        help='directory that keeps unsent batches (AGENT_SPOOL_DIR)')
+    parser.add_argument('--spool-max-bytes', type=int, default=Config.AGENT_SPOOL_MAX_BYTES,
+                        help='spool size cap (AGENT_SPOOL_MAX_BYTES)')
+    parser.add_argument('--timeout', type=float, default=Config.AGENT_TIMEOUT,
+                        help='socket timeout in seconds (AGENT_TIMEOUT)')
+    args = parser.parse_args(argv)
+    if not args.server:
+        parser.error('--server or AGENT_SERVER_URL is required')
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    agent = PushAgent(args.server, host=args.host, interval=args.interval,
+                      flush_interval=args.flush_interval,
+                      spool=Spool(args.spool_dir, args.spool_max_bytes), timeout=args.timeout)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: agent.stop())
+    logger.info('Pushing metrics of %s to %s every %gs', agent.host, args.server,
+                args.flush_interval)
+    agent.run()
+    return 0
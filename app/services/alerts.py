@@ -0,0 +1,289 @@
+"""Declarative alert rules evaluated incrementally as samples arrive."""
+
+import logging
+import math
+import operator
+import re
+import threading
+from collections import deque
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+from app.services.metrics import HISTORY_FIELDS, SUMMARY_FIELDS, format_timestamp
+
+AGGREGATES = ('last', 'avg', 'min', 'max')
+SEVERITIES = ('warning', 'critical')
+
+_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+_RULE = re.compile(
+    r'^\s*(?:(?P<name>[\w.-]+)\s*=\s*)?'
+    r'(?P<agg>\w+)\s+(?P<metric>\w+)\s*(?P<op>>=|<=|>|<)\s*(?P<threshold>[-+\d.eE]+)'
+    r'(?:\s+for\s+(?P<duration>[\d.]+)(?P<unit>[smh]?))?'
+    r'(?:\s+clear\s+(?P<clear>[-+\d.eE]+))?'
+    r'(?:\s+severity\s+(?P<severity>\w+))?\s*$'
+)
+
+_LABELS = {'cpu': 'CPU', 'memory': 'Memory', 'disk': 'Disk'}
+
+logger = logging.getLogger(__name__)
+
+
+class AlertRule(NamedTuple):
+    """A compiled alert rule.
+
+    ``aggregate`` of ``metric`` over the trailing ``duration`` seconds is
+    compared with ``threshold``; the alert fires when the comparison holds
+    and clears only once the aggregate crosses back past ``clear``.
+    """
+
+    name: str
+    metric: str
+    aggregate: str
+    op: str
+    threshold: float
+    duration: float
+    clear: float
+    severity: str
+
+    @property
+    def rising(self) -> bool:
+        """Whether the rule fires on high values."""
+        return self.op in ('>', '>=')
+
+    def fires(self, value: float) -> bool:
+        return _OPERATORS[self.op](value, self.threshold)
+
+    def clears(self, value: float) -> bool:
+        return value < self.clear if self.rising else value > self.clear
+
+
+def parse_rule(text: str, hysteresis: float = 0.0) -> AlertRule:
+    """Compile one rule such as ``cpu = avg cpu_percent > 80 for 60s``.
+
+    Grammar: ``[name =] AGG METRIC OP THRESHOLD [for DURATION[s|m|h]]
+    [clear LEVEL] [severity warning|critical]``. ``METRIC`` is a history
+    field or a summary name (``cpu``, ``memory``, ``disk``); the name
+    defaults to the summary name. Without ``clear`` the alert clears
+    ``hysteresis`` units on the safe side of the threshold. ``last``
+    with a duration means the condition held for every sample in it.
+
+    Raises:
+        ValueError: If the rule does not parse or names an unknown metric.
+    """
+    match = _RULE.match(text)
+    if match is None:
+        raise ValueError(f'Invalid alert rule: {text!r}')
+    parts = match.groupdict()
+
+    metric = SUMMARY_FIELDS.get(parts['metric'], parts['metric'])
+    if metric not in HISTORY_FIELDS:
+        raise ValueError(f'Unknown metric in alert rule: {parts["metric"]!r}')
+    aggregate = {'mean': 'avg'}.get(parts['agg'], parts['agg'])
+    if aggregate not in AGGREGATES:
+        raise ValueError(f'Unknown aggregate in alert rule: {parts["agg"]!r}')
+    severity = parts['severity'] or 'warning'
+    if severity not in SEVERITIES:
+        raise ValueError(f'Unknown severity in alert rule: {severity!r}')
+
+    op = parts['op']
+    threshold = float(parts['threshold'])
+    duration = 0.0
+    if parts['duration']:
+        duration = float(parts['duration']) * _DURATION_UNITS[parts['unit'] or 's']
+    if aggregate == 'last' and duration:
+        # Sustained for the whole window: the least extreme value must fire
+        aggregate = 'min' if op in ('>', '>=') else 'max'
+    if parts['clear'] is not None:
+        clear = float(parts['clear'])
+    else:
+        clear = threshold - hysteresis if op in ('>', '>=') else threshold + hysteresis
+
+    names = {field: key for key, field in SUMMARY_FIELDS.items()}
+    name = parts['name'] or names.get(metric, metric)
+    return AlertRule(name, metric, aggregate, op, threshold, duration, clear, severity)
+
+
+def parse_rules(text: str, hysteresis: float = 0.0) -> List[AlertRule]:
+    """Compile ``;``- or newline-separated rules."""
+    return [parse_rule(part, hysteresis) for part in re.split(r'[;\n]', text) if part.strip()]
+
+
+def default_rules(config: Mapping, hysteresis: float = 0.0) -> List[AlertRule]:
+    """Rules equivalent to the CPU/MEMORY/DISK_ALERT_THRESHOLD settings."""
+    rules = []
+    for name, key, critical in (('cpu', 'CPU', 90.0), ('memory', 'MEMORY', 95.0),
+                                ('disk', 'DISK', 95.0)):
+        threshold = config.get(f'{key}_ALERT_THRESHOLD')
+        rules.append(parse_rule(f'{name} = last {name} > {threshold}', hysteresis))
+        # Nothing fires at or below the threshold, whatever its severity
+        level = f'>= {critical}' if critical > threshold else f'> {threshold}'
+        rules.append(parse_rule(f'{name} = last {name} {level} severity critical', hysteresis))
+    return rules
+
+
+class _TimeWindow:
+    """Sum, min and max of the values seen in the trailing ``duration`` seconds.
+
+    Each update is amortized O(1): a running sum plus monotonic deques.
+    """
+
+    def __init__(self, duration: float):
+        self.duration = duration
+        self.first_seen: Optional[float] = None
+        self._values: deque = deque()
+        self._min: deque = deque()
+        self._max: deque = deque()
+        self._sum = 0.0
+
+    def update(self, timestamp: float, value: float) -> None:
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        if not math.isnan(value):
+            self._values.append((timestamp, value))
+            self._sum += value
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((timestamp, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((timestamp, value))
+
+        horizon = timestamp - self.duration
+        while self._values and self._values[0][0] < horizon:
+            _, old = self._values.popleft()
+            self._sum -= old
+        start = self._values[0][0] if self._values else math.inf
+        for extremes in (self._min, self._max):
+            while extremes and extremes[0][0] < start:
+                extremes.popleft()
+
+    def covers(self, timestamp: float) -> bool:
+        """Whether samples have been seen for the whole window."""
+        return self.first_seen is not None and timestamp - self.first_seen >= self.duration
+
+    def value(self, aggregate: str) -> float:
+        if not self._values:
+            return math.nan
+        if aggregate == 'avg':
+            return self._sum / len(self._values)
+        if aggregate == 'min':
+            return self._min[0][1]
+        if aggregate == 'max':
+            return self._max[0][1]
+        return self._values[-1][1]
+
+
+class AlertEngine:
+    """Evaluates compiled rules on each sample and keeps the alert state.
+
+    Rules sharing a name are one alert: while any of them is firing, the
+    alert is active with the most severe firing rule's details, so a
+    metric never reports a warning and a critical at once. An alert that
+    stays active is not re-raised; ``since`` keeps its first firing time.
+    The current state is pre-built on each sample, so reading it is O(1).
+
+    Listeners receive the transitions of each sample: ``firing`` when an
+    alert starts or changes severity and ``resolved`` when it clears.
+    """
+
+    def __init__(self, rules: Sequence[AlertRule] = ()):
+        """Initialize the engine.
+
+        Args:
+            rules: Compiled rules, see :func:`parse_rule`.
+        """
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[dict]], None]] = []
+        self.set_rules(rules)
+
+    def set_rules(self, rules: Sequence[AlertRule]) -> None:
+        """Replace the rules, resetting all windows and alert state."""
+        with self._lock:
+            self.rules = list(rules)
+            self._windows = [_TimeWindow(rule.duration) for rule in self.rules]
+            self._firing = [False] * len(self.rules)
+            self._active: Dict[str, dict] = {}
+            self.evaluations = 0
+            self._state: Mapping = MappingProxyType({'alerts': [], 'count': 0})
+
+    def reset(self) -> None:
+        """Forget all windows and active alerts."""
+        self.set_rules(self.rules)
+
+    def add_listener(self, listener: Callable[[List[dict]], None]) -> None:
+        """Call ``listener(events)`` whenever a sample changes the alerts."""
+        self._listeners.append(listener)
+
+    @property
+    def state(self) -> Mapping:
+        """Active alerts as ``{'alerts': [...], 'count': n}``."""
+        return self._state
+
+    def evaluate(self, timestamp: float, metrics: Mapping) -> Mapping:
+        """Fold one sample into every rule and rebuild the alert state."""
+        values = {**metrics, **(metrics.get('network') or {})}
+        with self._lock:
+            candidates: Dict[str, dict] = {}
+            for i, rule in enumerate(self.rules):
+                window = self._windows[i]
+                value = values.get(rule.metric)
+                window.update(timestamp, math.nan if value is None else float(value))
+                current = window.value(rule.aggregate)
+                if math.isnan(current) or not window.covers(timestamp):
+                    firing = False
+                elif self._firing[i]:
+                    firing = not rule.clears(current)
+                else:
+                    firing = rule.fires(current)
+                self._firing[i] = firing
+                if firing:
+                    best = candidates.get(rule.name)
+                    if best is None or (SEVERITIES.index(rule.severity) >
+                                        SEVERITIES.index(best['severity'])):
+                        candidates[rule.name] = self._alert(rule, current)
+
+            now = format_timestamp(timestamp)
+            active = {}
+            events = []
+            for name, alert in candidates.items():
+                previous = self._active.get(name)
+                active[name] = {**alert, 'since': previous['since'] if previous else now}
+                if previous is None or previous['severity'] != alert['severity']:
+                    events.append({'event': 'firing', 'timestamp': now, 'alert': active[name]})
+            for name, previous in self._active.items():
+                if name not in active:
+                    events.append({'event': 'resolved', 'timestamp': now, 'alert': previous})
+            self._active = active
+            self.evaluations += 1
+            alerts = list(active.values())
+            self._state = state = MappingProxyType({'alerts': alerts, 'count': len(alerts)})
+
+        if events:
+            for listener in self._listeners:
+                try:
+                    listener(events)
+                except Exception:
+                    logger.exception('Alert listener failed')
+        return state
+
+    @staticmethod
+    def _alert(rule: AlertRule, value: float) -> dict:
+        label = _LABELS.get(rule.name, rule.name)
+        level = 'high' if rule.rising else 'low'
+        unit = '%' if rule.metric.endswith('_percent') else ''
+        window = f' ({rule.aggregate} over {rule.duration:g}s)' if rule.duration else ''
+        return {
+            'type': rule.name,
+            'severity': rule.severity,
+            'message': f'{label} usage is {level}: {value:.1f}{unit}{window}',
+            'value': value,
+            'threshold': rule.threshold,
+        }
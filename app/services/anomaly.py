@@ -1,82 +1,501 @@
-"""Anomaly detection service using ML."""
+"""Anomaly detection service using ML.
+
+scikit-learn takes about a second to import, longer than the rest of the
+app together, so it is only imported when the first model is fitted or
+by :func:`warm_up`; importing this module stays cheap.
+"""
+
+import logging
+import os
+import threading
+import time
+import warnings
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional, Union
 
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from typing import Optional
+
+from app.services.features import FeaturePipeline, columns_from_rows
+from app.services.metrics import format_timestamp
+from app.services.perf import perf
+
+if TYPE_CHECKING:
+    from sklearn.ensemble import IsolationForest
+
+logger = logging.getLogger(__name__)
+
+FEATURE_FIELDS = ('cpu_percent', 'memory_percent', 'disk_percent')
+# Samples needed to fit a model
+MIN_FIT_POINTS = 10
+SNAPSHOT_FORMAT = 1
+
+
+def warm_up() -> None:
+    """Import scikit-learn and fit a tiny model.
+
+    Run in a background thread after startup (or in the gunicorn master
+    before workers fork) so that the first detection request does not pay
+    for the import. Concurrent callers simply wait on the import lock.
+    """
+    with perf.timer('anomaly.warm_up'):
+        from sklearn.ensemble import IsolationForest
+        IsolationForest(n_estimators=2, random_state=0).fit(
+            np.zeros((8, len(FEATURE_FIELDS))))
 
 
 class AnomalyDetector:
-    """Detects anomalies in system metrics using Isolation Forest."""
+    """Detects anomalies in system metrics using Isolation Forest.
+
+    When callers pass the history ``version`` (the number of samples ever
+    recorded), the detector keeps a fitted model between calls: it scores
+    only samples it has not seen, refits on a schedule, after a number of
+    new samples, or when the score distribution drifts, and caches the
+    result per version. Without a version every call fits on the given
+    history, as a one-off batch.
 
-    def __init__(self, contamination: float = 0.1):
+    With a ``snapshot_path``, every fitted model is written there, and a
+    detector without a model loads it on first use, so detection works
+    right after a restart and new replicas start from the latest model
+    instead of each fitting their own. Processes that should not fit at
+    all (readers of shared history) pass ``fit=False`` and follow the
+    snapshot as the fitting process replaces it.
+    """
+
+    def __init__(
+        self,
+        contamination: float = 0.1,
+        refit_interval: float = 300.0,
+        refit_samples: int = 100,
+        drift_threshold: float = 3.0,
+        drift_window: int = 20,
+        background: bool = False,
+        snapshot_path: str = '',
+        feature_pipeline: Optional[FeaturePipeline] = None,
+    ):
         """Initialize the anomaly detector.
 
         Args:
             contamination: Expected proportion of anomalies in the data.
+            refit_interval: Seconds after which a model is refit on new data.
+            refit_samples: New samples after which a model is refit.
+            drift_threshold: Refit when the mean score of the latest
+                ``drift_window`` samples moves this many standard
+                deviations of the training scores away from their mean.
+            drift_window: Number of recent scores used for drift checks.
+            background: Fit in a worker thread instead of the caller's
+                thread; until the first model is ready, ``detect`` reports
+                ``training``.
+            snapshot_path: File the fitted model is persisted to and
+                loaded from; empty disables snapshots.
+            feature_pipeline: Windowed features to fit on; None fits on
+                the raw usage percentages (``FEATURE_FIELDS``).
         """
         self.contamination = contamination
-        self.model: Optional[IsolationForest] = None
+        self.refit_interval = refit_interval
+        self.refit_samples = refit_samples
+        self.drift_threshold = drift_threshold
+        self.drift_window = drift_window
+        self.background = background
+        self.snapshot_path = snapshot_path
+        self.feature_pipeline = feature_pipeline
+        self.model: Optional['IsolationForest'] = None
+        # Metadata of the snapshot last written or loaded
+        self.snapshot: Optional[dict] = None
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._fitted_at = 0.0
+        self._fitted_version: Optional[int] = 0
+        self._train_mean = 0.0
+        self._train_std = 0.0
+        self._drifted = False
+        self._scores = np.empty(0)
+        self._score_start = 0
+        self._score_generation = -1
+        self._result: Optional[dict] = None
+        self._result_key: Optional[tuple] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_checked = False
+        # (inode, mtime) of the snapshot file the current model came from
+        self._snapshot_stat: Optional[tuple] = None
+
+    @property
+    def generation(self) -> int:
+        """Number of models fitted so far."""
+        return self._generation
+
+    @property
+    def feature_fields(self) -> tuple:
+        """Names of the model's feature columns."""
+        if self.feature_pipeline is None:
+            return FEATURE_FIELDS
+        return self.feature_pipeline.names
+
+    def set_feature_pipeline(self, pipeline: Optional[FeaturePipeline]) -> None:
+        """Switch features, dropping a model fitted on different ones."""
+        changed = (pipeline.names if pipeline else FEATURE_FIELDS) != self.feature_fields
+        with self._lock:
+            self.feature_pipeline = pipeline
+            if changed and self.model is not None:
+                self.model = None
+                self._generation += 1
+                self._result = None
+                self._snapshot_checked = False
+                self._snapshot_stat = None
 
-    def detect(self, history: list) -> dict:
+    @perf.timed('anomaly.detect')
+    def detect(self, history: Union[list, Mapping], version: Optional[int] = None,
+               fit: bool = True) -> dict:
         """Detect anomalies in metrics history.
 
         Args:
-            history: List of metrics dictionaries.
+            history: List of metrics dictionaries, or a mapping of column
+                arrays as returned by ``MetricsCollector.get_window()``.
+            version: History version of the newest sample in ``history``,
+                as returned by ``MetricsCollector.get_versioned_window()``.
+            fit: Whether a versioned call may fit a model. Without fitting,
+                the model at ``snapshot_path`` is used and reloaded when
+                the file is replaced; until there is one, the status is
+                ``training``.
 
         Returns:
             Dictionary containing anomaly detection results.
         """
-        if not history or len(history) < 10:
+        total_points = _history_length(history)
+        if version is not None and not fit:
+            self.follow_snapshot()
+        elif version is not None and self.model is None:
+            self.load_snapshot()
+        # A loaded model can score any history; fitting one needs more
+        if total_points < (1 if version is not None and self.model is not None
+                           else MIN_FIT_POINTS):
             return {
                 'anomalies': [],
                 'status': 'insufficient_data',
-                'message': 'Need at least 10 data points for anomaly detection',
+                'message': f'Need at least {MIN_FIT_POINTS} data points for anomaly detection',
             }
 
+        if version is None:
+            features = self._extract_features(history)
+            self._fit(features, total_points)
+            return self._build_result(history, features, self._score(features, total_points))
+
+        key = (version, total_points, self._generation)
+        cached = self._result
+        if cached is not None and self._result_key == key:
+            return cached
+
         # Extract features for anomaly detection
-        features = self._extract_features(history)
+        features = self._extract_features(history, version)
+
+        if fit and (self.model is None or (total_points >= MIN_FIT_POINTS
+                                           and self._needs_refit(version))):
+            if self.background:
+                self._fit_in_background(features, version)
+            else:
+                self._fit(features, version)
+        if self.model is None:
+            return {
+                'anomalies': [],
+                'status': 'training',
+                'message': 'Anomaly model is being trained',
+                'total_points': total_points,
+            }
+
+        scores = self._score(features, version)
+        self._check_drift(scores)
+        result = self._build_result(history, features, scores)
 
-        # Train model on the data
-        self.model = IsolationForest(
-            contamination=self.contamination,
-            random_state=42,
-            n_estimators=100,
+        with self._lock:
+            self._result = result
+            self._result_key = (version, total_points, self._score_generation)
+        return result
+
+    def _needs_refit(self, version: int) -> bool:
+        """Whether the current model is due to be replaced."""
+        if self._fitted_version is None:
+            # Loaded from a snapshot; versions of this process start here
+            self._fitted_version = version
+            return False
+        new_samples = version - self._fitted_version
+        if new_samples <= 0:
+            return False
+        return (
+            self._drifted
+            or new_samples >= self.refit_samples
+            or time.monotonic() - self._fitted_at >= self.refit_interval
         )
 
-        # Predict anomalies (-1 for anomaly, 1 for normal)
-        predictions = self.model.fit_predict(features)
-        scores = self.model.decision_function(features)
+    def _fit_in_background(self, features: np.ndarray, version: int) -> None:
+        """Schedule a fit unless one is already running."""
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='anomaly-fit')
+            # The window may be a view of live storage; fit on a private copy
+            self._pending = self._executor.submit(self._fit, np.array(features), version)
+
+    @perf.timed('anomaly.fit')
+    def _fit(self, features: np.ndarray, version: int) -> None:
+        """Fit a new model and make it current."""
+        try:
+            from sklearn.ensemble import IsolationForest
+            model = IsolationForest(
+                contamination=self.contamination,
+                random_state=42,
+                n_estimators=100,
+            )
+            model.fit(features)
+            train_scores = model.decision_function(features)
+        except Exception:
+            logger.exception('Anomaly model fit failed')
+            return
+
+        with self._lock:
+            self.model = model
+            self._generation += 1
+            self._fitted_at = time.monotonic()
+            self._fitted_version = version
+            self._train_mean = float(train_scores.mean())
+            self._train_std = float(train_scores.std())
+            self._drifted = False
+
+        if self.snapshot_path:
+            self.save_snapshot(model, features, version)
+
+    def save_snapshot(self, model: 'IsolationForest', features: np.ndarray,
+                      version: int) -> None:
+        """Write ``model`` and its metadata to ``snapshot_path``.
+
+        The file is replaced atomically, so concurrent writers (several
+        workers sharing a volume) and readers never see a partial file.
+        """
+        import joblib
+        import sklearn
+
+        metadata = {
+            'format': SNAPSHOT_FORMAT,
+            'feature_fields': list(self.feature_fields),
+            'sklearn_version': sklearn.__version__,
+            'contamination': self.contamination,
+            'samples': len(features),
+            'version': version,
+            'train_mean': self._train_mean,
+            'train_std': self._train_std,
+            'saved_at': time.time(),
+        }
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        tmp = os.path.join(directory, f'.{os.path.basename(self.snapshot_path)}'
+                                      f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with perf.timer('anomaly.snapshot.save'):
+                with open(tmp, 'wb') as f:
+                    # Uncompressed, so that arrays can be memory-mapped on load
+                    joblib.dump({'metadata': metadata, 'model': model}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot_path)
+                stat = os.stat(self.snapshot_path)
+        except OSError:
+            logger.exception('Could not write anomaly model snapshot %s', self.snapshot_path)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._snapshot_stat = (stat.st_ino, stat.st_mtime_ns)
+        self.snapshot = metadata
+
+    def load_snapshot(self) -> bool:
+        """Load the model at ``snapshot_path`` once, unless one is fitted.
+
+        Snapshots of other feature fields, formats or scikit-learn
+        versions are ignored. Arrays are memory-mapped read-only, so
+        workers loading the same file share its pages.
+
+        Returns:
+            Whether a snapshot was loaded.
+        """
+        with self._snapshot_lock:
+            if self._snapshot_checked or self.model is not None or not self.snapshot_path:
+                return False
+            self._snapshot_checked = True
+            return self._load_snapshot(replace=False)
+
+    def follow_snapshot(self) -> bool:
+        """Load the model at ``snapshot_path`` if the file has been replaced.
+
+        Unlike :meth:`load_snapshot` this replaces the current model, so a
+        process that does not fit keeps up with the one that does.
+
+        Returns:
+            Whether a snapshot was loaded.
+        """
+        with self._snapshot_lock:
+            if not self.snapshot_path:
+                return False
+            return self._load_snapshot(replace=True)
+
+    def _load_snapshot(self, replace: bool) -> bool:
+        """Load ``snapshot_path`` unless it is the file already loaded."""
+        try:
+            stat = os.stat(self.snapshot_path)
+        except OSError:
+            return False
+        signature = (stat.st_ino, stat.st_mtime_ns)
+        if signature == self._snapshot_stat:
+            return False
+        # Usable or not, the same file is not read again
+        self._snapshot_stat = signature
+        import joblib
+        import sklearn
+
+        try:
+            with perf.timer('anomaly.snapshot.load'), warnings.catch_warnings():
+                # Version mismatches are checked against the metadata
+                warnings.simplefilter('ignore')
+                snapshot = joblib.load(self.snapshot_path, mmap_mode='r')
+            metadata = snapshot['metadata']
+            model = snapshot['model']
+        except Exception:
+            logger.exception('Could not load anomaly model snapshot %s', self.snapshot_path)
+            return False
+        expected = (SNAPSHOT_FORMAT, list(self.feature_fields), sklearn.__version__)
+        found = (metadata.get('format'), metadata.get('feature_fields'),
+                 metadata.get('sklearn_version'))
+        if found != expected:
+            logger.warning('Ignoring anomaly model snapshot %s: format, features and '
+                           'scikit-learn version %s do not match %s',
+                           self.snapshot_path, found, expected)
+            return False
+
+        with self._lock:
+            if self.model is not None and not replace:
+                return False
+            self.model = model
+            self._generation += 1
+            self._fitted_at = time.monotonic()
+            self._fitted_version = None
+            self._train_mean = metadata['train_mean']
+            self._train_std = metadata['train_std']
+            self._drifted = False
+        self.snapshot = metadata
+        logger.info('Loaded anomaly model snapshot %s (%d samples)',
+                    self.snapshot_path, metadata['samples'])
+        return True
 
-        # Find anomalous points
+    def refresh(self, history: Mapping, version: int) -> None:
+        """Fit in the background if there is no model or it is due for a refit.
+
+        Lets the process that fits keep the snapshot that others follow
+        current without waiting for a detection request. Nothing is scored.
+        """
+        if self.model is None:
+            self.load_snapshot()
+        if _history_length(history) < MIN_FIT_POINTS:
+            return
+        if self.model is not None and not self._needs_refit(version):
+            return
+        self._fit_in_background(self._extract_features(history, version), version)
+
+    @perf.timed('anomaly.score')
+    def _score(self, features: np.ndarray, version: int) -> np.ndarray:
+        """Decision scores for ``features``, computing only unseen rows.
+
+        Row ``i`` of ``features`` is the sample with sequence number
+        ``version - len(features) + i``.
+        """
+        with self._lock:
+            model = self.model
+            generation = self._generation
+            scores = self._scores
+            score_start = self._score_start
+            score_generation = self._score_generation
+
+        start = version - len(features)
+        scored_end = score_start + len(scores)
+        if generation != score_generation or start < score_start or scored_end > version:
+            scores = model.decision_function(features)
+        else:
+            known = scores[start - score_start:]
+            new_rows = features[len(known):]
+            if len(new_rows):
+                known = np.concatenate([known, model.decision_function(new_rows)])
+            scores = known
+
+        with self._lock:
+            if generation == self._generation:
+                self._scores = scores
+                self._score_start = start
+                self._score_generation = generation
+        return scores
+
+    def _check_drift(self, scores: np.ndarray) -> None:
+        """Flag a refit when recent scores move away from training scores."""
+        if len(scores) < self.drift_window or self._train_std == 0:
+            return
+        # Recent scores are autocorrelated, so their mean is compared with
+        # the spread of the training scores rather than its standard error
+        recent = float(scores[-self.drift_window:].mean())
+        if abs(recent - self._train_mean) > self.drift_threshold * self._train_std:
+            self._drifted = True
+
+    def _build_result(self, history: Union[list, Mapping], features: np.ndarray,
+                      scores: np.ndarray) -> dict:
+        """Format scores as the detection response."""
+        total_points = len(features)
+
+        # Find anomalous points (negative decision score, as in predict())
         anomalies = []
-        for i, (pred, score) in enumerate(zip(predictions, scores)):
-            if pred == -1:
-                anomalies.append({
-                    'index': i,
-                    'timestamp': history[i].get('timestamp'),
-                    'score': float(score),
-                    'metrics': {
-                        'cpu_percent': history[i].get('cpu_percent'),
-                        'memory_percent': history[i].get('memory_percent'),
-                        'disk_percent': history[i].get('disk_percent'),
-                    },
-                })
+        for i in np.flatnonzero(scores < 0).tolist():
+            anomalies.append({
+                'index': i,
+                'timestamp': _timestamp_at(history, i),
+                'score': float(scores[i]),
+                'metrics': {
+                    name: float(features[i, j]) for j, name in enumerate(FEATURE_FIELDS)
+                },
+            })
 
         return {
             'anomalies': anomalies,
             'status': 'ok',
-            'total_points': len(history),
+            'total_points': total_points,
             'anomaly_count': len(anomalies),
-            'anomaly_rate': len(anomalies) / len(history) if history else 0,
+            'anomaly_rate': len(anomalies) / total_points,
         }
 
-    def _extract_features(self, history: list) -> np.ndarray:
+    @perf.timed('anomaly.extract_features')
+    def _extract_features(self, history: Union[list, Mapping],
+                          version: Optional[int] = None) -> np.ndarray:
         """Extract feature matrix from metrics history."""
-        features = []
-        for metrics in history:
-            features.append([
-                metrics.get('cpu_percent', 0),
-                metrics.get('memory_percent', 0),
-                metrics.get('disk_percent', 0),
-            ])
-        return np.array(features)
+        if self.feature_pipeline is not None:
+            return self.feature_pipeline.transform(history, version)
+        if isinstance(history, Mapping):
+            n = _history_length(history)
+        else:
+            history = columns_from_rows(history, FEATURE_FIELDS)
+            n = len(history[FEATURE_FIELDS[0]])
+        return np.column_stack([
+            np.asarray(history[name], dtype=float) if name in history else np.zeros(n)
+            for name in FEATURE_FIELDS
+        ])
+
+
+def _history_length(history: Union[list, Mapping]) -> int:
+    """Number of samples in list or columnar history."""
+    if isinstance(history, Mapping):
+        return len(history.get('timestamp', ()))
+    return len(history) if history else 0
+
+
+def _timestamp_at(history: Union[list, Mapping], i: int) -> Optional[str]:
+    """ISO timestamp of sample ``i`` in list or columnar history."""
+    if isinstance(history, Mapping):
+        return format_timestamp(float(history['timestamp'][i]))
+    return history[i].get('timestamp')
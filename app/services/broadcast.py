@@ -0,0 +1,101 @@
+"""Fan-out of server-sent events to many subscribers."""
+
+import queue
+import threading
+from typing import Iterator, Optional, Set
+
+
+def format_event(event: str, data: str) -> bytes:
+    """Encode one server-sent event."""
+    lines = ''.join(f'data: {line}\n' for line in data.split('\n'))
+    return f'event: {event}\n{lines}\n'.encode()
+
+
+class Subscription:
+    """A subscriber's bounded queue of encoded events."""
+
+    def __init__(self, max_queue: int):
+        self.queue: 'queue.Queue[bytes]' = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def put(self, message: bytes) -> None:
+        """Queue a message, dropping the oldest if the client is slow."""
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class Broadcaster:
+    """Encodes each event once and hands the bytes to every subscriber.
+
+    Slow subscribers never block the producer: their queues are bounded
+    and drop the oldest event when full. New subscribers first receive the
+    most recent event so they can render immediately.
+    """
+
+    def __init__(self, max_queue: int = 16, max_subscribers: Optional[int] = None):
+        """Initialize the broadcaster.
+
+        Args:
+            max_queue: Events buffered per subscriber.
+            max_subscribers: Subscribers accepted at once, or None for no
+                limit.
+        """
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._last: Optional[bytes] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscription]:
+        """Add a subscriber; None when ``max_subscribers`` are connected."""
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            if (self.max_subscribers is not None
+                    and len(self._subscribers) >= self.max_subscribers):
+                return None
+            if self._last is not None:
+                subscription.put(self._last)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: str) -> None:
+        """Send an event to all current subscribers."""
+        message = format_event(event, data)
+        with self._lock:
+            self._last = message
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def stream(self, subscription: Subscription, keepalive: float = 15.0) -> Iterator[bytes]:
+        """Yield a subscriber's events, with comment lines while idle.
+
+        Starts with a comment so headers are flushed to the client right
+        away, and unsubscribes when the consumer stops iterating (client
+        disconnect).
+        """
+        try:
+            yield b': connected\n\n'
+            while True:
+                try:
+                    yield subscription.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    yield b': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
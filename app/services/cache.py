@@ -0,0 +1,107 @@
+"""LRU cache of serialized API responses keyed on the history revision."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Union
+
+
+class CachedResponse(NamedTuple):
+    """A computed result together with its encoded body and entity tag."""
+
+    value: Any
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+    @classmethod
+    def build(cls, value: Any, dumps: Callable[[Any], Union[str, bytes]],
+              headers: Optional[Dict[str, str]] = None) -> 'CachedResponse':
+        """Serialize ``value`` once and derive the ETag from the bytes.
+
+        Text from ``dumps`` gets a trailing newline; bytes are kept as is.
+        """
+        body = dumps(value)
+        if isinstance(body, str):
+            body = (body + '\n').encode()
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        return cls(value, body, etag, dict(headers or {}))
+
+
+class ResponseCache:
+    """Bounded LRU cache with single-flight computation.
+
+    Keys include the history revision, so entries never go stale; they
+    simply stop being requested and age out. Concurrent requests for a key
+    that is being computed wait for that computation instead of repeating
+    it, which is what keeps many dashboards from refitting models and
+    re-encoding the same JSON.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Entries kept before the least recently used is
+                evicted.
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, CachedResponse]' = OrderedDict()
+        self._pending: Dict[Hashable, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        """Get a cached entry, marking it most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: CachedResponse) -> None:
+        """Store an entry, evicting the least recently used beyond the limit."""
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.max_entries, 0):
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable,
+                       compute: Callable[[], CachedResponse]) -> CachedResponse:
+        """Get the entry for ``key``, computing it at most once at a time.
+
+        Exceptions from ``compute`` propagate and nothing is cached.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is computing this key; use its result
+            pending.wait()
+
+        try:
+            entry = compute()
+            self.put(key, entry)
+            return entry
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,285 @@
+"""Collector plugins: per-resource metric readers with their own intervals.
+
+Each plugin reads one resource. Values that do not change while the host
+runs (CPU count, memory and disk sizes, mount points) are
+read once as *facts* and cached; ``collect`` only reads what changes.
+:class:`PluginSource` merges the latest values of every plugin into
+samples shaped like :meth:`MetricsCollector.read_metrics`, so the
+collector can sample at its own rate while plugins refresh at theirs on a
+:class:`TimerWheel`.
+"""
+
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import psutil
+
+from app.services.metrics import NETWORK_FIELDS, format_timestamp
+from app.services.perf import perf
+from app.services.wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Plugins every sample needs, for the fields stored in history
+REQUIRED_COLLECTORS = ('cpu', 'memory', 'disk', 'network')
+# Seconds between re-reads of the cached facts, e.g. after a disk resize
+FACTS_INTERVAL = 3600.0
+
+
+class Collector(ABC):
+    """A metrics plugin. Subclasses set ``name`` and implement ``collect``."""
+
+    name = 'collector'
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether this platform can provide the plugin's metrics."""
+        return True
+
+    def facts(self) -> dict:
+        """Static values, read once and cached by :class:`PluginSource`."""
+        return {}
+
+    @abstractmethod
+    def collect(self, facts: dict) -> dict:
+        """Current values, given the cached ``facts`` of this plugin."""
+
+
+class CpuCollector(Collector):
+    """CPU utilization since the previous collection; never blocks."""
+
+    name = 'cpu'
+
+    def __init__(self, interval: float = 5.0):
+        super().__init__(interval)
+        # The first non-blocking call only starts the measurement
+        psutil.cpu_percent(interval=None)
+
+    def facts(self) -> dict:
+        return {'cpu_count': psutil.cpu_count()}
+
+    def collect(self, facts: dict) -> dict:
+        return {'cpu_percent': psutil.cpu_percent(interval=None)}
+
+
+class MemoryCollector(Collector):
+    """Virtual memory usage."""
+
+    name = 'memory'
+
+    def facts(self) -> dict:
+        return {'memory_total': psutil.virtual_memory().total}
+
+    def collect(self, facts: dict) -> dict:
+        memory = psutil.virtual_memory()
+        return {
+            'memory_percent': memory.percent,
+            'memory_available': memory.available,
+            'memory_used': memory.used,
+        }
+
+
+class DiskCollector(Collector):
+    """Usage of every mounted filesystem; ``/`` also fills the ``disk_*`` fields."""
+
+    name = 'disk'
+
+    def facts(self) -> dict:
+        mountpoints = ['/']
+        try:
+            mountpoints += [partition.mountpoint for partition in psutil.disk_partitions()
+                            if partition.mountpoint != '/']
+        except OSError:
+            pass
+        totals = {}
+        for mountpoint in mountpoints:
+            try:
+                totals[mountpoint] = psutil.disk_usage(mountpoint).total
+            except OSError:
+                continue
+        return {'disk_total': totals.get('/', 0), 'mountpoints': totals}
+
+    def collect(self, facts: dict) -> dict:
+        disks = {}
+        for mountpoint, total in facts['mountpoints'].items():
+            try:
+                usage = psutil.disk_usage(mountpoint)
+            except OSError:
+                continue
+            disks[mountpoint] = {'percent': usage.percent, 'used': usage.used,
+                                 'free': usage.free, 'total': total}
+        # NaN marks the root filesystem as unreadable, as a missing sample
+        root = disks.get('/', {})
+        return {
+            'disk_percent': root.get('percent', float('nan')),
+            'disk_used': root.get('used', float('nan')),
+            'disk_free': root.get('free', float('nan')),
+            'disks': disks,
+        }
+
+
+class NetworkCollector(Collector):
+    """Counters of every interface, and their totals under ``network``."""
+
+    name = 'network'
+
+    def collect(self, facts: dict) -> dict:
+        try:
+            counters = psutil.net_io_counters(pernic=True)
+        except Exception:
+            counters = {}
+        interfaces = {nic: {field: getattr(values, field) for field in NETWORK_FIELDS}
+                      for nic, values in counters.items()}
+        network = {field: sum(values[field] for values in interfaces.values())
+                   for field in NETWORK_FIELDS}
+        return {'network': network, 'interfaces': interfaces}
+
+
+class LoadCollector(Collector):
+    """1, 5 and 15 minute load averages."""
+
+    name = 'load'
+
+    @classmethod
+    def available(cls) -> bool:
+        return hasattr(os, 'getloadavg')
+
+    def collect(self, facts: dict) -> dict:
+        load_1, load_5, load_15 = os.getloadavg()
+        return {'load_1': load_1, 'load_5': load_5, 'load_15': load_15}
+
+
+class TemperatureCollector(Collector):
+    """Current sensor temperatures in Celsius, as ``{'chip/label': value}``."""
+
+    name = 'temperature'
+
+    @classmethod
+    def available(cls) -> bool:
+        return hasattr(psutil, 'sensors_temperatures')
+
+    def collect(self, facts: dict) -> dict:
+        temperatures = {}
+        for chip, sensors in psutil.sensors_temperatures().items():
+            for i, sensor in enumerate(sensors):
+                temperatures[f'{chip}/{sensor.label or i}'] = sensor.current
+        return {'temperatures': temperatures}
+
+
+COLLECTORS = {cls.name: cls for cls in (
+    CpuCollector, MemoryCollector, DiskCollector, NetworkCollector, LoadCollector,
+    TemperatureCollector,
+)}
+
+
+def parse_collectors(spec: str, default_interval: float = 5.0) -> List[Collector]:
+    """Build plugins from ``name:interval`` pairs, e.g. ``cpu:1,disk:30``.
+
+    A name without an interval uses ``default_interval``. Plugins the
+    platform cannot provide are skipped with a warning.
+
+    Raises:
+        ValueError: On unknown names, bad intervals, or when a plugin of
+            ``REQUIRED_COLLECTORS`` is missing.
+    """
+    collectors = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, interval = item.partition(':')
+        name = name.strip()
+        if name not in COLLECTORS:
+            raise ValueError(f"Unknown collector {name!r}; known: {', '.join(COLLECTORS)}")
+        try:
+            seconds = float(interval) if interval else default_interval
+        except ValueError:
+            raise ValueError(f'Invalid interval for collector {name!r}: {interval!r}') from None
+        if seconds <= 0:
+            raise ValueError(f'Interval of collector {name!r} must be positive')
+        cls = COLLECTORS[name]
+        if not cls.available():
+            logger.warning('Collector %s is not available on this platform', name)
+            continue
+        collectors.append(cls(seconds))
+    missing = set(REQUIRED_COLLECTORS) - {collector.name for collector in collectors}
+    if missing:
+        raise ValueError(f"Collectors must include: {', '.join(sorted(missing))}")
+    return collectors
+
+
+class PluginSource:
+    """Latest values of every plugin, merged into samples.
+
+    Usable as a :meth:`MetricsCollector.set_source` source. A plugin that
+    has not been collected yet is collected when a sample is read, so
+    samples are complete even without a scheduler.
+    """
+
+    def __init__(self, collectors: Sequence[Collector]):
+        self.collectors = list(collectors)
+        self._lock = threading.Lock()
+        self._facts: Dict[str, dict] = {}
+        self._values: Dict[str, dict] = {}
+        self.refresh_facts()
+
+    def refresh_facts(self) -> None:
+        """Re-read the cached facts of every plugin."""
+        for collector in self.collectors:
+            try:
+                facts = collector.facts()
+            except Exception:
+                logger.exception('Reading facts of collector %s failed', collector.name)
+                facts = {}
+            with self._lock:
+                self._facts[collector.name] = facts
+
+    def collect(self, collector: Collector) -> None:
+        """Run one plugin and keep its values."""
+        with perf.timer(f'collector.{collector.name}'):
+            try:
+                values = collector.collect(self._facts.get(collector.name, {}))
+            except Exception:
+                logger.exception('Collector %s failed', collector.name)
+                return
+        with self._lock:
+            self._values[collector.name] = values
+
+    def __call__(self) -> Tuple[float, dict]:
+        """The merged sample, as ``(timestamp, metrics)``."""
+        for collector in self.collectors:
+            if collector.name not in self._values:
+                self.collect(collector)
+        now = time.time()
+        metrics = {'timestamp': format_timestamp(now)}
+        with self._lock:
+            for collector in self.collectors:
+                facts = self._facts.get(collector.name, {})
+                metrics.update((key, value) for key, value in facts.items()
+                               if not isinstance(value, dict))
+                metrics.update(self._values.get(collector.name, {}))
+        return now, metrics
+
+    def schedule(self, wheel: TimerWheel, paused: Callable[[], bool] = lambda: False) -> None:
+        """Run every plugin on ``wheel`` at its own interval.
+
+        Args:
+            wheel: Scheduler of the plugin jobs.
+            paused: Skips collection while true, e.g. in processes that
+                read another process's samples.
+        """
+        def job(collector):
+            if not paused():
+                self.collect(collector)
+
+        for collector in self.collectors:
+            wheel.schedule(f'collector.{collector.name}', collector.interval,
+                           lambda collector=collector: job(collector))
+        wheel.schedule('collector.facts', FACTS_INTERVAL, self.refresh_facts)
@@ -0,0 +1,116 @@
+"""Downsampling of metric series for charting."""
+
+from typing import Dict, Sequence
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets point selection.
+
+    Keeps the first and last points and, from each of ``n_out - 2`` equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the mean of the next bucket.
+
+    Returns:
+        Sorted indices of the kept points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.array([0, n - 1][:max(n_out, 0)])
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    # Mean point of every bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    mean_x = np.append(sums_x / sizes, x[-1])
+    mean_y = np.append(sums_y / sizes, y[-1])
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs((x[prev] - mean_x[b + 1]) * (by - y[prev])
+                      - (x[prev] - bx) * (mean_y[b + 1] - y[prev]))
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the minimum and maximum of ``(n_out - 2) // 2`` equal buckets.
+
+    Computed without a Python loop over buckets; always keeps the first
+    and last points, which count towards ``n_out``.
+
+    Returns:
+        Sorted unique indices of at most ``n_out`` kept points.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    if n_out < 4:
+        return thin(np.arange(n), n_out)
+    buckets = (n_out - 2) // 2
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.intp)
+    width = int(np.diff(edges).max())
+    # Pad buckets to a common width and reduce along rows
+    index = edges[:-1, np.newaxis] + np.arange(width)
+    valid = index < edges[1:, np.newaxis]
+    index = np.minimum(index, n - 1)
+    values = y[index]
+    low = np.where(valid, values, np.inf).argmin(axis=1)
+    high = np.where(valid, values, -np.inf).argmax(axis=1)
+    rows = np.arange(buckets)
+    kept = np.concatenate([index[rows, low], index[rows, high], [0, n - 1]])
+    return np.unique(kept)
+
+
+def thin(indices: np.ndarray, n_out: int) -> np.ndarray:
+    """Evenly spaced ``n_out`` of the sorted ``indices``, keeping the last one.
+
+    The first one is kept as well whenever ``n_out`` is at least 2.
+    """
+    if len(indices) <= n_out:
+        return indices
+    if n_out < 2:
+        return indices[len(indices) - n_out:]
+    positions = np.linspace(0, len(indices) - 1, n_out).round().astype(np.intp)
+    return indices[positions]
+
+
+def downsample(columns: Dict[str, np.ndarray], fields: Sequence[str], max_points: int,
+               method: str = 'lttb') -> Dict[str, np.ndarray]:
+    """Reduce ``columns`` to at most ``max_points`` rows.
+
+    Each field gets an equal share of the budget, endpoints included; the
+    union of the points selected for every field is kept, so rows stay
+    aligned across fields. Fields share their endpoints, so the union
+    rarely exceeds the budget; when it does, it is thinned evenly, keeping
+    the first and last rows. NaN values are treated as zero when selecting
+    points.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown downsampling method: {method}')
+    timestamps = columns['timestamp']
+    if len(timestamps) <= max_points or not fields:
+        return columns
+
+    share = max(2, max_points // len(fields))
+    selected = []
+    for field in fields:
+        y = np.nan_to_num(np.asarray(columns[field], dtype=float))
+        if method == 'lttb':
+            selected.append(lttb(timestamps, y, share))
+        else:
+            selected.append(minmax(y, share))
+    keep = thin(np.unique(np.concatenate(selected)), max_points)
+    return {name: values[keep] for name, values in columns.items()}
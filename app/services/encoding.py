@@ -0,0 +1,61 @@
+"""Response encodings negotiated from the ``Accept`` header.
+
+JSON is always available; msgpack and Arrow IPC need the optional
+``msgpack`` and ``pyarrow`` packages.
+"""
+
+from typing import Any
+
+from app.services.perf import perf
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+# In order of preference when the client accepts several
+MIMETYPES = (JSON, MSGPACK, ARROW)
+
+FORMATS = {'json': JSON, 'msgpack': MSGPACK, 'arrow': ARROW}
+
+
+class UnsupportedEncoding(ValueError):
+    """The requested encoding is unavailable for this response."""
+
+
+@perf.timed('serialize.binary')
+def encode(value: Any, mimetype: str) -> bytes:
+    """Encode a response value as msgpack or Arrow IPC.
+
+    Arrow only encodes the columnar layout (a mapping of equally long
+    lists), as a single record batch stream.
+
+    Raises:
+        UnsupportedEncoding: If the value or the installed packages do
+            not support the encoding.
+    """
+    if mimetype == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedEncoding('msgpack support is not installed') from None
+        return msgpack.packb(value, use_bin_type=True)
+    if mimetype == ARROW:
+        if not _is_columnar(value):
+            raise UnsupportedEncoding('Arrow is only available for the columnar layout')
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise UnsupportedEncoding('Arrow support is not installed') from None
+        table = pa.table(value)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    raise UnsupportedEncoding(f'Unsupported encoding: {mimetype}')
+
+
+def _is_columnar(value: Any) -> bool:
+    if not isinstance(value, dict) or not value:
+        return False
+    lengths = {len(v) if isinstance(v, list) else -1 for v in value.values()}
+    return len(lengths) == 1 and -1 not in lengths
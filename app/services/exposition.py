@@ -0,0 +1,157 @@
+"""Prometheus exposition of the latest sample, summary, anomaly and alert state."""
+
+import math
+import threading
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from app.services.metrics import SUMMARY_FIELDS, parse_timestamp
+
+OPENMETRICS = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_TEXT = 'text/plain; version=0.0.4; charset=utf-8'
+
+PREFIX = 'system_monitor_'
+
+# (sample field, family name, type, help)
+SAMPLE_FAMILIES = (
+    ('cpu_percent', 'cpu_usage_percent', 'gauge', 'CPU utilization in percent.'),
+    ('memory_percent', 'memory_usage_percent', 'gauge', 'Memory utilization in percent.'),
+    ('disk_percent', 'disk_usage_percent', 'gauge', 'Disk utilization of / in percent.'),
+    ('cpu_count', 'cpu_count', 'gauge', 'Logical CPUs.'),
+    ('memory_total', 'memory_total_bytes', 'gauge', 'Total physical memory.'),
+    ('memory_available', 'memory_available_bytes', 'gauge', 'Memory available to processes.'),
+    ('memory_used', 'memory_used_bytes', 'gauge', 'Memory in use.'),
+    ('disk_total', 'disk_total_bytes', 'gauge', 'Size of the / filesystem.'),
+    ('disk_used', 'disk_used_bytes', 'gauge', 'Used space on /.'),
+    ('disk_free', 'disk_free_bytes', 'gauge', 'Free space on /.'),
+    ('bytes_sent', 'network_sent_bytes', 'counter', 'Bytes sent on all interfaces.'),
+    ('bytes_recv', 'network_received_bytes', 'counter', 'Bytes received on all interfaces.'),
+    ('packets_sent', 'network_sent_packets', 'counter', 'Packets sent on all interfaces.'),
+    ('packets_recv', 'network_received_packets', 'counter',
+     'Packets received on all interfaces.'),
+    ('load_1', 'load1', 'gauge', '1-minute load average.'),
+    ('load_5', 'load5', 'gauge', '5-minute load average.'),
+    ('load_15', 'load15', 'gauge', '15-minute load average.'),
+    ('anomaly_score', 'anomaly_score', 'gauge',
+     'Streaming anomaly score (largest z-score) of the latest sample.'),
+    ('anomaly', 'anomaly', 'gauge', '1 if the latest sample was flagged as anomalous.'),
+)
+
+SUMMARY_STATS = ('avg', 'min', 'max', 'std', 'p50', 'p95', 'p99')
+
+
+def format_value(value: Optional[float]) -> str:
+    """Format a sample value, including the special float values."""
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(int(value)) if value.is_integer() and abs(value) < 2 ** 53 else repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    body = ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+    return f'{{{body}}}' if body else ''
+
+
+class _Writer:
+    """Accumulates families in either text format."""
+
+    def __init__(self, openmetrics: bool):
+        self.openmetrics = openmetrics
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str,
+               samples: Sequence[Tuple[Sequence[Tuple[str, str]], Optional[float]]]) -> None:
+        full = PREFIX + name
+        # The classic format names counter families after their samples
+        family = full if self.openmetrics or kind != 'counter' else full + '_total'
+        self.lines.append(f'# HELP {family} {help_text}')
+        self.lines.append(f'# TYPE {family} {kind}')
+        suffix = '_total' if kind == 'counter' else ''
+        for labels, value in samples:
+            self.lines.append(f'{full}{suffix}{_labels(labels)} {format_value(value)}')
+
+    def render(self) -> bytes:
+        if self.openmetrics:
+            self.lines.append('# EOF')
+        return ('\n'.join(self.lines) + '\n').encode()
+
+
+def render(host: str, metrics: Optional[Mapping], summary: Mapping, alerts: Mapping,
+           rules: Sequence[Tuple[str, str]] = (), openmetrics: bool = True) -> bytes:
+    """Render the exposition payload.
+
+    Args:
+        host: Value of the ``host`` label on every sample.
+        metrics: Latest sample as collected (network counters nested), or
+            None before the first sample.
+        summary: Rolling summary as returned by ``get_summary``.
+        alerts: Alert state, ``{'alerts': [...], 'count': n}``.
+        rules: ``(name, severity)`` of every alert rule, exported as 0 while
+            not firing so that alert series do not disappear.
+        openmetrics: OpenMetrics 1.0 text, otherwise the classic
+            Prometheus 0.0.4 text format.
+    """
+    writer = _Writer(openmetrics)
+    base = (('host', host),)
+    if metrics:
+        values = {**metrics, **(metrics.get('network') or {})}
+        for field, name, kind, help_text in SAMPLE_FAMILIES:
+            if field in values:
+                writer.family(name, kind, help_text, [(base, values[field])])
+        writer.family('sample_timestamp_seconds', 'gauge',
+                      'Collection time of the latest sample.',
+                      [(base, parse_timestamp(metrics['timestamp']))])
+
+    samples = []
+    for resource in SUMMARY_FIELDS:
+        stats = summary.get(resource) or {}
+        samples.extend(((*base, ('resource', resource), ('stat', stat)), stats[stat])
+                       for stat in SUMMARY_STATS if stat in stats)
+    if samples:
+        writer.family('usage_window_percent', 'gauge',
+                      'Statistics of utilization over the in-memory history window.', samples)
+        writer.family('window_samples', 'gauge', 'Samples in the history window.',
+                      [(base, summary.get('samples', 0))])
+
+    active = {(alert['type'], alert['severity']) for alert in alerts.get('alerts', [])}
+    states = sorted(set(rules) | active)
+    writer.family('alert_active', 'gauge', '1 while the alert fires at this severity.',
+                  [((*base, ('alert', name), ('severity', severity)),
+                    1 if (name, severity) in active else 0) for name, severity in states])
+    writer.family('alerts_active', 'gauge', 'Active alerts.', [(base, alerts.get('count', 0))])
+    return writer.render()
+
+
+class Exposition:
+    """The latest exposition payload, rendered once per sample.
+
+    ``update`` renders both text formats; scrapes only pick up the
+    prebuilt bytes, so they never touch psutil or the models.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self._lock = threading.Lock()
+        self.renders = 0
+        self._payloads = {True: b'# EOF\n', False: b''}
+
+    def update(self, metrics: Optional[Mapping], summary: Mapping, alerts: Mapping,
+               rules: Sequence[Tuple[str, str]] = ()) -> None:
+        """Render the payloads for a new sample."""
+        payloads = {openmetrics: render(self.host, metrics, summary, alerts, rules, openmetrics)
+                    for openmetrics in (True, False)}
+        with self._lock:
+            self._payloads = payloads
+            self.renders += 1
+
+    def payload(self, openmetrics: bool = True) -> bytes:
+        """The latest payload in the requested format."""
+        return self._payloads[openmetrics]
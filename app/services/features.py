@@ -0,0 +1,142 @@
+"""Windowed features for the anomaly detector, computed with NumPy."""
+
+import threading
+from collections.abc import Mapping
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.services.metrics import NETWORK_FIELDS, parse_timestamp
+
+USAGE_FIELDS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+
+def columns_from_rows(history: Sequence[dict], fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    """Column arrays of ``fields`` from sample dictionaries.
+
+    Network counters are read from the nested ``network`` mapping of
+    collected samples or from flat rows; missing values become 0.
+    ``timestamp`` (ISO or epoch) is included when every row has one.
+    """
+    columns = {}
+    for name in fields:
+        if name in NETWORK_FIELDS:
+            values = [(row.get('network') or row).get(name, 0) for row in history]
+        else:
+            values = [row.get(name, 0) for row in history]
+        columns[name] = np.array([0 if value is None else value for value in values], dtype=float)
+    try:
+        columns['timestamp'] = np.array([
+            value if isinstance(value, (int, float)) else parse_timestamp(value)
+            for value in (row['timestamp'] for row in history)], dtype=float)
+    except (KeyError, TypeError, ValueError):
+        pass
+    return columns
+
+
+class FeaturePipeline:
+    """Per-sample features that expose rate-of-change and volatility anomalies.
+
+    For each usage percentage: the value, its change from the previous
+    sample, and its mean and standard deviation over the last ``window``
+    samples; for each cumulative network counter: its rate per second.
+    The raw percentages come first, in the order of ``USAGE_FIELDS``.
+
+    Rows only depend on the ``window`` samples up to them, so with a
+    history ``version`` the matrix is kept between calls and only rows of
+    new samples are computed.
+    """
+
+    def __init__(self, window: int = 20):
+        """Initialize the pipeline.
+
+        Args:
+            window: Samples in the rolling mean and standard deviation.
+        """
+        if window < 2:
+            raise ValueError('window must be at least 2')
+        self.window = window
+        self.names: Tuple[str, ...] = (
+            USAGE_FIELDS
+            + tuple(f'{name}_delta' for name in USAGE_FIELDS)
+            + tuple(f'{name}_mean' for name in USAGE_FIELDS)
+            + tuple(f'{name}_std' for name in USAGE_FIELDS)
+            + tuple(f'{name}_rate' for name in NETWORK_FIELDS)
+        )
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._start = 0
+        self.rows_computed = 0
+
+    def transform(self, history: Union[list, Mapping], version: Optional[int] = None) -> np.ndarray:
+        """Feature matrix of ``history``, one row per sample.
+
+        Args:
+            history: Sample dictionaries, or column arrays as returned by
+                ``MetricsCollector.get_window()``.
+            version: History version of the newest sample; enables reuse
+                of the rows computed for earlier versions.
+        """
+        if not isinstance(history, Mapping):
+            history = columns_from_rows(history, USAGE_FIELDS + NETWORK_FIELDS)
+        n = len(next(iter(history.values()))) if history else 0
+        if version is None:
+            return self.compute(history)
+
+        start = version - n
+        with self._lock:
+            matrix, matrix_start = self._matrix, self._start
+        features = None
+        if matrix is not None:
+            new = version - (matrix_start + len(matrix))
+            if matrix_start <= start and 0 <= new < n:
+                known = matrix[start - matrix_start:]
+                if new:
+                    context = max(0, n - new - self.window)
+                    tail = self.compute({name: values[context:] for name, values in history.items()})
+                    known = np.concatenate([known, tail[-new:]])
+                features = known
+        if features is None:
+            features = self.compute(history)
+
+        with self._lock:
+            self._matrix = features
+            self._start = start
+        return features
+
+    def compute(self, columns: Mapping) -> np.ndarray:
+        """Feature matrix of the given columns, without reusing earlier rows.
+
+        Rows whose window reaches past the first sample treat the earlier
+        samples as equal to it.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        self.rows_computed += n
+        if n == 0:
+            return np.empty((0, len(self.names)))
+
+        def column(name):
+            if name in columns:
+                return np.asarray(columns[name], dtype=float)
+            return np.zeros(n)
+
+        usage = np.column_stack([column(name) for name in USAGE_FIELDS])
+        delta = np.diff(usage, axis=0, prepend=usage[:1])
+        padded = np.concatenate([np.repeat(usage[:1], self.window - 1, axis=0), usage])
+        windows = sliding_window_view(padded, self.window, axis=0)
+
+        counters = np.column_stack([column(name) for name in NETWORK_FIELDS])
+        increase = np.diff(counters, axis=0, prepend=counters[:1])
+        if 'timestamp' in columns:
+            timestamps = np.asarray(columns['timestamp'], dtype=float)
+            elapsed = np.diff(timestamps, prepend=timestamps[:1])
+        else:
+            elapsed = np.ones(n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = increase / elapsed[:, None]
+        # Counter resets and repeated timestamps have no meaningful rate
+        rates[(increase < 0) | ~(elapsed > 0)[:, None]] = 0.0
+
+        features = np.hstack([usage, delta, windows.mean(axis=-1), windows.std(axis=-1), rates])
+        return np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0)
@@ -0,0 +1,308 @@
+"""Per-host metric series fed by bulk ingest from remote agents."""
+
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.metrics import (
+    METRIC_FIELDS, NETWORK_FIELDS, HISTORY_FIELDS, SUMMARY_FIELDS, rows_from_columns,
+)
+from app.services.ringbuffer import RingBuffer
+
+HOST_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._:-]{0,127}$')
+
+# Errors reported back per request; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+# Generous upper bound of one decoded record, used to cap decompression
+MAX_RECORD_BYTES = 4096
+
+
+class IngestError(ValueError):
+    """The ingest payload could not be decoded at all."""
+
+
+class HostSeries:
+    """The in-memory history of one remote host."""
+
+    def __init__(self, host: str, capacity: int):
+        self.host = host
+        self.history = RingBuffer(HISTORY_FIELDS, capacity)
+        self.last_seen = 0.0
+
+    @property
+    def revision(self) -> Tuple[int, int]:
+        """Token that changes whenever the series changes."""
+        return id(self), self.history.sequence
+
+    def extend(self, timestamps: np.ndarray, data: np.ndarray) -> None:
+        """Append samples (``data`` is ``(len(HISTORY_FIELDS), k)``) in time order."""
+        order = np.argsort(timestamps, kind='stable')
+        self.history.extend(timestamps[order], data[:, order])
+        self.last_seen = time.time()
+
+    def get_window(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        return self.history.columns(n)
+
+    def get_latest(self) -> Optional[dict]:
+        rows = rows_from_columns(self.history.columns(1))
+        return rows[0] if rows else None
+
+    def get_summary(self) -> dict:
+        """Summary statistics computed from the window, like the collector's."""
+        columns = self.history.columns()
+        if not len(columns['timestamp']):
+            return {}
+        summary = {name: summarize(columns[field]) for name, field in SUMMARY_FIELDS.items()}
+        summary['samples'] = len(columns['timestamp'])
+        return summary
+
+
+def summarize(values: np.ndarray) -> dict:
+    """Current, mean, min, max, standard deviation and percentiles, NaN-aware."""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+    return {
+        'current': float(values[-1]),
+        'avg': float(values.mean()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'std': float(values.std()),
+        'p50': p50,
+        'p95': p95,
+        'p99': p99,
+    }
+
+
+class HostRegistry:
+    """Per-host series, sharded so concurrent ingests rarely contend.
+
+    A host maps to one of ``shards`` dictionaries by hash; each shard has
+    its own lock, held only to create a series. Each host's part of a
+    batch is written with one vectorized append.
+    """
+
+    def __init__(self, capacity: int = 100, max_hosts: int = 1000, shards: int = 16):
+        """Initialize the registry.
+
+        Args:
+            capacity: Samples kept per host.
+            max_hosts: Hosts accepted before new ones are rejected.
+            shards: Number of independently locked shards.
+        """
+        self.capacity = capacity
+        self.max_hosts = max_hosts
+        self._shards: List[Tuple[threading.Lock, Dict[str, HostSeries]]] = [
+            (threading.Lock(), {}) for _ in range(shards)
+        ]
+        self._count_lock = threading.Lock()
+        self._count = 0
+
+    def _shard(self, host: str) -> Tuple[threading.Lock, Dict[str, HostSeries]]:
+        return self._shards[hash(host) % len(self._shards)]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, host: str) -> Optional[HostSeries]:
+        return self._shard(host)[1].get(host)
+
+    def hosts(self) -> List[HostSeries]:
+        return [series for _, shard in self._shards for series in list(shard.values())]
+
+    def clear(self) -> None:
+        for lock, shard in self._shards:
+            with lock:
+                shard.clear()
+        with self._count_lock:
+            self._count = 0
+
+    def ingest(self, records: List[dict]) -> dict:
+        """Validate and store a batch of samples.
+
+        Each record is ``{"host", "timestamp", <metric fields>...}``, with
+        network counters flat or nested under ``network``. The batch is
+        validated column-wise; invalid records are rejected individually
+        and reported, the rest are written per host in one append each.
+
+        Returns:
+            ``{"accepted", "rejected", "hosts", "errors"}``.
+        """
+        errors: List[str] = []
+        rejected = 0
+        hosts, timestamps, data = self._columns(records)
+        if hosts is None:
+            # Something in the batch is malformed: validate record by record
+            valid = []
+            for i, record in enumerate(records):
+                problem = _validate(record)
+                if problem is None:
+                    valid.append(record)
+                else:
+                    rejected += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f'record {i}: {problem}')
+            hosts, timestamps, data = self._columns(valid)
+
+        accepted = 0
+        written = set()
+        if hosts is not None and len(hosts):
+            hosts = np.asarray(hosts)
+            names, inverse = np.unique(hosts, return_inverse=True)
+            order = np.argsort(inverse, kind='stable')
+            bounds = np.searchsorted(inverse[order], np.arange(len(names) + 1))
+            for j, host in enumerate(names.tolist()):
+                idx = order[bounds[j]:bounds[j + 1]]
+                series = self._series(host)
+                if series is None:
+                    rejected += len(idx)
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f'host {host}: too many hosts (max {self.max_hosts})')
+                    continue
+                series.extend(timestamps[idx], data[:, idx])
+                accepted += len(idx)
+                written.add(host)
+        return {'accepted': accepted, 'rejected': rejected, 'hosts': len(written), 'errors': errors}
+
+    def _series(self, host: str) -> Optional[HostSeries]:
+        lock, shard = self._shard(host)
+        series = shard.get(host)
+        if series is not None:
+            return series
+        with self._count_lock:
+            if self._count >= self.max_hosts:
+                return None
+            with lock:
+                series = shard.get(host)
+                if series is None:
+                    series = shard[host] = HostSeries(host, self.capacity)
+                    self._count += 1
+        return series
+
+    @staticmethod
+    def _columns(records: List[dict]):
+        """Build host, timestamp and field columns in bulk.
+
+        Returns ``(None, None, None)`` if any record is malformed, so the
+        caller can fall back to per-record validation.
+        """
+        try:
+            hosts = [r['host'] for r in records]
+            if not all(type(h) is str and HOST_PATTERN.match(h) for h in set(hosts)):
+                return None, None, None
+            column = [r['timestamp'] for r in records]
+            # float64 conversion would accept numeric strings and booleans
+            if not _all_numbers(column):
+                return None, None, None
+            timestamps = np.array(column, dtype=np.float64)
+            if not np.all(np.isfinite(timestamps)):
+                return None, None, None
+            data = np.full((len(HISTORY_FIELDS), len(records)), np.nan)
+            for f, name in enumerate(METRIC_FIELDS):
+                if name in NETWORK_FIELDS:
+                    column = [r.get(name, (r.get('network') or {}).get(name)) for r in records]
+                else:
+                    column = [r.get(name) for r in records]
+                if not _all_numbers(column, optional=True):
+                    return None, None, None
+                data[f] = np.array(column, dtype=np.float64)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None, None, None
+        return hosts, timestamps, data
+
+
+def _validate(record) -> Optional[str]:
+    """Describe what is wrong with one record, or None if it is valid."""
+    if not isinstance(record, dict):
+        return 'not an object'
+    host = record.get('host')
+    if not isinstance(host, str) or not HOST_PATTERN.match(host):
+        return 'missing or invalid host'
+    ts = record.get('timestamp')
+    if not _is_number(ts) or not math.isfinite(ts):
+        return 'missing or invalid timestamp'
+    network = record.get('network')
+    if network is not None and not isinstance(network, dict):
+        return 'network must be an object'
+    for name in METRIC_FIELDS:
+        value = record.get(name)
+        if value is None and name in NETWORK_FIELDS and network:
+            value = network.get(name)
+        if value is not None and not _is_number(value):
+            return f'{name} must be a number'
+    return None
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _all_numbers(values: list, optional: bool = False) -> bool:
+    """Whether every value passes :func:`_is_number` (or is None, if ``optional``).
+
+    Checks each distinct type once, so the bulk path stays cheap.
+    """
+    return all((optional and cls is type(None))
+               or (issubclass(cls, (int, float)) and not issubclass(cls, bool))
+               for cls in set(map(type, values)))
+
+
+def gunzip(body: bytes, max_size: int) -> bytes:
+    """Decompress a gzip request body of at most ``max_size`` bytes."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_size)
+    except zlib.error as e:
+        raise IngestError(f'invalid gzip body ({e})') from None
+    if decompressor.unconsumed_tail:
+        raise IngestError(f'decompressed body exceeds {max_size} bytes')
+    return data
+
+
+def decode_ndjson(body: bytes) -> List[dict]:
+    """Decode newline-delimited JSON in a single parser call.
+
+    A body holding one JSON array of samples is accepted as well.
+    """
+    lines = [line for line in body.split(b'\n') if line.strip()]
+    if not lines:
+        return []
+    try:
+        items = json.loads(b'[' + b','.join(lines) + b']')
+        if len(items) == 1 and isinstance(items[0], list):
+            return items[0]
+        return items
+    except ValueError:
+        # Find the offending line for the error message
+        for i, line in enumerate(lines):
+            try:
+                json.loads(line)
+            except ValueError as e:
+                raise IngestError(f'line {i + 1}: invalid JSON ({e})') from None
+        raise IngestError('invalid NDJSON') from None
+
+
+def decode_msgpack(body: bytes) -> List[dict]:
+    """Decode a msgpack array of samples or a stream of sample maps.
+
+    Requires the optional ``msgpack`` package.
+    """
+    import msgpack
+
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(body)
+    try:
+        items = list(unpacker)
+    except (ValueError, msgpack.exceptions.UnpackException) as e:
+        raise IngestError(f'invalid msgpack ({e})') from None
+    if len(items) == 1 and isinstance(items[0], list):
+        return items[0]
+    return items
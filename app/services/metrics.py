@@ -1,28 +1,317 @@
 """System metrics collection service."""
 
+import json
+import logging
+import threading
 import time
-from collections import deque
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import psutil
 
+from app.services.perf import perf
+from app.services.ringbuffer import RingBuffer
+from app.services.shared import SharedRingBuffer
+from app.services.storage import TimeSeriesStore
+from app.services.stats import RollingStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_SIZE = 100
+
+# Columns stored per sample in the history ring buffer. The three usage
+# percentages come first so they sit next to each other in memory.
+METRIC_FIELDS = (
+    'cpu_percent',
+    'memory_percent',
+    'disk_percent',
+    'cpu_count',
+    'memory_total',
+    'memory_available',
+    'memory_used',
+    'disk_total',
+    'disk_used',
+    'disk_free',
+    'bytes_sent',
+    'bytes_recv',
+    'packets_sent',
+    'packets_recv',
+)
+# Per-sample annotations written by enrichers, e.g. streaming anomaly
+# scores. NaN until an enricher provides them.
+ANNOTATION_FIELDS = ('anomaly_score', 'anomaly')
+HISTORY_FIELDS = METRIC_FIELDS + ANNOTATION_FIELDS
+SUMMARY_FIELDS = {'cpu': 'cpu_percent', 'memory': 'memory_percent', 'disk': 'disk_percent'}
+NETWORK_FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv')
+_INT_FIELDS = frozenset(METRIC_FIELDS[3:])
+
+
+def format_timestamp(ts: float) -> str:
+    """Format an epoch timestamp the way samples report it."""
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def parse_timestamp(value: str) -> float:
+    """Inverse of :func:`format_timestamp`."""
+    return datetime.fromisoformat(value).timestamp()
+
+
+def rows_from_columns(columns: Dict[str, np.ndarray],
+                      fields: Optional[List[str]] = None) -> List[dict]:
+    """Convert column arrays to sample dictionaries.
+
+    Without ``fields`` rows have the shape of collected samples, with the
+    counters nested under ``network``. With ``fields`` rows are flat and
+    hold only ``timestamp`` and those fields. NaN becomes None.
+    """
+    names = list(HISTORY_FIELDS) if fields is None else list(fields)
+    rows = np.column_stack([columns[name] for name in names]).tolist() if names else []
+    history = []
+    for i, ts in enumerate(columns['timestamp'].tolist()):
+        metrics = {'timestamp': format_timestamp(ts)}
+        for name, value in zip(names, rows[i] if names else ()):
+            if value != value:
+                value = None
+            elif name in _INT_FIELDS:
+                value = int(value)
+            metrics[name] = value
+        if fields is None:
+            metrics['network'] = {name: metrics.pop(name) for name in NETWORK_FIELDS}
+        history.append(metrics)
+    return history
+
+
+def lists_from_columns(columns: Dict[str, np.ndarray],
+                       fields: Optional[List[str]] = None) -> Dict[str, list]:
+    """Convert column arrays to the columnar response layout.
+
+    The columnar counterpart of :func:`rows_from_columns`: one flat list
+    per field plus ``timestamp`` as epoch seconds, built with a single
+    ``tolist`` per column instead of a dict per row. NaN becomes None.
+    """
+    names = list(HISTORY_FIELDS) if fields is None else list(fields)
+    result = {'timestamp': columns['timestamp'].tolist()}
+    for name in names:
+        values = columns[name]
+        missing = np.isnan(values)
+        if not missing.any():
+            result[name] = (values.astype(np.int64) if name in _INT_FIELDS else values).tolist()
+        else:
+            result[name] = [None if m else v for m, v in zip(missing.tolist(), values.tolist())]
+    return result
+
 
 class MetricsCollector:
     """Collects and stores system metrics."""
 
     _instance: Optional['MetricsCollector'] = None
-    _history: deque
+    _history: RingBuffer
+    _stats: Dict[str, RollingStats]
+    _enrichers: List[Callable[[float, dict], Optional[dict]]]
+    _listeners: List[Callable[[dict], None]]
+    _latest: Optional[dict]
+    _shared: Optional[SharedRingBuffer]
+    _store: Optional[TimeSeriesStore]
+    _source: Optional[Callable[[], Tuple[float, dict]]]
+    _extras: Dict[str, Any]
 
     def __new__(cls):
         """Singleton pattern for shared history."""
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance._history = deque(maxlen=100)
+            cls._instance._lock = threading.Lock()
+            cls._instance._history = RingBuffer(HISTORY_FIELDS, DEFAULT_HISTORY_SIZE)
+            cls._instance._stats = cls._instance._new_stats(DEFAULT_HISTORY_SIZE)
+            cls._instance._enrichers = []
+            cls._instance._listeners = []
+            cls._instance._notified_seq = 0
+            cls._instance._latest = None
+            cls._instance._shared = None
+            cls._instance._store = None
+            cls._instance._store_retention = None
+            cls._instance._published = (0, {})
+            cls._instance._epoch = 0
+            cls._instance._source = None
+            cls._instance._extras = {}
         return cls._instance
 
+    @staticmethod
+    def _new_stats(capacity: int) -> Dict[str, RollingStats]:
+        return {key: RollingStats(capacity) for key in SUMMARY_FIELDS.values()}
+
+    @property
+    def history_size(self) -> int:
+        """Maximum number of samples kept in history."""
+        return self._history.capacity
+
+    def set_history_size(self, size: int) -> None:
+        """Resize the history buffer, keeping the most recent samples."""
+        if size == self._history.capacity:
+            return
+        if self._shared is not None:
+            raise RuntimeError('Cannot resize shared history')
+        with self._lock:
+            self._history = self._history.resized(size)
+            self._epoch += 1
+            self._rebuild_stats()
+
+    def _rebuild_stats(self) -> None:
+        """Recompute the rolling aggregates from the current history."""
+        history = self._history
+        stats = self._new_stats(history.capacity)
+        for key, rolling in stats.items():
+            for value in history.column(key).tolist():
+                rolling.update(value)
+        self._stats = stats
+
+    @property
+    def is_reader(self) -> bool:
+        """Whether another process writes the shared history we read."""
+        return self._shared is not None and not self._shared.is_writer
+
+    def use_shared_history(self, path: str) -> None:
+        """Keep history in a memory-mapped file shared by all processes.
+
+        One process becomes the writer and samples; the others read its
+        history, latest sample and summary instead of sampling themselves.
+        Call after ``set_history_size``; the current history is discarded.
+        """
+        with self._lock:
+            self._shared = SharedRingBuffer(path, HISTORY_FIELDS, self._history.capacity)
+            self._history = self._shared
+            self._epoch += 1
+            self._latest = None
+            self._published = (0, {})
+            if self._shared.is_writer:
+                self._rebuild_stats()
+
+    def use_store(self, path: str, retention: Optional[Dict[str, float]] = None) -> None:
+        """Persist samples to an on-disk store with rollup tiers.
+
+        When history is empty (e.g. after a restart) it is refilled from
+        the most recent stored samples. Readers of shared history open the
+        store read-only.
+        """
+        with self._lock:
+            self._store = TimeSeriesStore(path, HISTORY_FIELDS, retention,
+                                          read_only=self.is_reader)
+            self._store_retention = retention
+            if not self.is_reader and not len(self._history):
+                self._restore_history()
+
+    def _restore_history(self) -> None:
+        """Refill history and summary state from the store's newest samples."""
+        stored = self._store.tail(self._history.capacity)
+        if not len(stored['timestamp']):
+            return
+        data = np.vstack([stored[name] for name in HISTORY_FIELDS])
+        self._history.extend(stored['timestamp'], data)
+        self._rebuild_stats()
+
+    def sample(self) -> Optional[dict]:
+        """Take a sample if this process is responsible for sampling.
+
+        With shared history only the writer samples. A reader takes over
+        the writer role if the previous writer has gone away.
+        """
+        shared = self._shared
+        if shared is not None and not shared.is_writer:
+            if not shared.try_acquire_writer():
+                self._notify_published()
+                return None
+            with self._lock:
+                self._rebuild_stats()
+                if self._store is not None:
+                    self._store = TimeSeriesStore(self._store.path, HISTORY_FIELDS,
+                                                  self._store_retention)
+        return self.get_current_metrics()
+
+    def set_source(self, source: Optional[Callable[[], Tuple[float, dict]]]) -> None:
+        """Read samples from ``source`` instead of psutil.
+
+        ``source`` returns ``(timestamp, metrics)`` like :meth:`read_metrics`,
+        e.g. a synthetic generator for benchmarks; None restores psutil.
+        """
+        self._source = source
+
+    def extend_history(self, timestamps: np.ndarray, columns: Dict[str, np.ndarray]) -> None:
+        """Bulk-append samples given as columns, bypassing enrichers and listeners.
+
+        Fields missing from ``columns`` are stored as NaN. The rolling
+        aggregates are rebuilt from the resulting history.
+        """
+        if self.is_reader:
+            raise RuntimeError('Only the shared-history writer can append samples')
+        data = np.full((len(HISTORY_FIELDS), len(timestamps)), np.nan)
+        for i, name in enumerate(HISTORY_FIELDS):
+            if name in columns:
+                data[i] = columns[name]
+        with self._lock:
+            self._history.extend(timestamps, data)
+            self._rebuild_stats()
+
+    def add_enricher(self, enricher: Callable[[float, dict], Optional[dict]]) -> None:
+        """Register a hook run on every sample before it is stored.
+
+        The enricher is called with the epoch timestamp and the sample and
+        may return extra fields (see ``ANNOTATION_FIELDS``) to merge into
+        the sample. Enrichers run on the sampling thread, so they must be
+        cheap. Registering the same enricher twice has no effect.
+        """
+        if enricher not in self._enrichers:
+            self._enrichers.append(enricher)
+
+    def add_listener(self, listener: Callable[[dict], None]) -> None:
+        """Register a callback notified with every new sample.
+
+        Listeners run on the sampling thread after the sample is stored
+        (in reader processes of shared history, when the writer's sample
+        is first seen), so they should hand work off quickly. Registering
+        the same listener twice has no effect.
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, metrics: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(metrics)
+            except Exception:
+                logger.exception('Metrics listener failed')
+
+    def _notify_published(self) -> None:
+        """Notify listeners of a sample the shared-history writer published."""
+        state = self._read_published()
+        seq = self._published[0]
+        if seq != self._notified_seq and state.get('latest'):
+            self._notified_seq = seq
+            self._notify(state['latest'])
+
+    def clear(self) -> None:
+        """Drop all history and summary state."""
+        with self._lock:
+            if not self.is_reader:
+                self._history.clear()
+            for rolling in self._stats.values():
+                rolling.clear()
+            self._latest = None
+
     def get_current_metrics(self) -> dict:
         """Collect current system metrics."""
+        with perf.timer('metrics.collect'):
+            now, metrics = (self._source or self.read_metrics)()
+        with perf.timer('metrics.record'):
+            self._record(now, metrics)
+        return metrics
+
+    @staticmethod
+    def read_metrics() -> Tuple[float, dict]:
+        """Read system metrics from psutil without recording them.
+
+        Returns:
+            ``(timestamp, metrics)``, the epoch time and the sample.
+        """
         cpu_percent = psutil.cpu_percent(interval=0.1)
         memory = psutil.virtual_memory()
         disk = psutil.disk_usage('/')
@@ -43,8 +332,9 @@ class MetricsCollector:
                 'packets_recv': 0,
             }
 
+        now = time.time()
         metrics = {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': format_timestamp(now),
             'cpu_percent': cpu_percent,
             'cpu_count': psutil.cpu_count(),
             'memory_percent': memory.percent,
@@ -58,42 +348,176 @@ class MetricsCollector:
             'network': network,
         }
 
-        # Store in history
-        self._history.append(metrics)
+        return now, metrics
 
-        return metrics
+    def _record(self, timestamp: float, metrics: dict) -> None:
+        """Store a sample in history and update the rolling aggregates."""
+        if self.is_reader:
+            # Only the writer stores samples in shared history
+            self._latest = metrics
+            return
+
+        for enricher in self._enrichers:
+            extra = enricher(timestamp, metrics)
+            if extra:
+                metrics.update(extra)
+
+        with self._lock:
+            history = self._history
+            full = len(history) == history.capacity
+            for key, rolling in self._stats.items():
+                evicted = history.oldest(key) if full else None
+                rolling.update(metrics[key], evicted)
+            row = {**metrics, **metrics['network']}
+            history.append(timestamp, row)
+            self._latest = metrics
+
+        if self._store is not None:
+            try:
+                self._store.append(timestamp, row)
+            except OSError:
+                # e.g. a full disk: history and listeners carry on
+                logger.exception('Persisting the sample failed')
+
+        if self._shared is not None:
+            try:
+                self._publish()
+            except Exception:
+                # Readers keep the previous state; listeners still run
+                logger.exception('Publishing the latest sample failed')
+        self._notify(metrics)
+
+    def _publish(self) -> None:
+        """Share the latest sample, summary and extras with reader processes."""
+        summary = self._local_summary()
+        extras = dict(self._extras)
+        payload = json.dumps({'latest': self._latest, 'summary': summary,
+                              'extras': extras}).encode()
+        if len(payload) > self._shared.blob_size:
+            # Per-mount, per-NIC and per-sensor detail can outgrow the slot
+            latest = {key: value for key, value in self._latest.items()
+                      if key == 'network' or not isinstance(value, dict)}
+            payload = json.dumps({'latest': latest, 'summary': summary,
+                                  'extras': extras}).encode()
+        self._shared.publish(payload)
+
+    def share(self, name: str, value: Any) -> None:
+        """Publish ``value`` to readers of shared history under ``name``.
+
+        Values go out with each sample the writer records, starting with
+        the next one, and must be JSON-serializable. Readers get them from
+        :meth:`get_shared`.
+        """
+        self._extras[name] = value
+
+    def get_shared(self, name: str) -> Any:
+        """Get a value shared with :meth:`share`, or None if there is none.
+
+        Readers of shared history get the value the writer last published;
+        other processes get their own.
+        """
+        if self.is_reader:
+            return self._read_published().get('extras', {}).get(name)
+        return self._extras.get(name)
+
+    def _read_published(self) -> dict:
+        """Latest state published by the writer, parsed once per update."""
+        seq, payload = self._shared.read_published()
+        cached_seq, state = self._published
+        if seq != cached_seq:
+            state = json.loads(payload) if payload else {}
+            self._published = (seq, state)
+        return state
+
+    def get_latest(self) -> dict:
+        """Get the most recent sample without touching psutil.
+
+        Falls back to collecting a sample if none has been taken yet, e.g.
+        when the background sampler is disabled.
+        """
+        if self.is_reader:
+            latest = self._read_published().get('latest') or self._latest
+        else:
+            latest = self._latest
+        if latest is None:
+            latest = self.get_current_metrics()
+        return latest
+
+    def get_window(self, n: Optional[int] = None, copy: bool = False) -> Dict[str, np.ndarray]:
+        """Get the most recent ``n`` samples as zero-copy column views.
+
+        Keys are ``timestamp`` (epoch seconds) and every name in
+        ``HISTORY_FIELDS``. Views change as the sampler appends; with
+        ``copy`` the columns are copied under the collector lock, so they
+        hold exactly the samples of one instant.
+        """
+        if not copy:
+            return self._history.columns(n)
+        with self._lock:
+            return {name: values.copy() for name, values in self._history.columns(n).items()}
+
+    @property
+    def version(self) -> int:
+        """History version: the number of samples ever recorded."""
+        return self._history.total
+
+    def revision(self) -> Tuple[int, int]:
+        """Token that changes whenever the history changes.
+
+        Unlike :meth:`version` it also changes when the history is cleared
+        or replaced, so it can key caches of results derived from history.
+        """
+        return self._epoch, self._history.sequence
+
+    def get_versioned_window(self, n: Optional[int] = None) -> Tuple[int, Dict[str, np.ndarray]]:
+        """Get the history version together with the matching window."""
+        return self._history.snapshot(n)
+
+    def get_range(self, start: float, end: float,
+                  max_points: Optional[int] = None) -> Tuple[str, Dict[str, np.ndarray]]:
+        """Get samples with ``start <= timestamp <= end`` as columns.
+
+        With a store attached, the store picks the finest tier that holds
+        the range within ``max_points``; rollup tiers hold bucket means in
+        the field columns plus ``count`` and ``<field>_min``/``_max``.
+        Without a store the in-memory history is filtered.
+
+        Returns:
+            ``(tier, columns)``, where tier is ``raw``, ``1m`` or ``1h``.
+        """
+        if self._store is not None:
+            return self._store.query(start, end, max_points=max_points)
+        columns = self.get_window(copy=True)
+        timestamps = columns['timestamp']
+        lo = int(np.searchsorted(timestamps, start, side='left'))
+        hi = int(np.searchsorted(timestamps, end, side='right'))
+        return 'raw', {name: values[lo:hi] for name, values in columns.items()}
+
+    def flush(self) -> None:
+        """Flush persisted samples to disk."""
+        if self._store is not None and not self._store.read_only:
+            self._store.flush()
 
     def get_history(self) -> list:
         """Get historical metrics data."""
-        return list(self._history)
+        return rows_from_columns(self.get_window(copy=True))
 
     def get_summary(self) -> dict:
-        """Get summary statistics from history."""
-        if not self._history:
-            return {}
-
-        cpu_values = [m['cpu_percent'] for m in self._history]
-        memory_values = [m['memory_percent'] for m in self._history]
-        disk_values = [m['disk_percent'] for m in self._history]
-
-        return {
-            'cpu': {
-                'current': cpu_values[-1] if cpu_values else 0,
-                'avg': sum(cpu_values) / len(cpu_values),
-                'min': min(cpu_values),
-                'max': max(cpu_values),
-            },
-            'memory': {
-                'current': memory_values[-1] if memory_values else 0,
-                'avg': sum(memory_values) / len(memory_values),
-                'min': min(memory_values),
-                'max': max(memory_values),
-            },
-            'disk': {
-                'current': disk_values[-1] if disk_values else 0,
-                'avg': sum(disk_values) / len(disk_values),
-                'min': min(disk_values),
-                'max': max(disk_values),
-            },
-            'samples': len(self._history),
-        }
+        """Get summary statistics from history.
+
+        Aggregates are maintained incrementally as samples arrive, so this
+        is O(1) regardless of history length. Readers of shared history get
+        the summary published by the writer.
+        """
+        if self.is_reader:
+            return self._read_published().get('summary', {})
+        return self._local_summary()
+
+    def _local_summary(self) -> dict:
+        with self._lock:
+            if not len(self._history):
+                return {}
+
+            summary = {name: self._stats[key].summary() for name, key in SUMMARY_FIELDS.items()}
+            summary['samples'] = len(self._history)
+        return summary
@@ -0,0 +1,394 @@
+"""Non-blocking delivery of alert notifications to webhooks and files."""
+
+import http.client
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from app.services.stats import HistogramSketch
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """A notification batch could not be delivered."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def redact_url(url: str) -> str:
+    """``url`` reduced to ``scheme://host[:port]``, with ``/…`` if it had more.
+
+    Webhook URLs tend to carry their credentials (Slack and Teams tokens,
+    API keys) in the path, query or user info, so only this form is shown
+    in stats and logs.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or ''
+    if ':' in host:
+        host = f'[{host}]'
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = f'{host}:{port}' if port else host
+    rest = '/…' if parts.path.strip('/') or parts.query or parts.username else ''
+    return f'{parts.scheme}://{netloc}{rest}'
+
+
+class NotificationTarget(ABC):
+    """Destination of notification batches."""
+
+    name = 'target'
+
+    @abstractmethod
+    def send(self, batch: List[dict]) -> None:
+        """Deliver ``batch``; raises :class:`DeliveryError` on failure."""
+
+    def close(self) -> None:
+        """Release connections or file handles."""
+
+
+class HTTPClient:
+    """POSTs to one URL over a reused keep-alive connection.
+
+    Not thread-safe: each client is meant to be driven by one thread, so
+    one connection per client is the whole pool. The connection is only
+    reopened after an error or when the server closes it.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        """Initialize the client.
+
+        Args:
+            url: ``http://`` or ``https://`` endpoint.
+            timeout: Socket timeout per request, in seconds.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'Invalid URL: {url!r}')
+        self.url = url
+        self.timeout = timeout
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        self._connection: Optional[http.client.HTTPConnection] = None
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self._connection is None:
+            cls = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            self._connection = cls(self._host, self._port, timeout=self.timeout)
+        return self._connection
+
+    def post(self, body: bytes, headers: Dict[str, str]) -> bytes:
+        """POST ``body`` and return the response body.
+
+        Raises:
+            DeliveryError: On connection errors and non-2xx responses;
+                retryable unless the server rejected the request (4xx
+                other than 408 and 429).
+        """
+        connection = self._connect()
+        try:
+            connection.request('POST', self._path, body, {'Connection': 'keep-alive', **headers})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.close()
+            raise DeliveryError(f'{type(e).__name__}: {e}') from e
+        if response.will_close:
+            self.close()
+        if response.status >= 300:
+            retryable = response.status >= 500 or response.status in (408, 429)
+            raise DeliveryError(f'HTTP {response.status}', retryable=retryable)
+        return data
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class WebhookTarget(NotificationTarget):
+    """POSTs each batch as ``{"events": [...]}`` JSON to a URL."""
+
+    def __init__(self, url: str, timeout: float = 5.0, name: Optional[str] = None):
+        """Initialize the target.
+
+        Args:
+            url: ``http://`` or ``https://`` endpoint.
+            timeout: Socket timeout per attempt, in seconds.
+            name: Label in stats and logs; defaults to the URL with its
+                path and query redacted (see :func:`redact_url`).
+        """
+        self.name = name or redact_url(url)
+        self._client = HTTPClient(url, timeout)
+
+    def send(self, batch: List[dict]) -> None:
+        body = json.dumps({'events': batch}).encode()
+        self._client.post(body, {'Content-Type': 'application/json'})
+
+    def close(self) -> None:
+        self._client.close()
+
+
+class FileTarget(NotificationTarget):
+    """Appends each event as one JSON line to a file."""
+
+    def __init__(self, path: str):
+        self.name = path
+        self.path = path
+        self._file = None
+
+    def send(self, batch: List[dict]) -> None:
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(''.join(json.dumps(event) + '\n' for event in batch))
+            self._file.flush()
+        except OSError as e:
+            self.close()
+            raise DeliveryError(str(e)) from e
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def coalesce(events: List[dict]) -> List[dict]:
+    """Keep only the latest event per alert, in order of last occurrence.
+
+    During a storm an alert may fire, escalate and resolve within one
+    batch; receivers only need its final transition.
+    """
+    latest: Dict[str, dict] = {}
+    for event in events:
+        key = event.get('alert', {}).get('type')
+        latest.pop(key, None)
+        latest[key] = event
+    return list(latest.values())
+
+
+class _TargetWorker:
+    """Bounded queue and delivery thread of one target."""
+
+    def __init__(self, target: NotificationTarget, max_queue: int, batch_size: int,
+                 flush_interval: float, retries: int, backoff: float):
+        self.target = target
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.queue: 'queue.Queue[dict]' = queue.Queue(maxsize=max_queue)
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.batches = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retried = 0
+        self.last_error: Optional[str] = None
+        self._latency = HistogramSketch(0.0, 30.0, 0.001)
+        self._latency_sum = 0.0
+        self._thread = threading.Thread(target=self._run, name=f'notify-{target.name}',
+                                        daemon=True)
+        self._thread.start()
+
+    def put(self, event: dict) -> None:
+        """Queue an event without blocking, dropping the oldest when full."""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                    with self.lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _next_batch(self) -> List[dict]:
+        try:
+            first = self.queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        # Wait up to flush_interval for the rest of a burst
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0
+                             else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                events = coalesce(batch)
+                with self.lock:
+                    self.coalesced += len(batch) - len(events)
+                self._deliver(events)
+                for _ in batch:
+                    self.queue.task_done()
+        self.target.close()
+
+    def _deliver(self, events: List[dict]) -> None:
+        for attempt in range(self.retries + 1):
+            started = time.monotonic()
+            try:
+                self.target.send(events)
+            except DeliveryError as e:
+                with self.lock:
+                    self.last_error = str(e)
+                if not e.retryable or attempt == self.retries:
+                    break
+                with self.lock:
+                    self.retried += 1
+                # Exponential backoff with jitter; stop() cuts it short
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+                if self.stopping.wait(delay):
+                    break
+                continue
+            except Exception as e:
+                logger.exception('Notification target %s failed', self.target.name)
+                with self.lock:
+                    self.last_error = str(e)
+                break
+            latency = time.monotonic() - started
+            with self.lock:
+                self.delivered += len(events)
+                self.batches += 1
+                self._latency.add(latency)
+                self._latency_sum += latency
+            return
+        logger.warning('Dropping %d notifications for %s: %s',
+                       len(events), self.target.name, self.last_error)
+        with self.lock:
+            self.failed += len(events)
+
+    def idle(self) -> bool:
+        return self.queue.unfinished_tasks == 0
+
+    def stop(self, timeout: Optional[float]) -> None:
+        self.stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self.lock:
+            def ms(q):
+                value = self._latency.quantile(q)
+                return None if value is None else value * 1000
+            return {
+                'queued': self.queue.qsize(),
+                'delivered': self.delivered,
+                'batches': self.batches,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'retried': self.retried,
+                'last_error': self.last_error,
+                'latency_ms': {
+                    'avg': self._latency_sum / self.batches * 1000 if self.batches else None,
+                    'p50': ms(0.5),
+                    'p95': ms(0.95),
+                    'p99': ms(0.99),
+                },
+            }
+
+
+class NotificationDispatcher:
+    """Fans alert events out to targets without blocking the caller.
+
+    Every target has its own bounded queue and delivery thread, so a slow
+    webhook delays only itself. ``submit`` only appends to those queues;
+    when a queue is full its oldest event is dropped (and counted) rather
+    than blocking the sampler. Delivery threads batch events arriving
+    within ``flush_interval``, coalesce them per alert and retry failed
+    batches with exponential backoff.
+    """
+
+    def __init__(self, targets: Sequence[NotificationTarget] = (), max_queue: int = 1000,
+                 batch_size: int = 50, flush_interval: float = 1.0, retries: int = 3,
+                 backoff: float = 0.5):
+        """Initialize the dispatcher.
+
+        Args:
+            targets: Notification targets.
+            max_queue: Events buffered per target before dropping.
+            batch_size: Maximum events per delivery.
+            flush_interval: Seconds to wait for more events of a burst.
+            retries: Retries of a failed delivery.
+            backoff: Initial retry delay in seconds, doubled per retry.
+        """
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._workers: List[_TargetWorker] = []
+        self.configure(targets)
+
+    def configure(self, targets: Sequence[NotificationTarget]) -> None:
+        """Replace the targets, stopping the previous delivery threads."""
+        self.stop()
+        workers = [_TargetWorker(target, self.max_queue, self.batch_size,
+                                 self.flush_interval, self.retries, self.backoff)
+                   for target in targets]
+        with self._lock:
+            self._workers = workers
+
+    @property
+    def targets(self) -> List[NotificationTarget]:
+        return [worker.target for worker in self._workers]
+
+    def submit(self, events: List[dict]) -> None:
+        """Queue events for every target. Never blocks."""
+        for worker in self._workers:
+            for event in events:
+                worker.put(event)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queue is delivered. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while not all(worker.idle() for worker in self._workers):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> Dict[str, dict]:
+        """Delivery counters and latency per target."""
+        stats: Dict[str, dict] = {}
+        for worker in self._workers:
+            # Redacted webhook names of one host are alike
+            name, n = worker.target.name, 1
+            while name in stats:
+                n += 1
+                name = f'{worker.target.name} #{n}'
+            stats[name] = worker.stats()
+        return stats
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Deliver what is queued, then stop the delivery threads."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.stop(timeout)
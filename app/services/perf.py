@@ -0,0 +1,252 @@
+"""Self-instrumentation: latency histograms and a sampling profiler."""
+
+import functools
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Sub-buckets per power of two: values are kept to within 1/32 (~3%)
+SUB_BUCKETS = 32
+# Smallest and largest tracked latency: 1 microsecond to ~1.2 days
+_MIN_EXPONENT = -20
+_MAX_EXPONENT = 17
+
+
+class LatencyHistogram:
+    """Log-linear (HDR-style) histogram of durations in seconds.
+
+    Every power-of-two range is split into ``SUB_BUCKETS`` linear
+    buckets, so the relative error is bounded across microseconds to
+    hours with a fixed, small array. Recording is a ``frexp`` and an
+    increment.
+    """
+
+    def __init__(self):
+        self._counts = [0] * ((_MAX_EXPONENT - _MIN_EXPONENT) * SUB_BUCKETS)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _index(seconds: float) -> int:
+        if seconds <= 0:
+            return 0
+        mantissa, exponent = math.frexp(seconds)
+        if exponent <= _MIN_EXPONENT:
+            return 0
+        if exponent > _MAX_EXPONENT:
+            return (_MAX_EXPONENT - _MIN_EXPONENT) * SUB_BUCKETS - 1
+        return (exponent - 1 - _MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+    @staticmethod
+    def _upper(index: int) -> float:
+        exponent, sub = divmod(index, SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * SUB_BUCKETS), exponent + 1 + _MIN_EXPONENT)
+
+    def record(self, seconds: float) -> None:
+        index = self._index(seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q``-quantile, in seconds."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = max(1, math.ceil(q * self.count))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    if index == len(self._counts) - 1:
+                        return self.max
+                    return min(self._upper(index), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        """Count, mean, percentiles and max, in milliseconds."""
+        def ms(value):
+            return None if value is None else value * 1000
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000 if self.count else None,
+            'p50_ms': ms(self.quantile(0.5)),
+            'p90_ms': ms(self.quantile(0.9)),
+            'p99_ms': ms(self.quantile(0.99)),
+            'max_ms': self.max * 1000,
+        }
+
+
+class PerfRegistry:
+    """Named latency histograms of the hot paths.
+
+    Timings are per process; with several gunicorn workers each reports
+    its own share of the traffic.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the ``with`` block into the histogram ``name``."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).record(time.perf_counter() - started)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        """Decorator timing each call into the histogram ``name``."""
+        def decorator(fn: Callable) -> Callable:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.histogram(name).record(time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Summary of every histogram, by name."""
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {name: histograms[name].summary() for name in sorted(histograms)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms = {}
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval.
+
+    Stacks are aggregated in the folded format (``frame;frame;... count``)
+    that flame graph tools such as flamegraph.pl and speedscope read. The
+    profiler costs nothing while stopped; while running, one thread wakes
+    every ``interval`` seconds to walk the other threads' frames.
+    """
+
+    def __init__(self, interval: float = 0.01, max_stacks: int = 10000):
+        """Initialize the profiler.
+
+        Args:
+            interval: Seconds between samples.
+            max_stacks: Distinct stacks kept; samples of further stacks are
+                counted as dropped.
+        """
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.dropped = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, duration: Optional[float] = None) -> None:
+        """Start sampling, clearing earlier stacks; stops after ``duration``."""
+        if self.running:
+            return
+        if interval is not None:
+            if interval <= 0:
+                raise ValueError('interval must be positive')
+            self.interval = interval
+        if duration is not None and duration <= 0:
+            raise ValueError('duration must be positive')
+        with self._lock:
+            self._stacks = Counter()
+            self.samples = 0
+            self.dropped = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,),
+                                        name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, duration: Optional[float]) -> None:
+        deadline = None if duration is None else time.monotonic() + duration
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            stacks = [self._fold(frame) for ident, frame in sys._current_frames().items()
+                      if ident != own]
+            with self._lock:
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self.dropped += 1
+                self.samples += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def folded(self) -> str:
+        """The collected stacks in folded format, most frequent first."""
+        with self._lock:
+            items = self._stacks.most_common()
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.samples,
+                'stacks': len(self._stacks),
+                'dropped': self.dropped,
+                'started_at': self.started_at,
+            }
+
+
+# Process-wide registry that the services record into
+perf = PerfRegistry()
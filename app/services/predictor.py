@@ -0,0 +1,314 @@
+"""Time-series predictions: Holt's linear trend fitted across all metrics."""
+
+import threading
+from collections.abc import Mapping
+from statistics import NormalDist
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.metrics import SUMMARY_FIELDS
+from app.services.perf import perf
+
+PREDICTION_FIELDS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+# Forecast change, in percentage points, below which a metric is stable
+TREND_THRESHOLD = 5.0
+
+
+class Predictor:
+    """Holt's linear exponential smoothing, vectorized over the metrics.
+
+    Level and trend of every metric are one NumPy array each, so a sample
+    updates all metrics in a handful of array operations. Parameters are
+    initialized by a least-squares line over the first samples and then
+    updated incrementally; forecasting evaluates the fitted line and the
+    Holt forecast-error variance without touching the history.
+    """
+
+    def __init__(self, fields: Sequence[str] = PREDICTION_FIELDS, alpha: float = 0.5,
+                 beta: float = 0.2, horizon: int = 5, confidence: float = 0.95,
+                 min_samples: int = 5, error_window: int = 30,
+                 bounds: Tuple[float, float] = (0.0, 100.0)):
+        """Initialize the predictor.
+
+        Args:
+            fields: Metrics to forecast.
+            alpha: Level smoothing factor.
+            beta: Trend smoothing factor.
+            horizon: Default forecast distance, in samples.
+            confidence: Coverage of the prediction interval.
+            min_samples: Samples used for the least-squares initialization;
+                no forecast is made before that many have been seen.
+            error_window: Effective window, in samples, of the one-step
+                error variance behind the prediction interval.
+            bounds: Range forecasts and intervals are clipped to.
+        """
+        self.fields = tuple(fields)
+        self.alpha = alpha
+        self.beta = beta
+        self.horizon = horizon
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.error_window = error_window
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all fitted state."""
+        k = len(self.fields)
+        self.count = 0
+        self.version: Optional[int] = None
+        self._last_timestamp: Optional[float] = None
+        self._level = np.zeros(k)
+        self._trend = np.zeros(k)
+        self._error_var = np.zeros(k)
+        self._warmup = []
+
+    @property
+    def ready(self) -> bool:
+        """Whether enough samples have been seen to forecast."""
+        return self.count >= self.min_samples
+
+    def update(self, values: np.ndarray) -> None:
+        """Fold one sample (one value per field) into the fit.
+
+        NaN values leave that field's level and trend untouched.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.count += 1
+        if self.count <= self.min_samples:
+            self._warmup.append(values)
+            if self.count == self.min_samples:
+                self._initialize(np.vstack(self._warmup))
+                self._warmup = []
+            return
+
+        valid = ~np.isnan(values)
+        predicted = self._level + self._trend
+        error = np.where(valid, values - predicted, 0.0)
+        level = predicted + self.alpha * error
+        trend = self.beta * (level - self._level) + (1 - self.beta) * self._trend
+        self._level = np.where(valid, level, predicted)
+        self._trend = np.where(valid, trend, self._trend)
+        rate = 2.0 / (self.error_window + 1)
+        self._error_var = np.where(
+            valid, self._error_var + rate * (error ** 2 - self._error_var), self._error_var)
+
+    def _initialize(self, block: np.ndarray) -> None:
+        """Least-squares line per column of ``block``, ignoring NaNs."""
+        n = block.shape[0]
+        x = np.arange(n, dtype=np.float64)[:, None]
+        weights = ~np.isnan(block)
+        y = np.where(weights, block, 0.0)
+        counts = np.maximum(weights.sum(axis=0), 1)
+        x_mean = (x * weights).sum(axis=0) / counts
+        y_mean = y.sum(axis=0) / counts
+        dx = np.where(weights, x - x_mean, 0.0)
+        sxx = (dx ** 2).sum(axis=0)
+        slope = np.divide((dx * (y - y_mean)).sum(axis=0), sxx,
+                          out=np.zeros_like(sxx), where=sxx > 0)
+        intercept = y_mean - slope * x_mean
+        residuals = np.where(weights, y - (intercept + slope * x), 0.0)
+        dof = np.maximum(weights.sum(axis=0) - 2, 1)
+        self._level = intercept + slope * (n - 1)
+        self._trend = slope
+        self._error_var = (residuals ** 2).sum(axis=0) / dof
+
+    def fit(self, history: Mapping, version: Optional[int] = None) -> None:
+        """Refit from scratch on a window of history columns."""
+        with self._lock:
+            self.reset()
+            self._apply(history, len(history['timestamp']))
+            self.version = version
+
+    @perf.timed('predictor.update')
+    def sync(self, version: int, history: Mapping) -> None:
+        """Catch up with the history, folding in only unseen samples.
+
+        Args:
+            version: History version (total samples recorded) matching
+                ``history``.
+            history: Window of history columns ending at ``version``.
+        """
+        with self._lock:
+            if self.version == version:
+                return
+            timestamps = history['timestamp']
+            n = len(timestamps)
+            behind = n if self.version is None else version - self.version
+            if (self.version is None or not 0 < behind < n
+                    or timestamps[n - behind - 1] != self._last_timestamp):
+                # History was cleared, replaced or outran us: start over
+                self.reset()
+                behind = n
+            self._apply(history, behind)
+            self.version = version
+
+    def _apply(self, history: Mapping, n: int) -> None:
+        if n <= 0:
+            return
+        block = np.column_stack([np.asarray(history[name][-n:], dtype=np.float64)
+                                 for name in self.fields])
+        for row in block:
+            self.update(row)
+        self._last_timestamp = float(history['timestamp'][-1])
+
+    def forecast(self, horizon: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Forecast every field ``horizon`` samples ahead.
+
+        Returns:
+            Arrays (one entry per field) ``current`` (fitted level),
+            ``predicted``, ``lower``, ``upper`` and ``slope`` (per sample).
+        """
+        h = self.horizon if horizon is None else horizon
+        with self._lock:
+            level, trend, error_var = self._level.copy(), self._trend.copy(), self._error_var.copy()
+
+        # Holt forecast-error variance: sigma^2 * (1 + sum (alpha (1 + j beta))^2)
+        j = np.arange(1, h)
+        spread = 1.0 + np.sum((self.alpha * (1.0 + j * self.beta)) ** 2)
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        margin = z * np.sqrt(error_var * spread)
+
+        low, high = self.bounds
+        predicted = level + h * trend
+        return {
+            'current': np.clip(level, low, high),
+            'predicted': np.clip(predicted, low, high),
+            'lower': np.clip(predicted - margin, low, high),
+            'upper': np.clip(predicted + margin, low, high),
+            'slope': trend,
+        }
+
+    @perf.timed('predictor.forecast')
+    def predictions(self, horizon: Optional[int] = None) -> dict:
+        """Forecasts keyed by summary name (``cpu``, ``memory``, ...)."""
+        names = {field: key for key, field in SUMMARY_FIELDS.items()}
+        if not self.ready:
+            return {names.get(f, f): {'trend': 'stable', 'prediction': None} for f in self.fields}
+
+        h = self.horizon if horizon is None else horizon
+        result = self.forecast(h)
+        predictions = {}
+        for i, field in enumerate(self.fields):
+            predictions[names.get(field, field)] = describe_forecast(
+                result['current'][i], result['predicted'][i], result['lower'][i],
+                result['upper'][i], result['slope'][i], h, model='holt')
+        return predictions
+
+
+def describe_forecast(current: float, predicted: float, lower: float, upper: float,
+                      slope: float, horizon: int, model: str) -> dict:
+    """Build the per-metric prediction payload served by the API."""
+    change = float(predicted) - float(current)
+    if change > TREND_THRESHOLD:
+        trend = 'increasing'
+    elif change < -TREND_THRESHOLD:
+        trend = 'decreasing'
+    else:
+        trend = 'stable'
+    return {
+        'trend': trend,
+        'current': float(current),
+        'predicted': float(predicted),
+        'change': change,
+        'lower': float(lower),
+        'upper': float(upper),
+        'slope': float(slope),
+        'horizon': horizon,
+        'model': model,
+    }
+
+
+# Grid searched by the damped Holt model: (alpha, beta, phi)
+_GRID = np.array(np.meshgrid(
+    np.linspace(0.05, 0.95, 10),
+    np.array([0.01, 0.05, 0.1, 0.2, 0.3, 0.5]),
+    np.array([0.8, 0.9, 0.98, 1.0]),
+    indexing='ij',
+)).reshape(3, -1)
+
+FORECAST_MODELS = ('damped_holt', 'prophet')
+
+
+def forecast_series(model: str, timestamps: np.ndarray, values: np.ndarray,
+                    horizon: int, confidence: float,
+                    bounds: Tuple[float, float] = (0.0, 100.0)) -> Optional[dict]:
+    """Fit a model to one metric's window and forecast it.
+
+    This is the heavy, from-scratch counterpart of :class:`Predictor`, meant
+    to run in a worker process (see ``app.services.scheduler``).
+
+    Args:
+        model: ``damped_holt`` (grid-searched damped trend) or ``prophet``
+            (requires the optional ``prophet`` package).
+        timestamps: Sample times in epoch seconds.
+        values: Metric values; NaNs are dropped.
+        horizon: Samples ahead to forecast.
+        confidence: Coverage of the prediction interval.
+        bounds: Range forecasts and intervals are clipped to.
+
+    Returns:
+        The prediction payload, or None with too little data.
+    """
+    keep = ~np.isnan(values)
+    timestamps, values = timestamps[keep], values[keep]
+    if len(values) < 10:
+        return None
+    if model == 'damped_holt':
+        current, predicted, lower, upper, slope = _damped_holt(values, horizon, confidence)
+    elif model == 'prophet':
+        current, predicted, lower, upper, slope = _prophet(timestamps, values, horizon, confidence)
+    else:
+        raise ValueError(f'Unknown forecast model: {model}')
+    low, high = bounds
+    clip = lambda v: min(high, max(low, float(v)))
+    return describe_forecast(clip(current), clip(predicted), clip(lower), clip(upper),
+                             slope, horizon, model=model)
+
+
+def _damped_holt(values: np.ndarray, horizon: int, confidence: float):
+    """Damped-trend Holt with parameters chosen by one-step squared error.
+
+    Every grid point is filtered at once: the state is one array per
+    parameter combination, so the cost is one pass over the window.
+    """
+    alpha, beta, phi = _GRID
+    level = np.full(alpha.shape, values[0])
+    trend = np.full(alpha.shape, values[1] - values[0])
+    sse = np.zeros(alpha.shape)
+    for value in values[1:]:
+        predicted = level + phi * trend
+        error = value - predicted
+        sse += error ** 2
+        new_level = predicted + alpha * error
+        trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        level = new_level
+
+    best = int(np.argmin(sse))
+    a, b, p = alpha[best], beta[best], phi[best]
+    sigma2 = sse[best] / (len(values) - 1)
+    damping = np.cumsum(p ** np.arange(1, horizon + 1))
+    predicted = level[best] + damping[-1] * trend[best]
+    # Holt forecast-error variance with the damped trend multipliers
+    spread = 1.0 + np.sum((a * (1.0 + b * damping[:-1])) ** 2)
+    margin = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(sigma2 * spread)
+    return level[best], predicted, predicted - margin, predicted + margin, p * trend[best]
+
+
+def _prophet(timestamps: np.ndarray, values: np.ndarray, horizon: int, confidence: float):
+    """Forecast with Prophet, assuming evenly spaced samples."""
+    import pandas as pd
+    from prophet import Prophet
+
+    frame = pd.DataFrame({'ds': pd.to_datetime(timestamps, unit='s'), 'y': values})
+    step = float(np.median(np.diff(timestamps)))
+    fitted = Prophet(interval_width=confidence).fit(frame)
+    future = pd.DataFrame({'ds': pd.to_datetime(
+        timestamps[-1] + step * np.arange(0, horizon + 1), unit='s')})
+    forecast = fitted.predict(future)
+    yhat = forecast['yhat'].to_numpy()
+    last = forecast.iloc[-1]
+    return yhat[0], last['yhat'], last['yhat_lower'], last['yhat_upper'], (yhat[-1] - yhat[0]) / horizon
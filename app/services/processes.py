@@ -0,0 +1,142 @@
+"""Per-process resource usage: the top consumers of CPU, memory and IO."""
+
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import psutil
+
+from app.services.metrics import format_timestamp
+from app.services.perf import perf
+
+# Read per process and refresh, within one oneshot() of psutil: name is
+# cached by psutil, the rest come from /proc/<pid>/stat, statm and io
+# (one file each). cmdline and username are left out; they cost another
+# read or a passwd lookup per process.
+PROCESS_ATTRS = ('name', 'cpu_percent', 'memory_info')
+IO_ATTRS = ('io_counters',)
+RANKINGS = ('cpu', 'memory', 'io')
+
+
+class ProcessMonitor:
+    """Keeps the top ``top_n`` processes by CPU, memory and IO.
+
+    ``psutil.process_iter`` reuses its ``Process`` objects across calls,
+    so ``cpu_percent`` is the delta since the previous refresh without
+    blocking, and a reused pid gets a fresh object. IO rates are derived
+    the same way from the previous refresh's counters. The rankings are
+    selected with heaps, so a refresh costs one pass over the processes
+    plus ``O(n log top_n)``: about 50-100 microseconds per process, almost
+    all of it reading ``/proc``. Readers only copy the latest rankings.
+    """
+
+    def __init__(self, top_n: int = 10, interval: float = 15.0, io: bool = True):
+        """Initialize the monitor.
+
+        Args:
+            top_n: Processes kept per ranking.
+            interval: Minimum seconds between refreshes; the first
+                refresh only primes the CPU and IO counters.
+            io: Rank by IO too, at the cost of one more file read per
+                process.
+        """
+        if top_n < 1:
+            raise ValueError('top_n must be positive')
+        self.top_n = top_n
+        self.interval = interval
+        self.io = io
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at: Optional[float] = None
+        self._io: Dict[int, Tuple[psutil.Process, int]] = {}
+        self._memory_total = psutil.virtual_memory().total
+        self._snapshot: Optional[dict] = None
+
+    def due(self) -> bool:
+        """Whether ``interval`` has passed since the last refresh."""
+        refreshed_at = self._refreshed_at
+        return refreshed_at is None or time.monotonic() - refreshed_at >= self.interval
+
+    def maybe_refresh(self) -> None:
+        """Refresh unless one ran within ``interval`` or is running."""
+        if self.due() and self._refresh_lock.acquire(blocking=False):
+            try:
+                if self.due():
+                    self.refresh()
+            finally:
+                self._refresh_lock.release()
+
+    @perf.timed('processes.refresh')
+    def refresh(self) -> dict:
+        """Read every process and rebuild the rankings."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        elapsed = None if self._refreshed_at is None else now - self._refreshed_at
+        io: Dict[int, Tuple[psutil.Process, int]] = {}
+        records = []
+        attrs = PROCESS_ATTRS + IO_ATTRS if self.io else PROCESS_ATTRS
+        for process in psutil.process_iter(attrs, ad_value=None):
+            info = process.info
+            pid = process.pid
+            rss = info['memory_info'].rss if info['memory_info'] is not None else 0
+            io_rate = None
+            counters = info.get('io_counters')
+            if counters is not None:
+                total = counters.read_bytes + counters.write_bytes
+                io[pid] = (process, total)
+                previous = self._io.get(pid)
+                # A reused pid comes with a new Process object
+                if elapsed and previous is not None and previous[0] is process:
+                    io_rate = max(total - previous[1], 0) / elapsed
+            records.append({
+                'pid': pid,
+                'name': info['name'],
+                'cpu_percent': info['cpu_percent'] or 0.0,
+                'memory_rss': rss,
+                'memory_percent': rss / self._memory_total * 100 if self._memory_total else 0.0,
+                'io_bytes_per_sec': io_rate,
+            })
+
+        top = {
+            'cpu': heapq.nlargest(self.top_n, records, key=lambda r: r['cpu_percent']),
+            'memory': heapq.nlargest(self.top_n, records, key=lambda r: r['memory_rss']),
+        }
+        if self.io:
+            top['io'] = heapq.nlargest(self.top_n, (r for r in records if r['io_bytes_per_sec']),
+                                       key=lambda r: r['io_bytes_per_sec'])
+        snapshot = {
+            'timestamp': format_timestamp(time.time()),
+            'process_count': len(records),
+            'interval': elapsed,
+            'duration_ms': (time.perf_counter() - started) * 1000,
+            'top': top,
+        }
+        with self._lock:
+            self._io = io
+            self._refreshed_at = now
+            self._snapshot = snapshot
+            self.refreshes += 1
+        return snapshot
+
+    def snapshot(self, by: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        """The latest rankings, refreshing first if there are none.
+
+        Args:
+            by: Only this ranking (``cpu``, ``memory`` or ``io``).
+            limit: Processes per ranking, at most ``top_n``.
+        """
+        if by is not None and by not in RANKINGS:
+            raise ValueError(f"by must be one of: {', '.join(RANKINGS)}")
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.maybe_refresh()
+            snapshot = self._snapshot
+        if snapshot is None:
+            # Another thread is running the first refresh
+            with self._refresh_lock:
+                snapshot = self._snapshot
+        top: Dict[str, List[dict]] = {name: ranking[:limit] for name, ranking
+                                      in snapshot['top'].items() if by in (None, name)}
+        return {**snapshot, 'top': top}
@@ -0,0 +1,187 @@
+"""Fixed-capacity columnar ring buffer for metric history."""
+
+import threading
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Slots of the int64 state array
+_HEAD, _COUNT, _TOTAL, _SEQ = range(4)
+_STATE_SLOTS = 4
+
+
+class RingBuffer:
+    """Preallocated, columnar ring buffer of float samples.
+
+    Each sample is an epoch-float timestamp plus one float per field. Storage
+    is mirrored: every value is written at ``pos`` and ``pos + capacity`` of
+    arrays twice the capacity long, so the most recent ``n`` samples are
+    always one contiguous slice and windows are returned as zero-copy views.
+
+    Views alias live storage. A view of ``n`` samples stays valid until
+    ``capacity - n`` further samples have been appended; callers that hold
+    on to data longer than that should copy it.
+    """
+
+    def __init__(self, fields: Sequence[str], capacity: int,
+                 buffer=None, offset: int = 0):
+        """Initialize the buffer.
+
+        Args:
+            fields: Names of the float columns stored per sample.
+            capacity: Maximum number of samples retained.
+            buffer: Optional writable buffer (e.g. an ``mmap``) of at least
+                ``nbytes(len(fields), capacity)`` bytes past ``offset`` to
+                hold the state and samples. Existing contents are used
+                as-is; without a buffer, private memory is allocated.
+            offset: Byte offset of the ring buffer within ``buffer``.
+        """
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.capacity = capacity
+        self._index = {name: i for i, name in enumerate(self.fields)}
+        self._lock = threading.Lock()
+
+        fresh = buffer is None
+        if fresh:
+            buffer = bytearray(self.nbytes(len(self.fields), capacity))
+            offset = 0
+        self._state = np.ndarray((_STATE_SLOTS,), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += self._state.nbytes
+        self._timestamps = np.ndarray((2 * capacity,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += self._timestamps.nbytes
+        self._data = np.ndarray((len(self.fields), 2 * capacity), dtype=np.float64,
+                                buffer=buffer, offset=offset)
+        if fresh:
+            self._data[:] = np.nan
+
+    @staticmethod
+    def nbytes(n_fields: int, capacity: int) -> int:
+        """Bytes of storage needed for the given shape."""
+        return 8 * (_STATE_SLOTS + 2 * capacity * (1 + n_fields))
+
+    def __len__(self) -> int:
+        return int(self._state[_COUNT])
+
+    @property
+    def total(self) -> int:
+        """Number of samples ever appended; increases monotonically."""
+        return int(self._state[_TOTAL])
+
+    @property
+    def sequence(self) -> int:
+        """Write sequence number; odd while a write is in progress."""
+        return int(self._state[_SEQ])
+
+    def append(self, timestamp: float, values: Mapping[str, float]) -> None:
+        """Append one sample. Missing fields are stored as NaN."""
+        row = [values.get(name, np.nan) for name in self.fields]
+        state = self._state
+        with self._lock:
+            state[_SEQ] += 1
+            head = int(state[_HEAD])
+            for pos in (head, head + self.capacity):
+                self._timestamps[pos] = timestamp
+                self._data[:, pos] = row
+            state[_HEAD] = (head + 1) % self.capacity
+            state[_COUNT] = min(int(state[_COUNT]) + 1, self.capacity)
+            state[_TOTAL] += 1
+            state[_SEQ] += 1
+
+    def extend(self, timestamps: np.ndarray, data: np.ndarray) -> None:
+        """Append a batch of samples.
+
+        Args:
+            timestamps: Array of shape ``(k,)``.
+            data: Array of shape ``(len(fields), k)``.
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        data = np.asarray(data, dtype=float)
+        k = len(timestamps)
+        if k == 0:
+            return
+        skipped = max(0, k - self.capacity)
+        timestamps = timestamps[skipped:]
+        data = data[:, skipped:]
+        state = self._state
+        with self._lock:
+            state[_SEQ] += 1
+            head = int(state[_HEAD])
+            pos = (head + skipped + np.arange(len(timestamps))) % self.capacity
+            for offset in (0, self.capacity):
+                self._timestamps[pos + offset] = timestamps
+                self._data[:, pos + offset] = data
+            state[_HEAD] = (head + k) % self.capacity
+            state[_COUNT] = min(int(state[_COUNT]) + k, self.capacity)
+            state[_TOTAL] += k
+            state[_SEQ] += 1
+
+    def oldest(self, name: str) -> float:
+        """Value of ``name`` in the oldest retained sample (NaN if empty)."""
+        if not len(self):
+            return float('nan')
+        start, _ = self._bounds(None)
+        return float(self._data[self._index[name], start])
+
+    def resized(self, capacity: int) -> 'RingBuffer':
+        """Copy of this buffer with a new capacity and the same total."""
+        resized = RingBuffer(self.fields, capacity)
+        resized.extend(*self.window(capacity))
+        resized._state[_TOTAL] = self.total
+        return resized
+
+    def clear(self) -> None:
+        """Drop all samples. The total counter keeps increasing."""
+        with self._lock:
+            self._state[_SEQ] += 1
+            self._state[_HEAD] = 0
+            self._state[_COUNT] = 0
+            self._state[_SEQ] += 1
+
+    def _bounds(self, n: Optional[int]) -> Tuple[int, int]:
+        count = int(self._state[_COUNT])
+        if n is not None:
+            count = max(0, min(n, count))
+        end = int(self._state[_HEAD]) + self.capacity
+        return end - count, end
+
+    def window(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Get views of the most recent ``n`` samples (all by default).
+
+        Returns:
+            Tuple of ``(timestamps, data)`` with shapes ``(n,)`` and
+            ``(len(fields), n)``, oldest sample first.
+        """
+        with self._lock:
+            start, end = self._bounds(n)
+        return self._timestamps[start:end], self._data[:, start:end]
+
+    def columns(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Get the most recent ``n`` samples as a mapping of column views."""
+        return self.snapshot(n)[1]
+
+    def snapshot(self, n: Optional[int] = None) -> Tuple[int, Dict[str, np.ndarray]]:
+        """Get ``total`` and the column views of the same instant.
+
+        The returned total identifies the newest sample in the window, so
+        callers can tell which samples they have already seen.
+        """
+        with self._lock:
+            total = self.total
+            start, end = self._bounds(n)
+        return total, self._as_columns(self._timestamps[start:end], self._data[:, start:end])
+
+    def _as_columns(self, timestamps: np.ndarray, data: np.ndarray) -> Dict[str, np.ndarray]:
+        columns = {'timestamp': timestamps}
+        for name, i in self._index.items():
+            columns[name] = data[i]
+        return columns
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        """Get a view of one field over the most recent ``n`` samples."""
+        with self._lock:
+            start, end = self._bounds(n)
+        if name == 'timestamp':
+            return self._timestamps[start:end]
+        return self._data[self._index[name], start:end]
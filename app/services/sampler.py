@@ -0,0 +1,75 @@
+"""Background metrics sampling service."""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.services.metrics import MetricsCollector
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsSampler:
+    """Collects metrics on a fixed schedule in a background thread.
+
+    Request handlers read the latest cached sample from the collector
+    instead of calling psutil themselves, so the sampling rate no longer
+    depends on how many clients are polling the API. With shared history
+    only the writer process samples; the others' ticks are no-ops unless
+    they take over the writer role.
+    """
+
+    def __init__(self, collector: MetricsCollector, interval: float = 5.0):
+        """Initialize the sampler.
+
+        Args:
+            collector: Collector used to take and store samples.
+            interval: Seconds between samples.
+        """
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        self.collector = collector
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the sampling thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the sampling thread. Calling start twice is a no-op."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='metrics-sampler', daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the sampling thread and wait for it to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        """Sample immediately, then on a drift-free fixed schedule."""
+        next_run = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.collector.sample()
+            except Exception:
+                logger.exception('Metrics sampling failed')
+
+            next_run += self.interval
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                # Fell behind (e.g. a slow psutil call); skip missed ticks
+                # rather than sampling in a burst to catch up.
+                next_run = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
@@ -0,0 +1,198 @@
+"""Background job scheduler running forecasts and model fits in worker processes."""
+
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Hashable, Mapping, NamedTuple, Optional
+
+from app.services.perf import perf
+
+logger = logging.getLogger(__name__)
+
+
+class JobBudgetExceeded(Exception):
+    """A job ran past its CPU or wall-clock budget."""
+
+
+class JobResult(NamedTuple):
+    """A published job result."""
+
+    value: Any
+    version: Optional[int]
+    elapsed: float
+    finished_at: float
+
+
+def _exceeded(signum, frame):
+    raise JobBudgetExceeded(f'Job budget exceeded (signal {signum})')
+
+
+def _run_with_budget(fn: Callable, budget: Optional[float], args: tuple) -> Any:
+    """Run ``fn(*args)`` in a worker, interrupting it past ``budget`` seconds.
+
+    Wall-clock time is bounded with ``SIGALRM`` and CPU time, which grows
+    faster than wall-clock time in multi-threaded native code, with a soft
+    ``RLIMIT_CPU`` relative to what the (reused) worker has used so far.
+    Both raise :class:`JobBudgetExceeded` inside the job. Platforms without
+    these facilities run the job unbounded.
+    """
+    if not budget:
+        return fn(*args)
+    try:
+        import resource
+        import signal
+    except ImportError:
+        return fn(*args)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    cpu_limit = math.ceil(usage.ru_utime + usage.ru_stime + budget)
+    if hard != resource.RLIM_INFINITY:
+        cpu_limit = min(cpu_limit, hard)
+    previous = signal.signal(signal.SIGXCPU, _exceeded), signal.signal(signal.SIGALRM, _exceeded)
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, hard))
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        signal.signal(signal.SIGXCPU, previous[0])
+        signal.signal(signal.SIGALRM, previous[1])
+
+
+class JobScheduler:
+    """Runs keyed jobs in a process pool and publishes their latest results.
+
+    Each key (for example a metric name) has at most one current job.
+    Submitting a new job for a key supersedes the previous one: it is
+    cancelled if it has not started, and its result is discarded if it
+    has. Results are published by swapping in a new read-only mapping, so
+    readers always see a complete, consistent set without locking.
+    """
+
+    def __init__(self, max_workers: int = 1, budget: Optional[float] = 30.0):
+        """Initialize the scheduler.
+
+        Args:
+            max_workers: Worker processes; the pool starts on first submit.
+            budget: CPU and wall-clock seconds a job may use, or None for
+                no limit.
+        """
+        self.max_workers = max_workers
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[Hashable, Future] = {}
+        self._results: Mapping[Hashable, JobResult] = MappingProxyType({})
+        self._generation = 0
+        self.completed = 0
+        self.superseded = 0
+        self.failed = 0
+
+    @property
+    def results(self) -> Mapping[Hashable, JobResult]:
+        """Latest published result per key (an immutable snapshot)."""
+        return self._results
+
+    @property
+    def generation(self) -> int:
+        """Counter that changes whenever the published results change."""
+        return self._generation
+
+    def submit(self, key: Hashable, fn: Callable, *args: Any,
+               version: Optional[int] = None) -> Future:
+        """Run ``fn(*args)`` in a worker as the current job for ``key``.
+
+        ``fn`` and ``args`` must be picklable. ``version`` is stored with
+        the result to tell which data it was computed from.
+        """
+        with self._lock:
+            previous = self._jobs.get(key)
+            if self._executor is None:
+                # forkserver: forking the threaded server process is unsafe
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    'forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=context)
+            future = self._executor.submit(_run_with_budget, fn, self.budget, args)
+            self._jobs[key] = future
+        if previous is not None:
+            # Outside the lock: cancel() runs the done callback right away
+            previous.cancel()
+        submitted = time.monotonic()
+        future.add_done_callback(lambda f: self._finish(key, f, version, submitted))
+        return future
+
+    def _finish(self, key: Hashable, future: Future, version: Optional[int],
+                submitted: float) -> None:
+        """Publish a finished job's result unless it was superseded."""
+        try:
+            value = future.result()
+        except CancelledError:
+            with self._lock:
+                self.superseded += 1
+            return
+        except BrokenProcessPool:
+            logger.exception('Job worker pool broke; restarting it on next submit')
+            with self._lock:
+                self.failed += 1
+                if self._jobs.get(key) is future:
+                    del self._jobs[key]
+                self._executor = None
+            return
+        except Exception:
+            logger.exception('Background job %r failed', key)
+            with self._lock:
+                self.failed += 1
+                if self._jobs.get(key) is future:
+                    del self._jobs[key]
+            return
+
+        with self._lock:
+            if self._jobs.get(key) is not future:
+                self.superseded += 1
+                return
+            del self._jobs[key]
+            results = dict(self._results)
+            elapsed = time.monotonic() - submitted
+            results[key] = JobResult(value, version, elapsed, time.time())
+            self._results = MappingProxyType(results)
+            self._generation += 1
+            self.completed += 1
+        perf.record('scheduler.job', elapsed)
+
+    def pending(self) -> int:
+        """Number of keys with a job queued or running."""
+        with self._lock:
+            return len(self._jobs)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait until no job is queued or running. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def clear(self) -> None:
+        """Drop all published results."""
+        with self._lock:
+            self._results = MappingProxyType({})
+            self._generation += 1
+
+    def shutdown(self) -> None:
+        """Cancel queued jobs and stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            jobs, self._jobs = self._jobs, {}
+        for future in jobs.values():
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,212 @@
+"""Metric history shared between processes through a memory-mapped file."""
+
+import fcntl
+import mmap
+import os
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.ringbuffer import RingBuffer
+
+_MAGIC = 0x49534d31  # "ISM1"
+_LAYOUT_VERSION = 1
+
+# Slots of the int64 header at the start of the file
+_H_MAGIC, _H_LAYOUT, _H_CAPACITY, _H_FIELDS, _H_BLOB_SEQ, _H_BLOB_LEN = range(6)
+_HEADER_SLOTS = 8
+_HEADER_BYTES = 8 * _HEADER_SLOTS
+
+DEFAULT_BLOB_SIZE = 64 * 1024
+
+
+class SharedStateUnavailable(RuntimeError):
+    """Raised when shared state cannot be read consistently."""
+
+
+class SharedRingBuffer(RingBuffer):
+    """``RingBuffer`` stored in a memory-mapped file shared by processes.
+
+    Exactly one process, the writer, appends samples; it is elected by
+    holding an exclusive ``flock`` on ``<path>.lock``, so a surviving
+    process can take over when the writer exits. Other processes read
+    without locks: every write bumps a sequence counter to an odd value
+    and back (a seqlock), and readers copy the data and retry if the
+    counter moved. Reads therefore return copies, not views.
+
+    Next to the samples the file holds a small blob slot that the writer
+    uses to publish derived state (latest sample, summary) to readers.
+    """
+
+    def __init__(self, path: str, fields: Sequence[str], capacity: int,
+                 blob_size: int = DEFAULT_BLOB_SIZE):
+        """Open or create the shared buffer.
+
+        Args:
+            path: File backing the buffer, ideally on a tmpfs such as
+                ``/dev/shm``.
+            fields: Names of the float columns stored per sample.
+            capacity: Maximum number of samples retained.
+            blob_size: Bytes reserved for published state.
+        """
+        self.path = path
+        self.blob_size = blob_size
+        self._n_fields = len(fields)
+        self._ring_bytes = RingBuffer.nbytes(len(fields), capacity)
+        self._size = _HEADER_BYTES + self._ring_bytes + blob_size
+        self._lock_file = open(path + '.lock', 'a+b')
+        self._is_writer = False
+        self._mm: Optional[mmap.mmap] = None
+
+        self.try_acquire_writer()
+        self._attach(fields, capacity)
+
+    @property
+    def is_writer(self) -> bool:
+        """Whether this process owns the write side."""
+        return self._is_writer
+
+    def try_acquire_writer(self) -> bool:
+        """Become the writer if no other process currently is."""
+        if self._is_writer:
+            return True
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        self._is_writer = True
+        if self._mm is not None:
+            self._attach(self.fields, self.capacity)
+        return True
+
+    def close(self) -> None:
+        """Release the writer role so another process can take over."""
+        if self._is_writer:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._is_writer = False
+        self._lock_file.close()
+
+    def _attach(self, fields: Sequence[str], capacity: int) -> None:
+        """Map the file, initializing it if this process is the writer."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if self._is_writer and os.fstat(fd).st_size != self._size:
+                os.ftruncate(fd, self._size)
+            if os.fstat(fd).st_size != self._size:
+                # The writer has not sized the file for this layout yet;
+                # map private memory and look again on the next read.
+                buffer = bytearray(self._size)
+            else:
+                buffer = mmap.mmap(fd, self._size)
+        finally:
+            os.close(fd)
+
+        self._mm = buffer
+        self._header = np.ndarray((_HEADER_SLOTS,), dtype=np.int64, buffer=buffer)
+        self._blob = np.ndarray((self.blob_size,), dtype=np.uint8, buffer=buffer,
+                                offset=_HEADER_BYTES + self._ring_bytes)
+        RingBuffer.__init__(self, fields, capacity, buffer=buffer, offset=_HEADER_BYTES)
+
+        if self._is_writer and not self._compatible():
+            self._header[_H_MAGIC] = 0
+            self._state[:] = 0
+            self._timestamps[:] = 0
+            self._data[:] = np.nan
+            self._header[_H_LAYOUT] = _LAYOUT_VERSION
+            self._header[_H_CAPACITY] = capacity
+            self._header[_H_FIELDS] = len(self.fields)
+            self._header[_H_BLOB_SEQ] = 0
+            self._header[_H_BLOB_LEN] = 0
+            self._header[_H_MAGIC] = _MAGIC
+
+    def _compatible(self) -> bool:
+        header = self._header
+        return (
+            header[_H_MAGIC] == _MAGIC
+            and header[_H_LAYOUT] == _LAYOUT_VERSION
+            and header[_H_CAPACITY] == self.capacity
+            and header[_H_FIELDS] == self._n_fields
+        )
+
+    def _ensure_ready(self) -> bool:
+        """Whether the file holds a buffer laid out like this one."""
+        if self._compatible():
+            return True
+        if not isinstance(self._mm, mmap.mmap):
+            self._attach(self.fields, self.capacity)
+        return self._compatible()
+
+    def __len__(self) -> int:
+        return super().__len__() if self._ensure_ready() else 0
+
+    def append(self, timestamp, values) -> None:
+        self._check_writer()
+        super().append(timestamp, values)
+
+    def extend(self, timestamps, data) -> None:
+        self._check_writer()
+        super().extend(timestamps, data)
+
+    def clear(self) -> None:
+        self._check_writer()
+        super().clear()
+
+    def _check_writer(self) -> None:
+        if not self._is_writer:
+            raise RuntimeError('Only the writer process may modify shared history')
+
+    def _read(self, n: Optional[int]) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Consistent copy of the most recent ``n`` samples (seqlock read)."""
+        if not self._ensure_ready():
+            return 0, np.empty(0), np.empty((len(self.fields), 0))
+        for attempt in range(1000):
+            seq = self.sequence
+            if seq % 2 == 0:
+                total = self.total
+                start, end = self._bounds(n)
+                timestamps = self._timestamps[start:end].copy()
+                data = self._data[:, start:end].copy()
+                if self.sequence == seq:
+                    return total, timestamps, data
+            if attempt > 10:
+                time.sleep(0)
+        raise SharedStateUnavailable('Shared history kept changing while being read')
+
+    def window(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        _, timestamps, data = self._read(n)
+        return timestamps, data
+
+    def snapshot(self, n: Optional[int] = None) -> Tuple[int, Dict[str, np.ndarray]]:
+        total, timestamps, data = self._read(n)
+        return total, self._as_columns(timestamps, data)
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        return self.snapshot(n)[1][name]
+
+    def publish(self, payload: bytes) -> None:
+        """Store ``payload`` in the blob slot for readers (writer only)."""
+        self._check_writer()
+        if len(payload) > self.blob_size:
+            raise ValueError('payload exceeds the shared blob size')
+        header = self._header
+        header[_H_BLOB_SEQ] += 1
+        self._blob[:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+        header[_H_BLOB_LEN] = len(payload)
+        header[_H_BLOB_SEQ] += 1
+
+    def read_published(self) -> Tuple[int, Optional[bytes]]:
+        """Get ``(blob sequence, payload)``; payload is None if unpublished."""
+        if not self._ensure_ready():
+            return 0, None
+        header = self._header
+        for attempt in range(1000):
+            seq = int(header[_H_BLOB_SEQ])
+            if seq % 2 == 0:
+                length = int(header[_H_BLOB_LEN])
+                payload = self._blob[:length].tobytes()
+                if int(header[_H_BLOB_SEQ]) == seq:
+                    return seq, payload if seq else None
+            if attempt > 10:
+                time.sleep(0)
+        raise SharedStateUnavailable('Shared state kept changing while being read')
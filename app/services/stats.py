@@ -0,0 +1,152 @@
+"""Incremental sliding-window statistics."""
+
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+
+class HistogramSketch:
+    """Fixed-bin histogram over a bounded range for streaming quantiles.
+
+    Unlike most quantile sketches it supports removal, so it can track a
+    sliding window. Quantiles are accurate to half the bin width; values
+    outside ``[low, high]`` are clamped to the edge bins.
+    """
+
+    def __init__(self, low: float = 0.0, high: float = 100.0, resolution: float = 0.1):
+        """Initialize the sketch.
+
+        Args:
+            low: Lower bound of the tracked range.
+            high: Upper bound of the tracked range.
+            resolution: Bin width.
+        """
+        self.low = low
+        self.resolution = resolution
+        self._counts = np.zeros(int(round((high - low) / resolution)) + 1, dtype=np.int64)
+
+    def _bin(self, value: float) -> int:
+        i = int(round((value - self.low) / self.resolution))
+        return min(max(i, 0), len(self._counts) - 1)
+
+    def add(self, value: float) -> None:
+        self._counts[self._bin(value)] += 1
+
+    def remove(self, value: float) -> None:
+        self._counts[self._bin(value)] -= 1
+
+    def clear(self) -> None:
+        self._counts[:] = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate ``q``-quantile (0 <= q <= 1) of the tracked values."""
+        cumulative = np.cumsum(self._counts)
+        total = cumulative[-1]
+        if total == 0:
+            return None
+        rank = max(1, int(np.ceil(q * total)))
+        i = int(np.searchsorted(cumulative, rank))
+        return self.low + i * self.resolution
+
+
+class RollingStats:
+    """O(1) summary statistics over the last ``capacity`` values.
+
+    Mean and variance use Welford's update with a matching downdate on
+    eviction, min and max use monotonic deques, and percentiles come from
+    a ``HistogramSketch``.
+    """
+
+    def __init__(self, capacity: int, low: float = 0.0, high: float = 100.0):
+        """Initialize the statistics.
+
+        Args:
+            capacity: Window length in values.
+            low: Lower bound of the value range for percentiles.
+            high: Upper bound of the value range for percentiles.
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._seq = 0
+        self._current: Optional[float] = None
+        self._min: deque = deque()
+        self._max: deque = deque()
+        self._sketch = HistogramSketch(low, high)
+
+    def update(self, value: float, evicted: Optional[float] = None) -> None:
+        """Add a value, first removing ``evicted`` if the window was full.
+
+        NaN marks a missing value: it occupies a window slot but does not
+        contribute to any statistic.
+        """
+        if evicted is not None and evicted == evicted:
+            self._remove(evicted)
+
+        seq = self._seq
+        self._seq += 1
+        if value == value:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+            self._sketch.add(value)
+            self._current = value
+
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((seq, value))
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((seq, value))
+
+        oldest = self._seq - self.capacity
+        while self._min and self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def _remove(self, value: float) -> None:
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self._m2 = 0.0
+        else:
+            delta = value - self.mean
+            self.mean -= delta / self.count
+            self._m2 -= delta * (value - self.mean)
+        self._sketch.remove(value)
+
+    def clear(self) -> None:
+        """Forget all values."""
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._current = None
+        self._min.clear()
+        self._max.clear()
+        self._sketch.clear()
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the window."""
+        if self.count == 0:
+            return 0.0
+        return max(self._m2, 0.0) / self.count
+
+    def summary(self) -> dict:
+        """Current, mean, min, max, standard deviation and percentiles."""
+        if self.count == 0:
+            return {}
+        return {
+            'current': self._current,
+            'avg': self.mean,
+            'min': self._min[0][1],
+            'max': self._max[0][1],
+            'std': self.variance ** 0.5,
+            'p50': self._sketch.quantile(0.50),
+            'p95': self._sketch.quantile(0.95),
+            'p99': self._sketch.quantile(0.99),
+        }
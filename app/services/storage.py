@@ -0,0 +1,326 @@
+"""Persistent, memory-mapped time-series store with rollup tiers."""
+
+import os
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MAGIC = 0x49534d53  # "ISMS"
+_HEADER = np.dtype([('magic', '<i8'), ('count', '<i8'), ('capacity', '<i8'), ('reserved', '<i8', 5)])
+
+# Rollup tiers after the raw tier: name -> bucket width in seconds
+ROLLUP_TIERS = {'1m': 60, '1h': 3600}
+TIERS = ('raw',) + tuple(ROLLUP_TIERS)
+
+DEFAULT_RETENTION = {'raw': 2 * 86400, '1m': 30 * 86400, '1h': 365 * 86400}
+
+
+class Segment:
+    """One append-only file of fixed-size records, read through ``np.memmap``.
+
+    The file holds a small header with the record count followed by a
+    preallocated record array. Records are written before the count is
+    bumped, so readers mapping the same file never see partial records.
+    """
+
+    def __init__(self, path: str, dtype: np.dtype, capacity: int = 0):
+        """Open an existing segment, or create one when ``capacity`` is given."""
+        self.path = path
+        self.dtype = dtype
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.truncate(_HEADER.itemsize + capacity * dtype.itemsize)
+            header = np.memmap(path, dtype=_HEADER, mode='r+', shape=(1,))
+            header['magic'] = _MAGIC
+            header['capacity'] = capacity
+            header.flush()
+            del header
+        self._header = np.memmap(path, dtype=_HEADER, mode='r+', shape=(1,))
+        if self._header['magic'][0] != _MAGIC:
+            raise ValueError(f'Not a metrics segment: {path}')
+        self.capacity = int(self._header['capacity'][0])
+        self._records = np.memmap(path, dtype=dtype, mode='r+', offset=_HEADER.itemsize,
+                                  shape=(self.capacity,))
+
+    def __len__(self) -> int:
+        return int(self._header['count'][0])
+
+    @property
+    def full(self) -> bool:
+        return len(self) >= self.capacity
+
+    @property
+    def records(self) -> np.ndarray:
+        """View of the written records."""
+        return self._records[:len(self)]
+
+    def append(self, record: np.ndarray) -> None:
+        count = len(self)
+        self._records[count] = record
+        self._header['count'] = count + 1
+
+    def flush(self) -> None:
+        self._records.flush()
+        self._header.flush()
+
+
+class _Bucket:
+    """Running min/max/mean of every field within one rollup bucket."""
+
+    def __init__(self, n_fields: int):
+        self.start: Optional[float] = None
+        self.count = 0
+        self.mins = np.full(n_fields, np.nan)
+        self.maxs = np.full(n_fields, np.nan)
+        self.sums = np.zeros(n_fields)
+        self.counts = np.zeros(n_fields)
+
+    def reset(self, start: float) -> None:
+        self.start = start
+        self.count = 0
+        self.mins[:] = np.nan
+        self.maxs[:] = np.nan
+        self.sums[:] = 0
+        self.counts[:] = 0
+
+    def add(self, row: np.ndarray) -> None:
+        present = ~np.isnan(row)
+        self.count += 1
+        self.mins = np.fmin(self.mins, row)
+        self.maxs = np.fmax(self.maxs, row)
+        self.sums += np.where(present, row, 0.0)
+        self.counts += present
+
+    def means(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.counts > 0, self.sums / self.counts, np.nan)
+
+
+class TimeSeriesStore:
+    """Append-only, segment-based on-disk store of metric samples.
+
+    Raw samples go to the ``raw`` tier; every sample also feeds 1-minute
+    and 1-hour rollup buckets (min, max, mean and count per field), which
+    are written to their own tiers when the bucket closes. Each tier is a
+    directory of fixed-size segment files named after their first
+    timestamp, and segments older than the tier's retention are deleted.
+
+    Range queries pick the finest tier that answers with at most the
+    requested number of points and map only the segments overlapping the
+    range, so long ranges are served from rollups without touching raw
+    samples. Only one process should write to a store.
+    """
+
+    def __init__(self, path: str, fields: Sequence[str],
+                 retention: Optional[Mapping[str, float]] = None,
+                 segment_records: int = 8192, read_only: bool = False):
+        """Open or create a store.
+
+        Args:
+            path: Directory holding one sub-directory per tier.
+            fields: Names of the float fields stored per sample.
+            retention: Seconds of data to keep per tier.
+            segment_records: Records per segment file.
+            read_only: Open for queries only, e.g. in a process that reads
+                a store another process writes.
+        """
+        self.path = path
+        self.fields = tuple(fields)
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.segment_records = segment_records
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._dtypes = {'raw': np.dtype([('timestamp', '<f8')] + [(f, '<f8') for f in self.fields])}
+        rollup = [('timestamp', '<f8'), ('count', '<f8')]
+        for f in self.fields:
+            rollup += [(f, '<f8'), (f'{f}_min', '<f8'), (f'{f}_max', '<f8')]
+        for tier in ROLLUP_TIERS:
+            self._dtypes[tier] = np.dtype(rollup)
+
+        self._segments: Dict[str, Dict[str, Segment]] = {tier: {} for tier in TIERS}
+        self._current: Dict[str, Optional[Segment]] = {tier: None for tier in TIERS}
+        self._buckets = {tier: _Bucket(len(self.fields)) for tier in ROLLUP_TIERS}
+        for tier in TIERS:
+            os.makedirs(os.path.join(path, tier), exist_ok=True)
+        if not read_only:
+            self._restore_buckets()
+
+    def _segment_names(self, tier: str) -> List[str]:
+        """Segment files of ``tier``, oldest first.
+
+        Cached segments whose files are gone (deleted for retention by the
+        writer, when this store is read-only) are dropped, so their
+        mappings and disk space are released.
+        """
+        names = sorted(n for n in os.listdir(os.path.join(self.path, tier)) if n.endswith('.seg'))
+        cached = self._segments[tier]
+        for name in cached.keys() - set(names):
+            del cached[name]
+        return names
+
+    def _segment(self, tier: str, name: str) -> Segment:
+        segment = self._segments[tier].get(name)
+        if segment is None:
+            segment = Segment(os.path.join(self.path, tier, name), self._dtypes[tier])
+            self._segments[tier][name] = segment
+        return segment
+
+    def _write(self, tier: str, record: np.ndarray) -> None:
+        """Append a record to the tier's newest segment, rolling over when full."""
+        segment = self._current[tier]
+        if segment is None:
+            names = self._segment_names(tier)
+            segment = self._segment(tier, names[-1]) if names else None
+        if segment is None or segment.full:
+            name = f"{int(record['timestamp'] * 1000):016d}.seg"
+            path = os.path.join(self.path, tier, name)
+            segment = Segment(path, self._dtypes[tier], self.segment_records)
+            self._segments[tier][name] = segment
+            self._enforce_retention(tier, float(record['timestamp']))
+        self._current[tier] = segment
+        segment.append(record)
+
+    def _enforce_retention(self, tier: str, now: float) -> None:
+        """Delete segments whose newest record is older than the retention."""
+        cutoff = now - self.retention[tier]
+        names = self._segment_names(tier)
+        # A segment ends where the next one begins
+        for name, next_name in zip(names, names[1:]):
+            if int(next_name[:-4]) / 1000 > cutoff:
+                break
+            self._segments[tier].pop(name, None)
+            os.remove(os.path.join(self.path, tier, name))
+
+    def append(self, timestamp: float, values: Mapping[str, float]) -> None:
+        """Store one raw sample and update the rollup buckets."""
+        if self.read_only:
+            raise RuntimeError('Store was opened read-only')
+        row = np.array([values.get(f, np.nan) for f in self.fields], dtype=float)
+        record = np.array((timestamp, *row.tolist()), dtype=self._dtypes['raw'])
+        with self._lock:
+            self._write('raw', record)
+            self._roll_up(timestamp, row)
+
+    def _roll_up(self, timestamp: float, row: np.ndarray) -> None:
+        for tier, width in ROLLUP_TIERS.items():
+            bucket = self._buckets[tier]
+            start = timestamp - timestamp % width
+            if bucket.start is not None and start != bucket.start and bucket.count:
+                self._write(tier, self._bucket_record(tier, bucket))
+            if bucket.start != start:
+                bucket.reset(start)
+            bucket.add(row)
+
+    def _bucket_record(self, tier: str, bucket: _Bucket) -> np.ndarray:
+        values = [bucket.start, bucket.count]
+        for mean, low, high in zip(bucket.means().tolist(), bucket.mins.tolist(), bucket.maxs.tolist()):
+            values += [mean, low, high]
+        return np.array(tuple(values), dtype=self._dtypes[tier])
+
+    def _restore_buckets(self) -> None:
+        """Rebuild open rollup buckets from raw samples after a restart.
+
+        Partial buckets are never written, so the raw samples since the
+        last written bucket are replayed into the accumulators.
+        """
+        for tier, width in ROLLUP_TIERS.items():
+            names = self._segment_names(tier)
+            since = -np.inf
+            if names:
+                records = self._segment(tier, names[-1]).records
+                if len(records):
+                    since = float(records['timestamp'][-1]) + width
+            raw = self._read('raw', since, np.inf)
+            bucket = self._buckets[tier]
+            for i in range(len(raw)):
+                timestamp = float(raw['timestamp'][i])
+                start = timestamp - timestamp % width
+                if start != bucket.start:
+                    if bucket.count:
+                        self._write(tier, self._bucket_record(tier, bucket))
+                    bucket.reset(start)
+                bucket.add(np.array([raw[f][i] for f in self.fields], dtype=float))
+
+    def _read(self, tier: str, start: float, end: float) -> np.ndarray:
+        """Records of ``tier`` with ``start <= timestamp <= end``."""
+        parts = self._slices(tier, start, end)
+        if not parts:
+            return np.zeros(0, dtype=self._dtypes[tier])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _slices(self, tier: str, start: float, end: float) -> List[np.ndarray]:
+        """Memory-mapped record slices of ``tier`` within the range."""
+        names = self._segment_names(tier)
+        firsts = [int(name[:-4]) / 1000 for name in names]
+        # Skip segments that end before the range or begin after it
+        first = max(0, int(np.searchsorted(firsts, start, side='right')) - 1)
+        parts = []
+        for name, segment_start in zip(names[first:], firsts[first:]):
+            if segment_start > end:
+                break
+            records = self._segment(tier, name).records
+            timestamps = records['timestamp']
+            lo = int(np.searchsorted(timestamps, start, side='left'))
+            hi = int(np.searchsorted(timestamps, end, side='right'))
+            if hi > lo:
+                parts.append(records[lo:hi])
+        return parts
+
+    def select_tier(self, start: float, end: float, max_points: Optional[int] = None,
+                    now: Optional[float] = None) -> str:
+        """Finest tier that retains ``start`` and fits within ``max_points``."""
+        now = time.time() if now is None else now
+        candidates = [t for t in TIERS if now - self.retention[t] <= start] or [TIERS[-1]]
+        if max_points is None:
+            return candidates[0]
+        for tier in candidates:
+            if tier != 'raw' and (end - start) / ROLLUP_TIERS[tier] > max_points:
+                continue
+            if tier == 'raw' and sum(map(len, self._slices('raw', start, end))) > max_points:
+                continue
+            return tier
+        return candidates[-1]
+
+    def query(self, start: float, end: float, tier: Optional[str] = None,
+              max_points: Optional[int] = None) -> Tuple[str, Dict[str, np.ndarray]]:
+        """Read a time range as columns.
+
+        Args:
+            start: Range start, epoch seconds (inclusive).
+            end: Range end, epoch seconds (inclusive).
+            tier: Tier to read; chosen with ``select_tier`` by default.
+            max_points: Preferred upper bound on returned points.
+
+        Returns:
+            ``(tier, columns)``. Raw columns are ``timestamp`` and each
+            field; rollup columns add ``count`` and ``<field>_min`` /
+            ``<field>_max``, with ``<field>`` holding the bucket mean.
+        """
+        with self._lock:
+            if tier is None:
+                tier = self.select_tier(start, end, max_points)
+            records = self._read(tier, start, end)
+        return tier, {name: records[name] for name in records.dtype.names}
+
+    def tail(self, n: int) -> Dict[str, np.ndarray]:
+        """The ``n`` most recent raw samples as columns."""
+        with self._lock:
+            parts = []
+            remaining = n
+            for name in reversed(self._segment_names('raw')):
+                if remaining <= 0:
+                    break
+                records = self._segment('raw', name).records
+                parts.append(records[max(0, len(records) - remaining):])
+                remaining -= len(parts[-1])
+        records = np.concatenate(parts[::-1]) if parts else np.zeros(0, dtype=self._dtypes['raw'])
+        return {name: np.array(records[name]) for name in records.dtype.names}
+
+    def flush(self) -> None:
+        """Flush mapped segments to disk."""
+        with self._lock:
+            for segments in self._segments.values():
+                for segment in segments.values():
+                    segment.flush()
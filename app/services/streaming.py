@@ -0,0 +1,237 @@
+"""Streaming anomaly scoring applied to each sample as it is recorded."""
+
+import math
+import threading
+from collections.abc import Mapping
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.services.metrics import format_timestamp
+
+STREAMING_FIELDS = ('cpu_percent', 'memory_percent', 'disk_percent')
+
+
+class RobustEWMA:
+    """Exponentially weighted z-scores that resist being dragged by outliers.
+
+    Tracks an EWMA of each metric and an EWMA of absolute deviation as the
+    scale. Residuals are clipped to ``clip`` scales before updating, so a
+    spike is scored as anomalous without shifting the baseline much. NaN
+    marks a missing value: it scores 0 and leaves that metric's baseline
+    unchanged.
+    """
+
+    def __init__(self, n_features: int, alpha: float = 0.1, clip: float = 3.0,
+                 min_scale: float = 1.0):
+        """Initialize the scorer.
+
+        Args:
+            n_features: Number of metrics scored per sample.
+            alpha: Smoothing factor of the moving averages.
+            clip: Residual clip, in scales, applied before updating.
+            min_scale: Lower bound of the scale, in metric units, so that
+                near-constant metrics do not produce huge z-scores.
+        """
+        self.alpha = alpha
+        self.clip = clip
+        self.min_scale = min_scale
+        self.count = 0
+        self._mean = np.zeros(n_features)
+        self._deviation = np.zeros(n_features)
+        self._seen = np.zeros(n_features, dtype=bool)
+
+    def score(self, x: np.ndarray) -> np.ndarray:
+        """Z-scores of ``x`` against the baseline, then update the baseline."""
+        z = np.zeros_like(self._mean)
+        valid = ~np.isnan(x)
+        if not valid.any():
+            return z
+        # A metric's first value only starts its baseline
+        first = valid & ~self._seen
+        self._mean[first] = x[first]
+        self._seen |= first
+        update = valid & ~first
+
+        # 1.2533 converts mean absolute deviation to a normal std estimate
+        scale = np.maximum(1.2533 * self._deviation[update], self.min_scale)
+        residual = x[update] - self._mean[update]
+        z[update] = residual / scale
+
+        clipped = np.clip(residual, -self.clip * scale, self.clip * scale)
+        self._mean[update] += self.alpha * clipped
+        self._deviation[update] += self.alpha * (np.abs(clipped) - self._deviation[update])
+        self.count += 1
+        return z
+
+
+class HalfSpaceTrees:
+    """Streaming half-space trees (Tan, Ting & Liu, 2011).
+
+    Trees are random, data-independent partitions of the unit cube built up
+    front. Each sample updates the "latest" mass of the nodes on its path;
+    every ``window_size`` samples the latest masses become the reference
+    masses used for scoring. Scoring and updating are O(trees * depth).
+    """
+
+    def __init__(self, n_features: int, n_trees: int = 25, depth: int = 8,
+                 window_size: int = 250, seed: int = 42):
+        """Initialize the ensemble.
+
+        Args:
+            n_features: Dimension of the (unit-scaled) input.
+            n_trees: Number of trees.
+            depth: Depth of each tree.
+            window_size: Samples per reference window.
+            seed: Random seed for tree construction.
+        """
+        self.n_trees = n_trees
+        self.depth = depth
+        self.window_size = window_size
+        self.size_limit = max(1.0, 0.1 * window_size)
+        self.count = 0
+        self.ready = False
+
+        rng = np.random.default_rng(seed)
+        n_nodes = 2 ** (depth + 1) - 1
+        n_internal = 2 ** depth - 1
+        self._feature = np.zeros((n_trees, n_nodes), dtype=np.intp)
+        self._split = np.zeros((n_trees, n_nodes))
+        for t in range(n_trees):
+            centre = rng.uniform(size=n_features)
+            spread = 2 * np.maximum(centre, 1 - centre)
+            low = [centre - spread]
+            high = [centre + spread]
+            for node in range(n_internal):
+                dim = rng.integers(n_features)
+                mid = (low[node][dim] + high[node][dim]) / 2
+                self._feature[t, node] = dim
+                self._split[t, node] = mid
+                left_high = high[node].copy()
+                left_high[dim] = mid
+                right_low = low[node].copy()
+                right_low[dim] = mid
+                low.extend([low[node], right_low])
+                high.extend([left_high, high[node]])
+
+        self._reference = np.zeros((n_trees, n_nodes))
+        self._latest = np.zeros((n_trees, n_nodes))
+        self._trees = np.arange(n_trees)
+        self._depth_weight = 2.0 ** np.arange(depth + 1)
+
+    def _path(self, x: np.ndarray) -> np.ndarray:
+        """Node indices visited by ``x`` in every tree, shape (trees, depth+1)."""
+        path = np.zeros((self.n_trees, self.depth + 1), dtype=np.intp)
+        node = np.zeros(self.n_trees, dtype=np.intp)
+        for level in range(self.depth):
+            go_right = x[self._feature[self._trees, node]] >= self._split[self._trees, node]
+            node = 2 * node + 1 + go_right
+            path[:, level + 1] = node
+        return path
+
+    def score_and_update(self, x: np.ndarray) -> float:
+        """Mass score of ``x`` (low means anomalous), then learn from it."""
+        path = self._path(x)
+        mass = self._reference[self._trees[:, np.newaxis], path]
+
+        # Each tree scores at the first node whose mass is below the limit
+        sparse = mass < self.size_limit
+        level = np.where(sparse.any(axis=1), sparse.argmax(axis=1), self.depth)
+        score = float((mass[self._trees, level] * self._depth_weight[level]).sum())
+
+        self._latest[self._trees[:, np.newaxis], path] += 1
+        self.count += 1
+        if self.count % self.window_size == 0:
+            self._reference, self._latest = self._latest, self._reference
+            self._latest[:] = 0
+            self.ready = True
+        return score
+
+
+class StreamingAnomalyDetector:
+    """Scores each sample once, in O(1), as the collector records it.
+
+    Combines per-metric robust EWMA z-scores with half-space trees. The
+    tree mass is turned into a z-score of its own (low mass is unusual),
+    and the sample's ``anomaly_score`` is the largest of these z-scores.
+    Scores and flags are stored with the sample, so reading anomalies is a
+    lookup rather than a model fit.
+    """
+
+    def __init__(self, fields: Sequence[str] = STREAMING_FIELDS, threshold: float = 4.0,
+                 warmup: int = 20, alpha: float = 0.1, window_size: int = 250):
+        """Initialize the detector.
+
+        Args:
+            fields: Metrics to score, each expected in ``[0, 100]``.
+            threshold: Anomaly score above which a sample is flagged.
+            warmup: Samples observed before any sample is flagged.
+            alpha: Smoothing factor of the EWMA baselines.
+            window_size: Half-space tree reference window, in samples.
+        """
+        self.fields = tuple(fields)
+        self.threshold = threshold
+        self.warmup = warmup
+        self._lock = threading.Lock()
+        self._ewma = RobustEWMA(len(self.fields), alpha=alpha)
+        self._trees = HalfSpaceTrees(len(self.fields), window_size=window_size)
+        self._mass = RobustEWMA(1, alpha=alpha, min_scale=0.1)
+
+    def score(self, metrics: Mapping) -> dict:
+        """Score one sample and learn from it.
+
+        Returns:
+            ``anomaly_score`` and ``anomaly`` (1.0 or 0.0) for the sample.
+        """
+        x = np.array([metrics.get(name, 0.0) for name in self.fields], dtype=float)
+        with self._lock:
+            z = float(np.abs(self._ewma.score(x)).max())
+            # Trees split on every metric, so samples with a missing one
+            # (NaN) are neither scored nor learned by them
+            if not np.isnan(x).any():
+                trees_ready = self._trees.ready
+                mass = self._trees.score_and_update(np.clip(x / 100.0, 0.0, 1.0))
+                if trees_ready:
+                    z = max(z, -float(self._mass.score(np.array([math.log1p(mass)]))[0]))
+            flagged = self._ewma.count > self.warmup and z > self.threshold
+        return {'anomaly_score': z, 'anomaly': 1.0 if flagged else 0.0}
+
+    def enrich(self, timestamp: float, metrics: Mapping) -> dict:
+        """Collector enricher hook; see ``MetricsCollector.add_enricher``."""
+        return self.score(metrics)
+
+    def detect(self, history: Mapping) -> dict:
+        """Look up the stored flags in a columnar history window.
+
+        Args:
+            history: Mapping of column arrays as returned by
+                ``MetricsCollector.get_window()``.
+
+        Returns:
+            Dictionary in the same shape as ``AnomalyDetector.detect``.
+        """
+        total_points = len(history['timestamp'])
+        if total_points < self.warmup:
+            return {
+                'anomalies': [],
+                'status': 'insufficient_data',
+                'message': f'Need at least {self.warmup} data points for anomaly detection',
+            }
+
+        scores = history['anomaly_score']
+        anomalies = []
+        for i in np.flatnonzero(history['anomaly'] == 1).tolist():
+            anomalies.append({
+                'index': i,
+                'timestamp': format_timestamp(float(history['timestamp'][i])),
+                'score': float(scores[i]),
+                'metrics': {name: float(history[name][i]) for name in self.fields},
+            })
+
+        return {
+            'anomalies': anomalies,
+            'status': 'ok',
+            'total_points': total_points,
+            'anomaly_count': len(anomalies),
+            'anomaly_rate': len(anomalies) / total_points,
+        }
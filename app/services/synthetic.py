@@ -0,0 +1,108 @@
+"""Deterministic synthetic metrics for benchmarks and tests."""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.metrics import METRIC_FIELDS, NETWORK_FIELDS, format_timestamp
+
+GIB = 1024 ** 3
+
+
+class SyntheticMetrics:
+    """Fake metrics source producing realistic-looking, reproducible samples.
+
+    Usage follows a daily cycle plus noise, with occasional spikes so the
+    anomaly detectors have something to find. Sample ``i`` depends only on
+    ``seed`` and ``i``, so a bulk history from :meth:`columns` and samples
+    drawn one by one by calling the source describe the same series.
+    """
+
+    def __init__(self, seed: int = 0, start: float = 1_767_225_600.0, interval: float = 5.0,
+                 spike_rate: float = 0.005):
+        """Initialize the source.
+
+        Args:
+            seed: Random seed.
+            start: Epoch timestamp of sample 0.
+            interval: Seconds between samples.
+            spike_rate: Fraction of samples with a CPU spike.
+        """
+        self.seed = seed
+        self.start = start
+        self.interval = interval
+        self.spike_rate = spike_rate
+        self.position = 0
+
+    def generate(self, offset: int, n: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Samples ``offset`` to ``offset + n`` as ``(timestamps, columns)``."""
+        index = np.arange(offset, offset + n, dtype=np.float64)
+        timestamps = self.start + index * self.interval
+        day = np.sin(2 * np.pi * timestamps / 86400.0)
+
+        noise = np.stack([_uniform(self.seed, index, stream) for stream in range(4)])
+
+        cpu = 35 + 20 * day + 10 * (noise[0] - 0.5)
+        cpu = np.where(noise[1] < self.spike_rate, 95 + 5 * noise[2], cpu)
+        memory = 55 + 10 * day + 4 * (noise[2] - 0.5)
+        # Slowly filling disk: one point per 100k samples
+        disk = np.minimum(60 + index / 100_000, 99)
+        memory_total = np.full(n, 16.0 * GIB)
+        disk_total = np.full(n, 512.0 * GIB)
+        seconds = index * self.interval
+
+        columns = {
+            'cpu_percent': np.clip(cpu, 0, 100),
+            'memory_percent': np.clip(memory, 0, 100),
+            'disk_percent': disk,
+            'cpu_count': np.full(n, 8.0),
+            'memory_total': memory_total,
+            'memory_used': np.floor(memory_total * memory / 100),
+            'memory_available': np.floor(memory_total * (1 - memory / 100)),
+            'disk_total': disk_total,
+            'disk_used': np.floor(disk_total * disk / 100),
+            'disk_free': np.floor(disk_total * (1 - disk / 100)),
+            'bytes_sent': np.floor(seconds * 125_000 * (1 + noise[3])),
+            'bytes_recv': np.floor(seconds * 500_000 * (1 + noise[3])),
+            'packets_sent': np.floor(seconds * 100),
+            'packets_recv': np.floor(seconds * 400),
+        }
+        return timestamps, columns
+
+    def columns(self, n: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """The first ``n`` samples, vectorized; see :meth:`generate`."""
+        return self.generate(0, n)
+
+    def __call__(self) -> Tuple[float, dict]:
+        """Next sample as ``(timestamp, metrics)``, like ``read_metrics``."""
+        timestamps, columns = self.generate(self.position, 1)
+        self.position += 1
+        values = {name: columns[name][0].item() for name in METRIC_FIELDS}
+        for name in METRIC_FIELDS[3:]:
+            values[name] = int(values[name])
+        metrics = {name: value for name, value in values.items() if name not in NETWORK_FIELDS}
+        metrics['timestamp'] = format_timestamp(timestamps[0])
+        metrics['network'] = {name: values[name] for name in NETWORK_FIELDS}
+        return float(timestamps[0]), metrics
+
+    def records(self, host: str, offset: int, n: int) -> List[dict]:
+        """Flat ``/api/ingest`` records of samples ``offset`` to ``offset + n``."""
+        timestamps, columns = self.generate(offset, n)
+        names = list(METRIC_FIELDS)
+        rows = np.column_stack([columns[name] for name in names]).tolist()
+        return [{'host': host, 'timestamp': ts, **dict(zip(names, row))}
+                for ts, row in zip(timestamps.tolist(), rows)]
+
+
+def _uniform(seed: int, index: np.ndarray, stream: int) -> np.ndarray:
+    """Uniform [0, 1) values that depend only on ``(seed, index, stream)``.
+
+    A vectorized splitmix64 hash of the counter, so any slice of the
+    series is generated directly without replaying what precedes it.
+    """
+    mixed_seed = (seed * 0x9E3779B97F4A7C15 + stream) % 2 ** 64
+    x = index.astype(np.uint64) * np.uint64(4) + np.uint64(mixed_seed)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
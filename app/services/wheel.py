@@ -0,0 +1,167 @@
+"""Timer wheel running periodic jobs from a single thread."""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ('name', 'period', 'fn', 'due', 'runs', 'deferred', 'last_duration')
+
+    def __init__(self, name: str, period: int, fn: Callable[[], object]):
+        self.name = name
+        self.period = period
+        self.fn = fn
+        self.due = 0
+        self.runs = 0
+        self.deferred = 0
+        self.last_duration = 0.0
+
+
+class TimerWheel:
+    """Hashed timing wheel of periodic jobs.
+
+    Jobs are filed in the slot of the tick they are next due, so a tick
+    only looks at its own slot, whatever the number of jobs. Intervals are
+    rounded to whole ticks. Within a tick, jobs with shorter periods run
+    first; once the tick has used ``budget`` seconds the remaining jobs
+    move to the next tick, so rarely-run, expensive jobs that come due
+    together cannot stall the frequent ones.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, budget: Optional[float] = None):
+        """Initialize the wheel.
+
+        Args:
+            tick: Seconds per tick.
+            slots: Slots in the wheel; jobs due more than ``slots`` ticks
+                ahead wait for further turns.
+            budget: Seconds of work per tick before remaining jobs are
+                deferred; None never defers.
+        """
+        if tick <= 0 or slots < 1:
+            raise ValueError('tick and slots must be positive')
+        self.tick = tick
+        self.slots = slots
+        self.budget = budget
+        self.ticks = 0
+        self._wheel: List[List[_Job]] = [[] for _ in range(slots)]
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, name: str, interval: float, fn: Callable[[], object]) -> None:
+        """Run ``fn`` every ``interval`` seconds, first on the next tick.
+
+        Scheduling an existing name replaces that job.
+        """
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        job = _Job(name, max(1, round(interval / self.tick)), fn)
+        with self._lock:
+            self._remove(name)
+            self._jobs[name] = job
+            self._file(job, self.ticks)
+
+    def cancel(self, name: str) -> None:
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name: str) -> None:
+        job = self._jobs.pop(name, None)
+        slot = self._wheel[job.due % self.slots] if job is not None else ()
+        # A running job is in no slot until it is filed again
+        if job in slot:
+            slot.remove(job)
+
+    def _file(self, job: _Job, due: int) -> None:
+        job.due = due
+        self._wheel[due % self.slots].append(job)
+
+    def run_tick(self) -> List[str]:
+        """Run the jobs due on the current tick and advance the wheel.
+
+        Returns:
+            Names of the jobs that ran.
+        """
+        with self._lock:
+            now = self.ticks
+            slot = self._wheel[now % self.slots]
+            due = sorted((job for job in slot if job.due <= now), key=lambda job: job.period)
+            slot[:] = [job for job in slot if job.due > now]
+            # Jobs scheduled while this tick runs start on the next one
+            self.ticks = now + 1
+
+        ran = []
+        started = time.perf_counter()
+        for i, job in enumerate(due):
+            if (self.budget is not None and ran
+                    and time.perf_counter() - started >= self.budget):
+                with self._lock:
+                    for deferred in due[i:]:
+                        if self._jobs.get(deferred.name) is deferred:
+                            deferred.deferred += 1
+                            self._file(deferred, now + 1)
+                break
+            if self._jobs.get(job.name) is not job:
+                # Cancelled or replaced by a job that ran before it
+                continue
+            job_started = time.perf_counter()
+            try:
+                job.fn()
+            except Exception:
+                logger.exception('Scheduled job %s failed', job.name)
+            job.last_duration = time.perf_counter() - job_started
+            job.runs += 1
+            ran.append(job.name)
+            with self._lock:
+                # Cancelled or replaced while running
+                if self._jobs.get(job.name) is job:
+                    self._file(job, now + job.period)
+
+        return ran
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the wheel thread. Calling start twice is a no-op."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='timer-wheel', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        """Tick on a drift-free schedule; a late tick skips no jobs."""
+        next_run = time.monotonic()
+        while not self._stop.is_set():
+            self.run_tick()
+            next_run += self.tick
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                next_run = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def stats(self) -> Dict[str, dict]:
+        """Period, runs, deferrals and last duration of every job."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return {job.name: {
+            'interval': job.period * self.tick,
+            'runs': job.runs,
+            'deferred': job.deferred,
+            'last_duration_ms': job.last_duration * 1000,
+        } for job in jobs}
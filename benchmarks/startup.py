@@ -0,0 +1,82 @@
+"""Cold start benchmark: import time and first-request latency.
+
+Every run starts a fresh interpreter, since imports are only slow once per
+process. ``python -m benchmarks.startup MODE`` is the child side: it times
+its own startup in one of :data:`MODES` and prints the timings as JSON.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+# ANOMALY_WARMUP values, plus 'preload': scikit-learn is already imported,
+# as in a worker forked from a master running with ANOMALY_PRELOAD
+MODES = ('lazy', 'background', 'preload')
+# History loaded before the first anomaly request, enough for a model fit
+HISTORY_SIZE = 200
+STEPS = ('import', 'create_app', 'first /health', 'first /api/anomalies')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(mode: str) -> Dict[str, float]:
+    """Time the startup of this process, in seconds per step."""
+    timings = {}
+    if mode == 'preload':
+        from app.services.anomaly import warm_up
+        warm_up()
+        mode = 'lazy'
+    started = time.perf_counter()
+    from app import create_app
+    from benchmarks.suite import BenchmarkConfig
+    timings['import'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app = create_app(type('StartupConfig', (BenchmarkConfig,), {'ANOMALY_WARMUP': mode}))
+    client = app.test_client()
+    timings['create_app'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    client.get('/health')
+    timings['first /health'] = time.perf_counter() - started
+
+    from app.services.metrics import MetricsCollector
+    from app.services.synthetic import SyntheticMetrics
+    collector = MetricsCollector()
+    collector.set_history_size(HISTORY_SIZE)
+    collector.extend_history(*SyntheticMetrics().columns(HISTORY_SIZE))
+
+    started = time.perf_counter()
+    response = client.get('/api/anomalies?method=isolation_forest')
+    timings['first /api/anomalies'] = time.perf_counter() - started
+    if response.status_code != 200 or response.get_json().get('method') != 'isolation_forest':
+        raise RuntimeError(f'/api/anomalies: {response.status_code} {response.get_data(as_text=True)}')
+    return timings
+
+
+def measure_startup(mode: str, runs: int = 5) -> List[dict]:
+    """Start ``runs`` fresh processes and summarize each step's timings.
+
+    Besides the steps timed inside the child, ``process`` is the wall time
+    from spawning the interpreter until it exits.
+    """
+    from benchmarks.suite import summarize
+
+    samples: Dict[str, List[float]] = {step: [] for step in ('process', *STEPS)}
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.startup', mode], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        samples['process'].append(time.perf_counter() - started)
+        for step, seconds in json.loads(output).items():
+            samples[step].append(seconds)
+    return [{'name': f'startup.{mode}.{step}', 'size': 0, **summarize(times)}
+            for step, times in samples.items()]
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] not in ([mode] for mode in MODES):
+        sys.exit(f'usage: python -m benchmarks.startup {{{",".join(MODES)}}}')
+    print(json.dumps(child(sys.argv[1])))
@@ -0,0 +1,363 @@
+"""Benchmarks of the collector, models, serialization and API routes.
+
+Histories are synthetic (see :class:`SyntheticMetrics`), so runs never
+touch psutil and are comparable across machines of the same class and
+across releases. Results are printed as JSON; ``--compare`` checks them
+against an earlier run and exits with status 1 on regressions.
+"""
+
+import argparse
+import gc
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, List, Optional
+
+from config import TestingConfig
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+
+# Representative queries per route; every other GET route under /api is
+# requested without a query string
+ROUTE_QUERIES = {
+    '/api/metrics/history': ('', '?layout=columns', '?metrics=cpu_percent&max_points=500'),
+    '/api/anomalies': ('', '?method=isolation_forest'),
+    '/api/predictions': ('', '?horizon=10'),
+}
+# Routes that never finish (streams) or change global state
+SKIPPED_ROUTES = ('/api/stream', '/api/debug/profiler')
+INGEST_BATCH = 1000
+
+
+class BenchmarkConfig(TestingConfig):
+    """Test configuration without background work that would skew timings."""
+
+    TESTING = False
+    PERF_PROFILER_ENABLED = False
+
+
+def measure(fn: Callable[[], object], setup: Optional[Callable[[], object]] = None,
+            min_time: float = 0.5, max_iterations: int = 10_000) -> dict:
+    """Time ``fn`` until ``min_time`` seconds have been spent in it.
+
+    ``setup`` runs untimed before every iteration. At least one iteration
+    always runs, so expensive cases at large sizes are timed once. Like
+    ``timeit``, garbage collection is paused while timing.
+    """
+    times: List[float] = []
+    spent = 0.0
+    gc.collect()
+    gc.disable()
+    try:
+        while len(times) < max_iterations and (not times or spent < min_time):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            times.append(elapsed)
+            spent += elapsed
+    finally:
+        gc.enable()
+    return summarize(times)
+
+
+def summarize(times: List[float]) -> dict:
+    """Iterations, latency percentiles in milliseconds and throughput."""
+    times = sorted(times)
+    mean = sum(times) / len(times)
+    return {
+        'iterations': len(times),
+        'mean_ms': mean * 1000,
+        'min_ms': times[0] * 1000,
+        'p50_ms': statistics.median(times) * 1000,
+        'p95_ms': times[min(len(times) - 1, math.ceil(0.95 * len(times)) - 1)] * 1000,
+        'max_ms': times[-1] * 1000,
+        'ops_per_sec': 1.0 / mean if mean > 0 else None,
+    }
+
+
+class Suite:
+    """Runs every benchmark case at the requested history sizes."""
+
+    def __init__(self, sizes=DEFAULT_SIZES, min_time: float = 0.5,
+                 route_max_size: int = 100_000, only: Optional[List[str]] = None,
+                 startup_runs: int = 5):
+        """Initialize the suite.
+
+        Args:
+            sizes: History sizes (samples) to benchmark at.
+            min_time: Seconds each case is repeated for.
+            route_max_size: Largest size at which API routes are timed;
+                unfiltered JSON history of a million rows is not a
+                meaningful request.
+            only: Run only cases whose name starts with one of these.
+            startup_runs: Fresh processes started per cold start case.
+        """
+        from app import create_app
+        from app.services.metrics import MetricsCollector
+
+        self.sizes = list(sizes)
+        self.min_time = min_time
+        self.route_max_size = route_max_size
+        self.only = only
+        self.startup_runs = startup_runs
+        self.results: List[dict] = []
+        # The app registers the collector's enrichers and listeners, so
+        # collector cases measure the full per-sample pipeline
+        self.app = create_app(BenchmarkConfig)
+        self.client = self.app.test_client()
+        self.collector = MetricsCollector()
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def record(self, name: str, size: int, fn: Callable[[], object],
+               setup: Optional[Callable[[], object]] = None, **extra) -> None:
+        if not self.wanted(name):
+            return
+        result = {'name': name, 'size': size, **measure(fn, setup, self.min_time), **extra}
+        self.results.append(result)
+        print(f'{name:<70} {size:>9} {result["mean_ms"]:>12.3f} ms', file=sys.stderr)
+
+    def run(self) -> List[dict]:
+        self.bench_startup()
+        for size in self.sizes:
+            self.load(size)
+            self.bench_collector(size)
+            self.bench_anomaly(size)
+            self.bench_prediction(size)
+            self.bench_serialization(size)
+            if size <= self.route_max_size:
+                self.bench_routes(size)
+        return self.results
+
+    def bench_startup(self) -> None:
+        """Cold start of a fresh process per sklearn warm-up mode."""
+        from benchmarks.startup import MODES, measure_startup
+
+        for mode in MODES:
+            if not self.wanted(f'startup.{mode}.'):
+                continue
+            for result in measure_startup(mode, self.startup_runs):
+                self.results.append(result)
+                print(f'{result["name"]:<70} {"":>9} {result["mean_ms"]:>12.3f} ms',
+                      file=sys.stderr)
+
+    def load(self, size: int) -> None:
+        """Replace the collector's history with ``size`` synthetic samples."""
+        from app.routes import api
+        from app.services.synthetic import SyntheticMetrics
+
+        source = SyntheticMetrics(seed=size)
+        self.collector.clear()
+        self.collector.set_history_size(size)
+        timestamps, columns = source.columns(size)
+        self.collector.extend_history(timestamps, columns)
+        source.position = size
+        self.collector.set_source(source)
+        api.response_cache.clear()
+        api.alert_engine.reset()
+        api.host_registry.clear()
+        # Catch the incremental predictor up outside the timed cases
+        api.predictor.sync(*self.collector.get_versioned_window())
+
+    def bench_collector(self, size: int) -> None:
+        collector = self.collector
+        self.record('collector.sample', size, collector.get_current_metrics)
+        self.record('collector.summary', size, collector.get_summary)
+        self.record('collector.window', size, collector.get_window)
+
+    def bench_anomaly(self, size: int) -> None:
+        from app.services.anomaly import AnomalyDetector
+        from app.services.features import FeaturePipeline
+
+        window = self.collector.get_window()
+        self.record('anomaly.detect.batch', size, lambda: AnomalyDetector().detect(window))
+
+        detector = AnomalyDetector(refit_interval=math.inf, refit_samples=2 ** 62,
+                                   drift_threshold=math.inf)
+        state = {}
+
+        def append():
+            self.collector.get_current_metrics()
+            state['version'], state['window'] = self.collector.get_versioned_window()
+
+        append()
+        detector.detect(state['window'], version=state['version'])
+        self.record('anomaly.detect.incremental', size,
+                    lambda: detector.detect(state['window'], version=state['version']),
+                    setup=append)
+
+        window = self.collector.get_window()
+        self.record('anomaly.features.windowed', size,
+                    lambda: FeaturePipeline(self.app.config['ANOMALY_WINDOW_SIZE']).compute(window))
+        pipeline = FeaturePipeline(self.app.config['ANOMALY_WINDOW_SIZE'])
+        append()
+        pipeline.transform(state['window'], version=state['version'])
+        self.record('anomaly.features.incremental', size,
+                    lambda: pipeline.transform(state['window'], version=state['version']),
+                    setup=append)
+
+    def bench_prediction(self, size: int) -> None:
+        from app.services.predictor import Predictor
+
+        window = self.collector.get_window()
+        self.record('predictor.fit', size, lambda: Predictor().fit(window))
+        predictor = Predictor()
+        predictor.fit(window)
+        self.record('predictor.forecast', size, predictor.predictions)
+
+    def bench_serialization(self, size: int) -> None:
+        from app.services.encoding import MSGPACK, UnsupportedEncoding, encode
+        from app.services.metrics import lists_from_columns, rows_from_columns
+
+        window = self.collector.get_window()
+        dumps = self.app.json.dumps
+        rows = rows_from_columns(window)
+        columns = lists_from_columns(window)
+        self.record('serialize.rows', size, lambda: rows_from_columns(window))
+        self.record('serialize.rows.json', size, lambda: dumps(rows),
+                    bytes=len(dumps(rows)))
+        self.record('serialize.columns', size, lambda: lists_from_columns(window))
+        self.record('serialize.columns.json', size, lambda: dumps(columns),
+                    bytes=len(dumps(columns)))
+        try:
+            body = encode(columns, MSGPACK)
+        except UnsupportedEncoding:
+            return
+        self.record('serialize.columns.msgpack', size, lambda: encode(columns, MSGPACK),
+                    bytes=len(body))
+
+    def routes(self) -> List[str]:
+        """GET URLs of every parameterless /api route, with their variants."""
+        urls = []
+        for rule in sorted(self.app.url_map.iter_rules(), key=lambda r: r.rule):
+            if (not rule.rule.startswith('/api/') or rule.arguments
+                    or 'GET' not in rule.methods or rule.rule in SKIPPED_ROUTES):
+                continue
+            urls.extend(rule.rule + query for query in ROUTE_QUERIES.get(rule.rule, ('',)))
+        return urls
+
+    def bench_routes(self, size: int) -> None:
+        from app.routes import api
+        from app.services.synthetic import SyntheticMetrics
+
+        client = self.client
+
+        def get(url):
+            response = client.get(url)
+            if response.status_code >= 400:
+                raise RuntimeError(f'GET {url}: {response.status_code}')
+            return response
+
+        for url in self.routes():
+            self.record(f'route GET {url} (cold)', size, lambda: get(url),
+                        setup=api.response_cache.clear)
+            self.record(f'route GET {url} (warm)', size, lambda: get(url))
+
+        source = SyntheticMetrics(seed=size)
+        state = {'offset': 0}
+
+        def batch():
+            state['body'] = '\n'.join(json.dumps(record) for record in source.records(
+                'bench-host', state['offset'], INGEST_BATCH))
+            state['offset'] += INGEST_BATCH
+
+        self.record('route POST /api/ingest', size,
+                    lambda: client.post('/api/ingest', data=state['body'],
+                                        content_type='application/x-ndjson'),
+                    setup=batch, batch=INGEST_BATCH)
+
+
+def environment() -> dict:
+    """Versions and machine details stored with the results."""
+    def version(module):
+        try:
+            from importlib.metadata import version as package_version
+            return package_version(module)
+        except Exception:
+            return None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'packages': {name: version(name) for name in
+                     ('numpy', 'scikit-learn', 'flask', 'psutil', 'orjson', 'msgpack')},
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[dict]:
+    """Cases whose mean time grew by more than ``tolerance`` over ``baseline``."""
+    previous = {(r['name'], r['size']): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['name'], result['size']))
+        if before is None or not before['mean_ms']:
+            continue
+        ratio = result['mean_ms'] / before['mean_ms']
+        if ratio > 1 + tolerance:
+            regressions.append({'name': result['name'], 'size': result['size'],
+                                'baseline_ms': before['mean_ms'],
+                                'mean_ms': result['mean_ms'], 'ratio': ratio})
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated history sizes (default: %(default)s)')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds each case is repeated for (default: %(default)s)')
+    parser.add_argument('--route-max-size', type=int, default=100_000,
+                        help='largest size at which API routes are timed (default: %(default)s)')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='fresh processes per cold start case (default: %(default)s)')
+    parser.add_argument('--only', action='append',
+                        help='run only cases whose name starts with this prefix (repeatable)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='JSON report of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown ratio above which a case regressed (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    suite = Suite(sizes, args.min_time, args.route_max_size, args.only, args.startup_runs)
+    report = {
+        'environment': environment(),
+        'settings': {'sizes': sizes, 'min_time': args.min_time,
+                     'route_max_size': args.route_max_size, 'startup_runs': args.startup_runs},
+        'results': suite.run(),
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        report['regressions'] = compare(report['results'], baseline, args.tolerance)
+        for regression in report['regressions']:
+            print(f'REGRESSION {regression["name"]} @ {regression["size"]}: '
+                  f'{regression["baseline_ms"]:.3f} -> {regression["mean_ms"]:.3f} ms '
+                  f'(x{regression["ratio"]:.2f})', file=sys.stderr)
+        status = 1 if report['regressions'] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return status
@@ -9,12 +9,129 @@ class Config:
     # Metrics configuration
     METRICS_INTERVAL = int(os.environ.get('METRICS_INTERVAL', 5))
     METRICS_HISTORY_SIZE = int(os.environ.get('METRICS_HISTORY_SIZE', 100))
+    # Memory-mapped file shared by all gunicorn workers; empty keeps
+    # history private to each process
+    METRICS_SHARED_PATH = os.environ.get('METRICS_SHARED_PATH', '')
+    # Directory of the persistent on-disk store; empty keeps history in
+    # memory only. Retention is in seconds per tier.
+    METRICS_STORE_PATH = os.environ.get('METRICS_STORE_PATH', '')
+    METRICS_RETENTION_RAW = float(os.environ.get('METRICS_RETENTION_RAW', 2 * 86400))
+    METRICS_RETENTION_1M = float(os.environ.get('METRICS_RETENTION_1M', 30 * 86400))
+    METRICS_RETENTION_1H = float(os.environ.get('METRICS_RETENTION_1H', 365 * 86400))
+    METRICS_SAMPLER_ENABLED = os.environ.get('METRICS_SAMPLER_ENABLED', 'true').lower() == 'true'
+    # Collector plugins as name:seconds pairs, refreshed on one timer
+    # wheel; samples take the latest value of each. cpu, memory, disk and
+    # network are required; empty reads everything with psutil per sample.
+    COLLECTORS = os.environ.get(
+        'COLLECTORS', 'cpu:1,memory:1,disk:10,network:1,load:5,temperature:30')
+    # Seconds per wheel tick, and work per tick after which the remaining
+    # collectors wait for the next tick
+    COLLECTOR_TICK = float(os.environ.get('COLLECTOR_TICK', 1.0))
+    COLLECTOR_TICK_BUDGET = float(os.environ.get('COLLECTOR_TICK_BUDGET', 0.2))
 
     # Anomaly detection configuration
     ANOMALY_THRESHOLD = float(os.environ.get('ANOMALY_THRESHOLD', 0.95))
+    # Features the isolation forest is fitted on: 'windowed' adds deltas,
+    # rolling mean/std over ANOMALY_WINDOW_SIZE samples and network rates
+    # to the raw usage percentages of 'raw'
+    ANOMALY_FEATURES = os.environ.get('ANOMALY_FEATURES', 'windowed')
     ANOMALY_WINDOW_SIZE = int(os.environ.get('ANOMALY_WINDOW_SIZE', 20))
+    ANOMALY_STREAMING_THRESHOLD = float(os.environ.get('ANOMALY_STREAMING_THRESHOLD', 4.0))
+    ANOMALY_REFIT_INTERVAL = float(os.environ.get('ANOMALY_REFIT_INTERVAL', 300))
+    ANOMALY_REFIT_SAMPLES = int(os.environ.get('ANOMALY_REFIT_SAMPLES', 100))
+    ANOMALY_DRIFT_THRESHOLD = float(os.environ.get('ANOMALY_DRIFT_THRESHOLD', 3.0))
+    ANOMALY_BACKGROUND_FIT = os.environ.get('ANOMALY_BACKGROUND_FIT', 'true').lower() == 'true'
+    # When to import scikit-learn: 'background' (a thread right after
+    # startup) or 'lazy' (the first model fit). ANOMALY_PRELOAD imports it
+    # in the gunicorn master instead, shared copy-on-write by the workers.
+    ANOMALY_WARMUP = os.environ.get('ANOMALY_WARMUP', 'background')
+    ANOMALY_PRELOAD = os.environ.get('ANOMALY_PRELOAD', 'false').lower() == 'true'
+    # File every fitted model is saved to and loaded from at startup, so
+    # that restarts and new replicas detect right away; empty disables it
+    ANOMALY_MODEL_PATH = os.environ.get('ANOMALY_MODEL_PATH', '')
+
+    # Top processes by CPU, memory and IO: how many, and how often they are
+    # re-ranked (each refresh reads /proc for every process)
+    PROCESS_TOP_N = int(os.environ.get('PROCESS_TOP_N', 10))
+    PROCESS_REFRESH_INTERVAL = float(os.environ.get('PROCESS_REFRESH_INTERVAL', 15))
+    PROCESS_IO_ENABLED = os.environ.get('PROCESS_IO_ENABLED', 'true').lower() == 'true'
+
+    # Forecast distance in samples and coverage of its confidence band
+    PREDICTION_HORIZON = int(os.environ.get('PREDICTION_HORIZON', 5))
+    PREDICTION_CONFIDENCE = float(os.environ.get('PREDICTION_CONFIDENCE', 0.95))
+
+    # Heavier forecasts refitted in worker processes every FORECAST_INTERVAL
+    # seconds; each job gets FORECAST_BUDGET seconds of CPU and wall time.
+    # FORECAST_MODEL is damped_holt or prophet (needs the prophet package).
+    FORECAST_JOBS_ENABLED = os.environ.get('FORECAST_JOBS_ENABLED', 'true').lower() == 'true'
+    FORECAST_MODEL = os.environ.get('FORECAST_MODEL', 'damped_holt')
+    FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', 1))
+    FORECAST_BUDGET = float(os.environ.get('FORECAST_BUDGET', 30))
+    FORECAST_INTERVAL = float(os.environ.get('FORECAST_INTERVAL', 60))
+
+    # Seconds between keepalive comments on idle /api/stream connections
+    STREAM_KEEPALIVE = float(os.environ.get('STREAM_KEEPALIVE', 15))
+    # Open /api/stream connections per process (0: unlimited). Each holds a
+    # worker thread, so keep this below gunicorn's --threads
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 8))
+
+    # Serialized /api responses cached per history revision (LRU)
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 128))
+
+    # Bulk ingest from remote hosts (POST /api/ingest); each host keeps
+    # METRICS_HISTORY_SIZE samples in memory
+    INGEST_MAX_HOSTS = int(os.environ.get('INGEST_MAX_HOSTS', 1000))
+    INGEST_MAX_BATCH = int(os.environ.get('INGEST_MAX_BATCH', 50000))
+
+    # Push agent (python run.py agent): samples every METRICS_INTERVAL
+    # seconds and pushes to AGENT_SERVER_URL every AGENT_FLUSH_INTERVAL;
+    # unsent batches wait in AGENT_SPOOL_DIR (empty: in memory)
+    AGENT_SERVER_URL = os.environ.get('AGENT_SERVER_URL', '')
+    AGENT_HOST = os.environ.get('AGENT_HOST', '')
+    AGENT_FLUSH_INTERVAL = float(os.environ.get('AGENT_FLUSH_INTERVAL', 30))
+    AGENT_SPOOL_DIR = os.environ.get('AGENT_SPOOL_DIR', '')
+    AGENT_SPOOL_MAX_BYTES = int(os.environ.get('AGENT_SPOOL_MAX_BYTES', 64 * 1024 * 1024))
+    AGENT_TIMEOUT = float(os.environ.get('AGENT_TIMEOUT', 10))
+
+    # Self-instrumentation served at /api/debug/perf. The sampling
+    # profiler can only be started at runtime when PERF_PROFILER_ENABLED.
+    PERF_ENABLED = os.environ.get('PERF_ENABLED', 'true').lower() == 'true'
+    PERF_PROFILER_ENABLED = os.environ.get('PERF_PROFILER_ENABLED', 'false').lower() == 'true'
+    PERF_PROFILER_INTERVAL = float(os.environ.get('PERF_PROFILER_INTERVAL', 0.01))
 
     # Alert configuration
     CPU_ALERT_THRESHOLD = float(os.environ.get('CPU_ALERT_THRESHOLD', 80.0))
     MEMORY_ALERT_THRESHOLD = float(os.environ.get('MEMORY_ALERT_THRESHOLD', 85.0))
     DISK_ALERT_THRESHOLD = float(os.environ.get('DISK_ALERT_THRESHOLD', 90.0))
+    # Rules separated by ';', e.g. "cpu = avg cpu > 80 for 60s clear 70";
+    # empty derives warning/critical rules from the thresholds above.
+    # Alerts clear ALERT_HYSTERESIS points past the threshold by default.
+    ALERT_RULES = os.environ.get('ALERT_RULES', '')
+    ALERT_HYSTERESIS = float(os.environ.get('ALERT_HYSTERESIS', 5.0))
+    # Alert notifications: comma-separated webhook URLs and/or a JSON-lines
+    # file, delivered in the background in batches of up to
+    # ALERT_NOTIFY_BATCH events gathered over ALERT_NOTIFY_INTERVAL seconds
+    ALERT_WEBHOOK_URLS = os.environ.get('ALERT_WEBHOOK_URLS', '')
+    ALERT_NOTIFY_FILE = os.environ.get('ALERT_NOTIFY_FILE', '')
+    ALERT_NOTIFY_QUEUE = int(os.environ.get('ALERT_NOTIFY_QUEUE', 1000))
+    ALERT_NOTIFY_BATCH = int(os.environ.get('ALERT_NOTIFY_BATCH', 50))
+    ALERT_NOTIFY_INTERVAL = float(os.environ.get('ALERT_NOTIFY_INTERVAL', 1.0))
+    ALERT_NOTIFY_RETRIES = int(os.environ.get('ALERT_NOTIFY_RETRIES', 3))
+    ALERT_NOTIFY_TIMEOUT = float(os.environ.get('ALERT_NOTIFY_TIMEOUT', 5.0))
+
+
+class TestingConfig(Config):
+    """Configuration for the test suite."""
+
+    TESTING = True
+
+    # Tests drive sampling and model fits explicitly
+    METRICS_SHARED_PATH = ''
+    METRICS_STORE_PATH = ''
+    ANOMALY_MODEL_PATH = ''
+    METRICS_SAMPLER_ENABLED = False
+    COLLECTORS = ''
+    ANOMALY_BACKGROUND_FIT = False
+    ANOMALY_WARMUP = 'lazy'
+    FORECAST_JOBS_ENABLED = False
+    PERF_PROFILER_ENABLED = True
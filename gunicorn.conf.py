@@ -0,0 +1,16 @@
+"""Gunicorn settings read from the working directory at startup."""
+
+from config import Config
+
+
+def on_starting(server):
+    """Import the ML stack in the master when ANOMALY_PRELOAD is set.
+
+    Workers fork with scikit-learn already loaded and share its pages
+    copy-on-write, so they boot in a fraction of the time. The app itself
+    is still loaded per worker, keeping the sampler threads in the workers.
+    """
+    if Config.ANOMALY_PRELOAD:
+        from app.services.anomaly import warm_up
+        warm_up()
+        server.log.info('Preloaded the anomaly detection stack')
@@ -2,6 +2,13 @@
 """Application entry point."""
 
 import os
+import sys
+
+if __name__ == '__main__' and sys.argv[1:2] == ['agent']:
+    # Collection-only push agent; never loads Flask or the ML stack
+    from app.services.agent import main
+    sys.exit(main(sys.argv[2:]))
+
 from app import create_app
 
 app = create_app()
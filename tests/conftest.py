@@ -2,14 +2,14 @@
 
 import pytest
 from app import create_app
+from config import TestingConfig
 from app.services.metrics import MetricsCollector
 
 
 @pytest.fixture
 def app():
     """Create application for testing."""
-    app = create_app()
-    app.config['TESTING'] = True
+    app = create_app(TestingConfig)
     return app
 
 
@@ -24,7 +24,9 @@ def reset_metrics_singleton():
     """Reset the MetricsCollector singleton between tests."""
     # Clear the history before each test
     collector = MetricsCollector()
-    collector._history.clear()
+    collector.clear()
+    from app.routes.api import alert_engine
+    alert_engine.reset()
     yield
     # Clean up after test
-    collector._history.clear()
+    collector.clear()
@@ -0,0 +1,152 @@
+"""Tests for the push agent."""
+
+import gzip
+import json
+import socket
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.services.agent import PushAgent, Spool, encode_batch, to_record
+
+
+def _read_metrics():
+    return 1700000000.0, {'timestamp': '2023-11-14T22:13:20+00:00', 'cpu_percent': 12.5,
+                          'memory_percent': 40.0, 'disk_percent': 60.0,
+                          'network': {'bytes_sent': 10, 'bytes_recv': 20,
+                                      'packets_sent': 1, 'packets_recv': 2}}
+
+
+@pytest.fixture
+def server():
+    """Local ingest stand-in that decodes gzip NDJSON batches."""
+    batches = []
+    connections = set()
+    state = {'status': 200}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            connections.add(self.client_address)
+            if state['status'] == 200:
+                assert self.headers['Content-Encoding'] == 'gzip'
+                lines = gzip.decompress(body).decode().splitlines()
+                batches.append([json.loads(line) for line in lines])
+            self.send_response(state['status'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}', batches, connections, state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _unused_url():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{s.getsockname()[1]}'
+
+
+def test_agent_does_not_import_flask_or_sklearn():
+    """Test that the agent keeps heavy dependencies out of the process."""
+    code = ('import sys, app.services.agent; '
+            'print(sorted({m.split(".")[0] for m in sys.modules} & {"flask", "sklearn", "scipy"}))')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip() == '[]'
+
+
+def test_to_record_flattens_sample():
+    """Test that samples become flat ingest records with a numeric timestamp."""
+    timestamp, metrics = _read_metrics()
+    record = to_record('web-1', timestamp, metrics)
+
+    assert record['host'] == 'web-1'
+    assert record['timestamp'] == timestamp
+    assert record['bytes_recv'] == 20
+    assert 'network' not in record
+
+
+def test_flush_pushes_batch_over_one_connection(server):
+    """Test that buffered samples are pushed as one batch per flush."""
+    url, batches, connections, _ = server
+    agent = PushAgent(url, host='web-1', read_metrics=_read_metrics)
+    for _ in range(3):
+        agent.collect()
+    assert agent.flush()
+    agent.collect()
+    assert agent.flush()
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert batches[0][0]['host'] == 'web-1'
+    assert len(connections) == 1
+    assert agent.sent == 2
+
+
+def test_unreachable_server_spools_until_it_returns(tmp_path, server):
+    """Test that batches survive an outage on disk and are sent oldest first."""
+    spool_dir = str(tmp_path / 'spool')
+    agent = PushAgent(_unused_url(), host='web-1', spool=Spool(spool_dir),
+                      read_metrics=_read_metrics)
+    agent.collect()
+    assert not agent.flush()
+    agent.collect()
+    agent.collect()
+    assert not agent.flush()
+    assert len(agent.spool.pending()) == 2
+
+    # A restarted agent picks the spool up
+    url, batches, _, _ = server
+    agent = PushAgent(url, host='web-1', spool=Spool(spool_dir), read_metrics=_read_metrics)
+    assert agent.flush()
+
+    assert [len(batch) for batch in batches] == [1, 2]
+    assert agent.spool.pending() == []
+
+
+def test_rejected_batch_is_dropped(server):
+    """Test that a batch the server rejects is not retried forever."""
+    url, _, _, state = server
+    state['status'] = 400
+    agent = PushAgent(url, read_metrics=_read_metrics)
+    agent.collect()
+
+    assert agent.flush()
+    assert agent.rejected == 1
+    assert agent.spool.pending() == []
+
+
+def test_spool_drops_oldest_beyond_cap(tmp_path):
+    """Test that the spool keeps within its size cap."""
+    body = encode_batch([to_record('web-1', *_read_metrics())])
+    spool = Spool(str(tmp_path), max_bytes=len(body) * 2)
+    for _ in range(5):
+        spool.put(body)
+
+    assert len(spool.pending()) == 2
+    assert spool.dropped == 3
+    assert not list(tmp_path.glob('.*.tmp'))
+
+
+def test_run_flushes_on_stop(server):
+    """Test that stopping the agent pushes what is still buffered."""
+    url, batches, _, _ = server
+    agent = PushAgent(url, interval=0.01, flush_interval=60, read_metrics=_read_metrics)
+    thread = threading.Thread(target=agent.run)
+    thread.start()
+    threading.Event().wait(0.1)
+    agent.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert len(batches) == 1 and len(batches[0]) >= 1
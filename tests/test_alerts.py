@@ -0,0 +1,117 @@
+"""Tests for the streaming alert rule engine."""
+
+import pytest
+from app.services.alerts import AlertEngine, default_rules, parse_rule, parse_rules
+
+
+def _feed(engine, values, start=1000.0, step=5.0, metric='cpu_percent'):
+    state = None
+    for i, value in enumerate(values):
+        state = engine.evaluate(start + i * step, {metric: value, 'network': {}})
+    return state
+
+
+def test_parse_rule():
+    """Test compiling a windowed rule with explicit clear level."""
+    rule = parse_rule('hot = avg cpu > 80 for 1m clear 70 severity critical')
+
+    assert rule.name == 'hot'
+    assert rule.metric == 'cpu_percent'
+    assert (rule.aggregate, rule.op, rule.threshold) == ('avg', '>', 80.0)
+    assert (rule.duration, rule.clear, rule.severity) == (60.0, 70.0, 'critical')
+
+
+def test_parse_rule_defaults():
+    """Test default name, hysteresis and sustained 'last' rules."""
+    rule = parse_rule('last memory_percent > 85 for 30s', hysteresis=5)
+
+    assert rule.name == 'memory'
+    assert rule.aggregate == 'min'
+    assert rule.clear == 80.0
+    assert parse_rule('last disk < 10', hysteresis=2).clear == 12.0
+
+
+@pytest.mark.parametrize('text', [
+    'cpu > 80', 'avg bogus > 80', 'median cpu > 80', 'last cpu > 80 severity page',
+])
+def test_parse_rule_rejects_invalid(text):
+    """Test that malformed rules raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_rule(text)
+
+
+def test_window_average_must_cover_duration():
+    """Test that 'avg > X for D' waits for a full window."""
+    engine = AlertEngine(parse_rules('cpu = avg cpu > 80 for 20s'))
+
+    assert _feed(engine, [90, 90, 90, 90])['count'] == 0
+    state = _feed(engine, [90], start=1020.0)
+    assert state['count'] == 1
+    assert state['alerts'][0]['value'] == 90.0
+
+
+def test_window_average_smooths_spikes():
+    """Test that a single spike does not move a windowed average over."""
+    engine = AlertEngine(parse_rules('avg cpu > 80 for 20s'))
+
+    assert _feed(engine, [10, 10, 10, 10, 100, 10])['count'] == 0
+
+
+def test_hysteresis_prevents_flapping():
+    """Test that an alert stays active until the value falls past clear."""
+    engine = AlertEngine(parse_rules('last cpu > 80', hysteresis=5))
+
+    assert _feed(engine, [85])['count'] == 1
+    assert _feed(engine, [79, 81, 78], start=1005.0)['count'] == 1
+    assert _feed(engine, [74], start=1020.0)['count'] == 0
+    assert _feed(engine, [79], start=1025.0)['count'] == 0
+
+
+def test_same_name_rules_report_most_severe():
+    """Test dedup: one alert per name, at the highest firing severity."""
+    engine = AlertEngine(default_rules({'CPU_ALERT_THRESHOLD': 80.0,
+                                        'MEMORY_ALERT_THRESHOLD': 85.0,
+                                        'DISK_ALERT_THRESHOLD': 90.0}))
+
+    state = _feed(engine, [85])
+    assert [a['severity'] for a in state['alerts']] == ['warning']
+    since = state['alerts'][0]['since']
+
+    state = _feed(engine, [95], start=1005.0)
+    assert [(a['type'], a['severity']) for a in state['alerts']] == [('cpu', 'critical')]
+    assert state['alerts'][0]['since'] == since
+    assert state['alerts'][0]['message'] == 'CPU usage is high: 95.0%'
+
+
+def test_default_critical_rule_respects_a_higher_threshold():
+    """Test that no alert fires at or below a threshold above the critical level."""
+    engine = AlertEngine(default_rules({'CPU_ALERT_THRESHOLD': 95.0,
+                                        'MEMORY_ALERT_THRESHOLD': 85.0,
+                                        'DISK_ALERT_THRESHOLD': 90.0}))
+
+    assert _feed(engine, [92])['count'] == 0
+    assert _feed(engine, [95], start=1005.0)['count'] == 0
+    state = _feed(engine, [96], start=1010.0)
+    assert [(a['type'], a['severity']) for a in state['alerts']] == [('cpu', 'critical')]
+
+
+def test_missing_values_do_not_fire():
+    """Test that samples without the metric are ignored."""
+    engine = AlertEngine(parse_rules('last disk > 90'))
+
+    assert _feed(engine, [95], metric='memory_percent')['count'] == 0
+
+
+def test_listeners_receive_transitions():
+    """Test firing, escalation and resolution events, without repeats."""
+    engine = AlertEngine(default_rules({'CPU_ALERT_THRESHOLD': 80.0,
+                                        'MEMORY_ALERT_THRESHOLD': 85.0,
+                                        'DISK_ALERT_THRESHOLD': 90.0}))
+    events = []
+    engine.add_listener(events.extend)
+
+    _feed(engine, [85, 86, 95, 50])
+
+    assert [(e['event'], e['alert']['severity']) for e in events] == [
+        ('firing', 'warning'), ('firing', 'critical'), ('resolved', 'critical'),
+    ]
@@ -1,7 +1,11 @@
 """Tests for anomaly detection service."""
 
+import subprocess
+import sys
+
 import pytest
-from app.services.anomaly import AnomalyDetector
+from app.services.anomaly import AnomalyDetector, warm_up
+from app.services.perf import perf
 
 
 def test_insufficient_data():
@@ -109,3 +113,236 @@ def test_feature_extraction_missing_keys():
     assert features[0][0] == 10
     assert features[0][1] == 0  # Default for missing
     assert features[1][0] == 0  # Default for missing
+
+
+def test_detect_with_columnar_history():
+    """Test detection on column arrays as produced by the ring buffer."""
+    import numpy as np
+
+    detector = AnomalyDetector(contamination=0.1)
+    n = 20
+    history = {
+        'timestamp': np.arange(n, dtype=float),
+        'cpu_percent': np.full(n, 50.0),
+        'memory_percent': np.full(n, 60.0),
+        'disk_percent': np.full(n, 40.0),
+    }
+    history['cpu_percent'][-1] = 99.0
+
+    result = detector.detect(history)
+
+    assert result['status'] == 'ok'
+    assert result['total_points'] == n
+    for anomaly in result['anomalies']:
+        assert anomaly['timestamp'].startswith('1970-01-01T00:00')
+
+
+def _columns(cpu, memory=None, disk=None):
+    import numpy as np
+
+    cpu = np.asarray(cpu, dtype=float)
+    return {
+        'timestamp': np.arange(len(cpu), dtype=float),
+        'cpu_percent': cpu,
+        'memory_percent': np.full(len(cpu), 60.0) if memory is None else np.asarray(memory, dtype=float),
+        'disk_percent': np.full(len(cpu), 40.0) if disk is None else np.asarray(disk, dtype=float),
+    }
+
+
+def test_versioned_detect_reuses_model_and_result():
+    """Test that repeated calls for the same version do not refit."""
+    detector = AnomalyDetector(refit_samples=1000, refit_interval=3600)
+    history = _columns([50 + i % 5 for i in range(30)])
+
+    first = detector.detect(history, version=30)
+    second = detector.detect(history, version=30)
+
+    assert first['status'] == 'ok'
+    assert second is first
+    assert detector.generation == 1
+
+
+def test_versioned_detect_scores_only_new_samples():
+    """Test that new samples are scored with the existing model."""
+    detector = AnomalyDetector(refit_samples=1000, refit_interval=3600)
+    values = [50 + i % 5 for i in range(31)]
+    detector.detect(_columns(values[:30]), version=30)
+
+    result = detector.detect(_columns(values[1:]), version=31)
+
+    assert result['total_points'] == 30
+    assert detector.generation == 1
+    full = detector.model.decision_function(detector._extract_features(_columns(values[1:])))
+    assert detector._scores.tolist() == pytest.approx(full.tolist())
+
+
+def test_versioned_detect_refits_after_sample_trigger():
+    """Test that enough new samples trigger a refit."""
+    detector = AnomalyDetector(refit_samples=5, refit_interval=3600)
+    values = [50 + i % 5 for i in range(40)]
+    detector.detect(_columns(values[:30]), version=30)
+    detector.detect(_columns(values[5:35]), version=35)
+
+    assert detector.generation == 2
+
+
+def test_drift_triggers_refit():
+    """Test that a shift in the score distribution schedules a refit."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    normal = [list(base + rng.normal(0, 2, 30)) for base in (50, 60, 40)]
+    detector = AnomalyDetector(refit_samples=1000, refit_interval=3600, drift_window=10,
+                                drift_threshold=2.0)
+    detector.detect(_columns(*normal), version=30)
+    shifted = [values[10:] + [95.0] * 10 for values in normal]
+
+    detector.detect(_columns(*shifted), version=40)
+    assert detector._drifted
+    detector.detect(_columns(*[values[1:] + [95.0] for values in shifted]), version=41)
+
+    assert detector.generation == 2
+
+
+def test_steady_data_does_not_trigger_refits():
+    """Test that drift checks leave the model alone while data is steady."""
+    from app.services.synthetic import SyntheticMetrics
+
+    timestamps, columns = SyntheticMetrics(seed=1).columns(400)
+    detector = AnomalyDetector(refit_samples=10**9, refit_interval=10**9)
+    for version in range(200, 400):
+        window = {name: values[version - 200:version] for name, values in columns.items()}
+        window['timestamp'] = timestamps[version - 200:version]
+        detector.detect(window, version=version)
+
+    assert detector.generation == 1
+
+
+def test_background_fit_reports_training():
+    """Test that background fitting keeps the first call off the fit path."""
+    detector = AnomalyDetector(background=True)
+    history = _columns([50 + i % 5 for i in range(30)])
+
+    first = detector.detect(history, version=30)
+    if first['status'] == 'training':
+        detector._pending.result(timeout=30)
+    second = detector.detect(history, version=30)
+
+    assert first['status'] in ('training', 'ok')
+    assert second['status'] == 'ok'
+
+
+def test_snapshot_warm_starts_a_new_detector(tmp_path):
+    """Test that a restarted detector scores with the persisted model."""
+    path = str(tmp_path / 'models' / 'anomaly.joblib')
+    history = _columns([50 + i % 5 for i in range(30)])
+    trained = AnomalyDetector(refit_samples=1000, refit_interval=3600, snapshot_path=path)
+    expected = trained.detect(history, version=30)
+
+    restarted = AnomalyDetector(refit_samples=5, refit_interval=3600, snapshot_path=path)
+    # Three samples are too few to fit, but enough to score
+    few = restarted.detect(_columns([50, 51, 52]), version=3)
+    result = restarted.detect(history, version=33)
+
+    assert few['status'] == 'ok'
+    assert restarted.generation == 1
+    assert restarted.snapshot['samples'] == 30
+    assert restarted.snapshot['feature_fields'] == ['cpu_percent', 'memory_percent', 'disk_percent']
+    assert result['anomaly_count'] == expected['anomaly_count']
+    assert [p.name for p in (tmp_path / 'models').iterdir()] == ['anomaly.joblib']
+
+    # Refits count new samples from the first version seen after loading
+    restarted.detect(_columns([50 + i % 5 for i in range(35)]), version=38)
+    assert restarted.generation == 2
+
+
+def test_snapshot_of_other_features_is_ignored(tmp_path):
+    """Test that incompatible snapshots do not replace fitting."""
+    path = str(tmp_path / 'anomaly.joblib')
+    AnomalyDetector(snapshot_path=path).detect(_columns([50 + i % 5 for i in range(30)]),
+                                               version=30)
+    import joblib
+    snapshot = joblib.load(path)
+    snapshot['metadata']['feature_fields'] = ['cpu_percent']
+    joblib.dump(snapshot, path)
+
+    detector = AnomalyDetector(snapshot_path=path)
+
+    assert not detector.load_snapshot()
+    assert detector.model is None
+    assert detector.detect(_columns([50, 51]), version=2)['status'] == 'insufficient_data'
+
+
+def test_detect_without_fitting_follows_the_snapshot(tmp_path):
+    """Test that a detector that may not fit uses the fitting one's snapshots."""
+    path = str(tmp_path / 'anomaly.joblib')
+    fitter = AnomalyDetector(refit_samples=5, refit_interval=3600, snapshot_path=path)
+    follower = AnomalyDetector(snapshot_path=path)
+    history = _columns([50 + i % 5 for i in range(30)])
+
+    waiting = follower.detect(history, version=30, fit=False)
+    assert waiting['status'] == 'training'
+    assert follower.model is None
+
+    expected = fitter.detect(history, version=30)
+    assert follower.detect(history, version=30, fit=False) == expected
+    assert follower.generation == 1
+
+    fitter.detect(_columns([50 + i % 5 for i in range(35)]), version=35)
+    assert fitter.generation == 2
+    follower.detect(_columns([50 + i % 5 for i in range(35)]), version=35, fit=False)
+    assert follower.generation == 2
+    assert follower.snapshot['version'] == 35
+    # An unchanged file is not loaded again
+    assert not follower.follow_snapshot()
+
+
+def test_refresh_fits_without_scoring():
+    """Test that refresh fits when there is no model and when one is due."""
+    detector = AnomalyDetector(refit_samples=5, refit_interval=3600, background=True)
+
+    detector.refresh(_columns([50, 51, 52]), version=3)
+    assert detector._pending is None
+
+    detector.refresh(_columns([50 + i % 5 for i in range(30)]), version=30)
+    detector._pending.result(timeout=30)
+    assert detector.generation == 1
+
+    detector.refresh(_columns([50 + i % 5 for i in range(32)]), version=32)
+    detector._pending.result(timeout=30)
+    assert detector.generation == 1
+    detector.refresh(_columns([50 + i % 5 for i in range(35)]), version=35)
+    detector._pending.result(timeout=30)
+    assert detector.generation == 2
+    assert detector._result is None
+
+
+def test_startup_does_not_import_sklearn():
+    """Test that creating the app leaves scikit-learn for the first fit."""
+    code = ('import sys; from app import create_app; from config import TestingConfig; '
+            'create_app(TestingConfig); print("sklearn" in sys.modules)')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip() == 'False'
+
+
+def test_warm_up_imports_sklearn():
+    """Test that warm_up loads the model stack and is timed."""
+    before = perf.histogram('anomaly.warm_up').count
+
+    warm_up()
+
+    assert 'sklearn.ensemble' in sys.modules
+    assert perf.histogram('anomaly.warm_up').count == before + 1
+
+
+def test_create_app_rejects_unknown_warmup():
+    """Test that ANOMALY_WARMUP is validated."""
+    from app import create_app
+    from config import TestingConfig
+
+    class EagerConfig(TestingConfig):
+        ANOMALY_WARMUP = 'eager'
+
+    with pytest.raises(ValueError, match='ANOMALY_WARMUP'):
+        create_app(EagerConfig)
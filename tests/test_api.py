@@ -1,18 +1,36 @@
 """Tests for API routes."""
 
+import json
+import time
+
 import pytest
 from app import create_app
+from app.services.metrics import HISTORY_FIELDS, MetricsCollector, format_timestamp
+from config import TestingConfig
 
 
 @pytest.fixture
 def client():
     """Create test client."""
-    app = create_app()
-    app.config['TESTING'] = True
+    app = create_app(TestingConfig)
     with app.test_client() as client:
         yield client
 
 
+def test_each_app_configures_the_services():
+    """Test that a later app's config replaces the earlier one's."""
+    from app.routes.api import anomaly_detector, process_monitor
+
+    create_app(type('TopThree', (TestingConfig,), {'PROCESS_TOP_N': 3,
+                                                   'ANOMALY_FEATURES': 'raw'}))
+    assert process_monitor.top_n == 3
+    assert anomaly_detector.feature_pipeline is None
+
+    create_app(TestingConfig)
+    assert process_monitor.top_n == TestingConfig.PROCESS_TOP_N
+    assert anomaly_detector.feature_pipeline is not None
+
+
 def test_get_metrics(client):
     """Test GET /api/metrics returns current metrics."""
     response = client.get('/api/metrics')
@@ -35,9 +53,10 @@ def test_get_metrics(client):
 
 def test_get_metrics_history(client):
     """Test GET /api/metrics/history returns historical data."""
-    # First make some requests to populate history
-    client.get('/api/metrics')
-    client.get('/api/metrics')
+    # Populate history the way the background sampler does
+    collector = MetricsCollector()
+    collector.get_current_metrics()
+    collector.get_current_metrics()
 
     response = client.get('/api/metrics/history')
 
@@ -48,6 +67,214 @@ def test_get_metrics_history(client):
     assert len(data) >= 2
 
 
+def _record_samples(count, start=1_767_225_600.0):
+    collector = MetricsCollector()
+    for i in range(count):
+        collector._record(start + i, {
+            'timestamp': format_timestamp(start + i),
+            'cpu_percent': float(i % 50),
+            'memory_percent': 50.0,
+            'disk_percent': 40.0,
+            'network': {},
+        })
+    return start
+
+
+def test_get_metrics_history_projection_and_range(client):
+    """Test from/to and metrics= on /api/metrics/history."""
+    start = _record_samples(20)
+
+    response = client.get(f'/api/metrics/history?from={start + 5}&to={start + 9}'
+                          '&metrics=cpu_percent')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [row['cpu_percent'] for row in data] == [5.0, 6.0, 7.0, 8.0, 9.0]
+    assert set(data[0]) == {'timestamp', 'cpu_percent'}
+    assert response.headers['X-History-Tier'] == 'raw'
+
+
+def test_get_metrics_history_iso_range(client):
+    """Test that ISO 8601 times are accepted."""
+    _record_samples(5)
+
+    response = client.get('/api/metrics/history?from=2026-01-01T00:00:02&metrics=cpu_percent')
+
+    assert [row['cpu_percent'] for row in response.get_json()] == [2.0, 3.0, 4.0]
+
+
+def test_get_metrics_history_max_points(client):
+    """Test that max_points downsamples the history."""
+    _record_samples(100)
+
+    for method in ['lttb', 'minmax']:
+        response = client.get(f'/api/metrics/history?max_points=20&downsample={method}'
+                              '&metrics=cpu_percent,memory_percent')
+        data = response.get_json()
+        assert 2 <= len(data) <= 20
+        assert data[0]['cpu_percent'] == 0.0
+
+
+def test_get_metrics_history_rejects_bad_params(client):
+    """Test validation of history query parameters."""
+    for query in ['metrics=bogus', 'from=yesterday', 'max_points=0', 'downsample=avg']:
+        response = client.get(f'/api/metrics/history?{query}')
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+def test_get_metrics_history_columnar_layout(client):
+    """Test layout=columns returns one list per field matching the rows."""
+    start = _record_samples(5)
+
+    rows = client.get('/api/metrics/history?metrics=cpu_percent,memory_total').get_json()
+    columns = client.get('/api/metrics/history?metrics=cpu_percent,memory_total'
+                         '&layout=columns').get_json()
+
+    assert columns['timestamp'] == [start + i for i in range(5)]
+    assert columns['cpu_percent'] == [row['cpu_percent'] for row in rows]
+    assert columns['memory_total'] == [None] * 5
+
+    full = client.get('/api/metrics/history?layout=columns').get_json()
+    assert set(full) == {'timestamp', *HISTORY_FIELDS}
+    assert client.get('/api/metrics/history?layout=wide').status_code == 400
+
+
+def test_history_encoding_negotiation(client):
+    """Test Accept/format= negotiation of the history encoding."""
+    _record_samples(5)
+
+    response = client.get('/api/metrics/history', headers={'Accept': 'text/html'})
+    assert response.status_code == 406
+    assert client.get('/api/metrics/history?format=xml').status_code == 406
+
+    response = client.get('/api/metrics/history',
+                          headers={'Accept': 'application/msgpack;q=0.5, application/json'})
+    assert response.mimetype == 'application/json'
+    assert 'Accept' in response.vary
+
+    try:
+        import msgpack
+    except ImportError:
+        assert client.get('/api/metrics/history?format=msgpack').status_code == 406
+    else:
+        response = client.get('/api/metrics/history?layout=columns',
+                              headers={'Accept': 'application/msgpack'})
+        assert response.mimetype == 'application/msgpack'
+        assert len(msgpack.unpackb(response.data)['timestamp']) == 5
+
+    # Arrow only encodes the columnar layout
+    assert client.get('/api/metrics/history?format=arrow').status_code == 406
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return
+    response = client.get('/api/metrics/history?layout=columns&format=arrow')
+    table = pa.ipc.open_stream(response.data).read_all()
+    assert table.num_rows == 5
+
+
+@pytest.mark.parametrize('fast', [True, False])
+def test_json_responses_encode_nan_as_null(app, monkeypatch, fast):
+    """Test that the app's JSON provider emits valid JSON for NaN, with or without orjson."""
+    import numpy as np
+    from app import jsonprovider
+
+    if fast:
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(jsonprovider, 'orjson', None)
+    value = {'b': float('nan'), 'a': 1, 'c': np.array([1.0, np.inf]), 'd': np.float64(2)}
+    with app.app_context():
+        assert app.json.loads(app.json.dumps(value)) == {'a': 1, 'b': None, 'c': [1.0, None],
+                                                          'd': 2.0}
+
+
+def test_stream_pushes_new_samples(client):
+    """Test GET /api/stream sends a sample event per collected sample."""
+    response = client.get('/api/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    chunks = iter(response.response)
+    assert next(chunks) == b': connected\n\n'
+    MetricsCollector().get_current_metrics()
+    chunk = next(chunks)
+    response.close()
+
+    assert chunk.startswith(b'event: sample\n')
+    payload = json.loads(chunk.split(b'data: ', 1)[1])
+    assert set(payload) == {'metrics', 'alerts', 'predictions', 'anomalies'}
+    assert payload['alerts']['count'] == len(payload['alerts']['alerts'])
+
+
+def test_stream_refuses_subscribers_over_the_limit(client):
+    """Test that /api/stream answers 503 once every stream slot is taken."""
+    from app.routes.api import broadcaster
+
+    saved = broadcaster.max_subscribers
+    broadcaster.max_subscribers = broadcaster.subscriber_count
+    try:
+        response = client.get('/api/stream')
+    finally:
+        broadcaster.max_subscribers = saved
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '60'
+    assert 'error' in response.get_json()
+
+
+def test_stream_encodes_like_responses(client):
+    """Test that NaN in a streamed sample is sent as valid JSON (``null``)."""
+    pytest.importorskip('orjson')
+    response = client.get('/api/stream', buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    MetricsCollector()._record(1_767_225_600.0, {
+        'timestamp': format_timestamp(1_767_225_600.0),
+        'cpu_percent': 10.0,
+        'memory_percent': 50.0,
+        'disk_percent': float('nan'),
+        'network': {},
+    })
+    # Skip the previous sample, replayed to new subscribers
+    chunk = next(chunk for chunk in chunks if b'"disk_percent":null' in chunk
+                 or b'NaN' in chunk)
+    response.close()
+
+    def reject(constant):
+        raise ValueError(f'invalid JSON constant {constant}')
+
+    payload = json.loads(chunk.split(b'data: ', 1)[1], parse_constant=reject)
+    assert payload['metrics']['disk_percent'] is None
+
+
+def test_get_metrics_serves_cached_sample(client):
+    """Test GET /api/metrics reuses the latest sample instead of sampling."""
+    client.get('/api/metrics')
+    first = client.get('/api/metrics').get_json()
+    second = client.get('/api/metrics').get_json()
+
+    assert first['timestamp'] == second['timestamp']
+    assert len(MetricsCollector().get_history()) == 1
+
+
+def test_get_summary(client):
+    """Test GET /api/summary returns rolling statistics."""
+    collector = MetricsCollector()
+    for _ in range(3):
+        collector.get_current_metrics()
+
+    response = client.get('/api/summary')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['samples'] == 3
+    for metric in ['cpu', 'memory', 'disk']:
+        for key in ['current', 'avg', 'min', 'max', 'std', 'p50', 'p95', 'p99']:
+            assert key in data[metric]
+
+
 def test_get_anomalies_insufficient_data(client):
     """Test GET /api/anomalies with insufficient data."""
     response = client.get('/api/anomalies')
@@ -60,6 +287,38 @@ def test_get_anomalies_insufficient_data(client):
     assert 'anomalies' in data
 
 
+def test_get_anomalies_streaming_lookup(client):
+    """Test GET /api/anomalies reads stored streaming flags."""
+    collector = MetricsCollector()
+    for _ in range(25):
+        collector.get_current_metrics()
+
+    data = client.get('/api/anomalies').get_json()
+
+    assert data['method'] == 'streaming'
+    assert data['status'] == 'ok'
+    assert data['total_points'] == 25
+
+
+def test_get_anomalies_isolation_forest(client):
+    """Test GET /api/anomalies?method=isolation_forest runs the batch model."""
+    collector = MetricsCollector()
+    for _ in range(12):
+        collector.get_current_metrics()
+
+    data = client.get('/api/anomalies?method=isolation_forest').get_json()
+
+    assert data['method'] == 'isolation_forest'
+    assert data['status'] == 'ok'
+
+
+def test_get_anomalies_unknown_method(client):
+    """Test that an unknown detection method is rejected."""
+    response = client.get('/api/anomalies?method=bogus')
+
+    assert response.status_code == 400
+
+
 def test_get_predictions(client):
     """Test GET /api/predictions returns trend predictions."""
     response = client.get('/api/predictions')
@@ -75,6 +334,217 @@ def test_get_predictions(client):
     assert data['cpu']['trend'] in ['stable', 'increasing', 'decreasing']
 
 
+def test_derived_endpoints_revalidate_with_etag(client):
+    """Test ETag/304 until a new sample changes the history."""
+    _record_samples(30)
+
+    for url in ['/api/predictions', '/api/anomalies', '/api/metrics/history?metrics=cpu_percent']:
+        first = client.get(url)
+        etag = first.headers['ETag']
+        assert first.headers['Cache-Control'] == 'no-cache'
+
+        cached = client.get(url, headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+        assert cached.data == b''
+
+        _record_samples(1, start=1_767_225_700.0)
+        changed = client.get(url, headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+
+
+def test_get_predictions_forecast(client):
+    """Test forecasts with a horizon and confidence band."""
+    _record_samples(20)
+
+    response = client.get('/api/predictions?horizon=10')
+
+    assert response.status_code == 200
+    cpu = response.get_json()['cpu']
+    assert cpu['horizon'] == 10
+    assert cpu['trend'] == 'increasing'
+    assert cpu['lower'] <= cpu['predicted'] <= cpu['upper']
+    assert client.get('/api/predictions?horizon=0').status_code == 400
+
+
+def test_predictions_use_background_forecasts(client):
+    """Test that published background forecasts replace incremental ones."""
+    from app.routes import api
+    _record_samples(20)
+    api._service_config['FORECAST_JOBS_ENABLED'] = True
+    api._forecast_state['submitted_at'] = None
+    try:
+        _record_samples(1, start=1_767_225_700.0)
+        assert api.forecast_scheduler.wait(timeout=60)
+
+        data = client.get('/api/predictions').get_json()
+        assert {data[name]['model'] for name in ['cpu', 'memory', 'disk']} == {'damped_holt'}
+        assert client.get('/api/predictions?horizon=2').get_json()['cpu']['model'] == 'holt'
+    finally:
+        api._service_config['FORECAST_JOBS_ENABLED'] = False
+        api.forecast_scheduler.shutdown()
+        api.forecast_scheduler.clear()
+
+
+@pytest.fixture
+def shared_reader(client, tmp_path):
+    """Make this process a reader of history written by another worker."""
+    from app.routes import api
+    from app.services.shared import SharedRingBuffer
+
+    path = str(tmp_path / 'metrics.buf')
+    collector = MetricsCollector()
+    saved = (collector._history, collector._shared, collector._stats)
+    detector = api.anomaly_detector
+    saved_detector = (detector.model, detector.snapshot_path, detector._snapshot_stat)
+    writer = SharedRingBuffer(path, HISTORY_FIELDS, collector.history_size)
+    collector.use_shared_history(path)
+    detector.model, detector.snapshot_path = None, str(tmp_path / 'anomaly.joblib')
+    api._service_config.update(METRICS_SHARED_PATH=path, FORECAST_JOBS_ENABLED=True)
+    api._forecast_state['submitted_at'] = None
+    try:
+        yield writer
+    finally:
+        api._service_config.update(METRICS_SHARED_PATH='', FORECAST_JOBS_ENABLED=False)
+        writer.close()
+        collector._shared.close()
+        collector._history, collector._shared, collector._stats = saved
+        collector._published = (0, {})
+        detector.model, detector.snapshot_path, detector._snapshot_stat = saved_detector
+
+
+def test_shared_history_readers_use_the_writers_forecasts(client, shared_reader):
+    """Test that readers submit no forecast jobs and serve the writer's."""
+    from app.routes import api
+    for i in range(20):
+        shared_reader.append(1_767_225_600.0 + i, {'cpu_percent': 50.0, 'memory_percent': 50.0,
+                                                   'disk_percent': 40.0})
+    forecast = {'model': 'damped_holt', 'predicted': [50.0]}
+    shared_reader.publish(json.dumps({'latest': {'cpu_percent': 50.0}, 'extras': {
+        'forecasts': {'generation': 1, 'results': {'cpu': forecast}}}}).encode())
+
+    api._schedule_forecasts({'cpu_percent': 50.0})
+
+    assert api.forecast_scheduler.pending() == 0
+    assert client.get('/api/predictions').get_json()['cpu'] == forecast
+
+
+def test_shared_history_readers_follow_the_writers_anomaly_model(client, shared_reader):
+    """Test that readers do not fit anomaly models but load the writer's snapshot."""
+    from app.routes import api
+    from app.services.anomaly import AnomalyDetector
+    from app.services.features import FeaturePipeline
+    for i in range(30):
+        shared_reader.append(1_767_225_600.0 + i, {'cpu_percent': 50.0 + i % 5,
+                                                   'memory_percent': 50.0, 'disk_percent': 40.0})
+    generation = api.anomaly_detector.generation
+
+    waiting = client.get('/api/anomalies?method=isolation_forest').get_json()
+    assert waiting['status'] == 'training'
+    assert api.anomaly_detector.generation == generation
+
+    pipeline = FeaturePipeline(TestingConfig.ANOMALY_WINDOW_SIZE)
+    writer_detector = AnomalyDetector(feature_pipeline=pipeline,
+                                      snapshot_path=api.anomaly_detector.snapshot_path)
+    writer_detector.detect(MetricsCollector().get_window(copy=True), version=30)
+    shared_reader.append(1_767_225_630.0, {'cpu_percent': 50.0, 'memory_percent': 50.0,
+                                           'disk_percent': 40.0})
+
+    assert client.get('/api/anomalies?method=isolation_forest').get_json()['status'] == 'ok'
+    assert api.anomaly_detector.generation == generation + 1
+
+
+def _ingest(client, records):
+    body = '\n'.join(json.dumps(record) for record in records)
+    return client.post('/api/ingest', data=body, content_type='application/x-ndjson')
+
+
+@pytest.fixture
+def remote_host():
+    from app.routes.api import host_registry
+    host_registry.clear()
+    yield 'web-1'
+    host_registry.clear()
+
+
+def test_ingest_and_query_remote_host(client, remote_host):
+    """Test POST /api/ingest and host= on the read endpoints."""
+    records = [{'host': remote_host, 'timestamp': 1_767_225_600.0 + i,
+                'cpu_percent': 97.0 if i == 29 else float(i), 'memory_percent': 50.0,
+                'disk_percent': 40.0} for i in range(30)]
+
+    response = _ingest(client, records)
+
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 30
+
+    latest = client.get(f'/api/metrics?host={remote_host}').get_json()
+    assert latest['cpu_percent'] == 97.0
+
+    history = client.get(f'/api/metrics/history?host={remote_host}&metrics=cpu_percent'
+                         f'&from={1_767_225_600 + 25}').get_json()
+    assert [row['cpu_percent'] for row in history] == [25.0, 26.0, 27.0, 28.0, 97.0]
+
+    summary = client.get(f'/api/summary?host={remote_host}').get_json()
+    assert summary['samples'] == 30
+
+    alerts = client.get(f'/api/alerts?host={remote_host}').get_json()
+    assert [a['severity'] for a in alerts['alerts']] == ['critical']
+
+    predictions = client.get(f'/api/predictions?host={remote_host}').get_json()
+    assert predictions['cpu']['model'] == 'holt'
+
+    for method in ['streaming', 'isolation_forest']:
+        anomalies = client.get(f'/api/anomalies?host={remote_host}&method={method}').get_json()
+        assert anomalies['method'] == method
+        assert anomalies['status'] == 'ok'
+
+    from app.routes.api import LOCAL_HOST
+
+    _record_samples(3)
+    hosts = {h['host']: h for h in client.get('/api/hosts').get_json()}
+    assert hosts[remote_host]['samples'] == 30
+    assert hosts[LOCAL_HOST]['samples'] == 3
+
+
+def test_ingest_accepts_gzip_batches_from_agent(client, remote_host):
+    """Test that /api/ingest decodes the push agent's compressed batches."""
+    from app.services.agent import encode_batch
+
+    records = [{'host': remote_host, 'timestamp': 1_767_225_600.0 + i, 'cpu_percent': 10.0}
+               for i in range(5)]
+    response = client.post('/api/ingest', data=encode_batch(records),
+                           content_type='application/x-ndjson',
+                           headers={'Content-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 5
+
+    response = client.post('/api/ingest', data=b'not gzip', content_type='application/x-ndjson',
+                           headers={'Content-Encoding': 'gzip'})
+    assert response.status_code == 400
+
+
+def test_ingest_rejects_bad_payloads(client, remote_host):
+    """Test ingest validation and content types."""
+    assert _ingest(client, [{'timestamp': 1.0}]).status_code == 400
+    assert client.post('/api/ingest', data=b'{oops', content_type='application/x-ndjson').status_code == 400
+    assert client.get('/api/metrics?host=nowhere').status_code == 404
+
+
+def test_ingest_msgpack(client, remote_host):
+    """Test msgpack bodies, or 415 without the optional package."""
+    try:
+        import msgpack
+    except ImportError:
+        response = client.post('/api/ingest', data=b'\x90', content_type='application/msgpack')
+        assert response.status_code == 415
+        return
+    body = msgpack.packb([{'host': remote_host, 'timestamp': 1.0, 'cpu_percent': 5.0}])
+    response = client.post('/api/ingest', data=body, content_type='application/msgpack')
+    assert response.get_json()['accepted'] == 1
+
+
 def test_get_alerts_no_alerts(client):
     """Test GET /api/alerts with normal metrics."""
     response = client.get('/api/alerts')
@@ -88,6 +558,25 @@ def test_get_alerts_no_alerts(client):
     assert data['count'] == len(data['alerts'])
 
 
+def test_alerts_are_evaluated_at_sample_time(client):
+    """Test that /api/alerts reads the state built when samples arrived."""
+    collector = MetricsCollector()
+    collector._record(1_767_225_600.0, {
+        'timestamp': format_timestamp(1_767_225_600.0),
+        'cpu_percent': 97.0,
+        'memory_percent': 50.0,
+        'disk_percent': 40.0,
+        'network': {},
+    })
+
+    data = client.get('/api/alerts').get_json()
+
+    assert data['count'] == 1
+    alert = data['alerts'][0]
+    assert (alert['type'], alert['severity'], alert['value']) == ('cpu', 'critical', 97.0)
+    assert alert['since'] == '2026-01-01T00:00:00+00:00'
+
+
 def test_alerts_response_structure(client):
     """Test that alerts have the correct structure when triggered."""
     response = client.get('/api/alerts')
@@ -134,3 +623,60 @@ def test_predictions_with_history(client):
     # With more data, predictions should have more fields
     for metric in ['cpu', 'memory', 'disk']:
         assert 'trend' in data[metric]
+
+
+def test_debug_perf_reports_hot_paths_and_routes(client):
+    """Test GET /api/debug/perf after some traffic."""
+    client.delete('/api/debug/perf')
+    MetricsCollector().get_current_metrics()
+    client.get('/api/metrics')
+
+    data = client.get('/api/debug/perf').get_json()
+
+    assert data['timings']['metrics.collect']['count'] == 1
+    assert data['timings']['http GET /api/metrics']['count'] == 1
+    assert 'serialize.json' in data['timings']
+    assert data['profiler']['running'] is False
+
+
+def test_debug_profiler_toggle(client):
+    """Test starting and stopping the sampling profiler at runtime."""
+    response = client.post('/api/debug/profiler', json={'running': True, 'interval': 0.001})
+    assert response.get_json()['running'] is True
+
+    time.sleep(0.05)
+    response = client.post('/api/debug/profiler', json={'running': False})
+    assert response.get_json()['running'] is False
+    assert response.get_json()['samples'] > 0
+
+    profile = client.get('/api/debug/profiler')
+    assert profile.mimetype == 'text/plain'
+    assert profile.data.strip()
+
+    assert client.post('/api/debug/profiler', json={'interval': -1}).status_code == 400
+
+
+def test_debug_profiler_disabled(client):
+    """Test that the profiler cannot be started unless enabled."""
+    client.application.config['PERF_PROFILER_ENABLED'] = False
+
+    assert client.post('/api/debug/profiler', json={'running': True}).status_code == 403
+
+
+def test_get_processes(client):
+    """Test GET /api/processes returns the top processes."""
+    response = client.get('/api/processes?by=memory&limit=3')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert list(data['top']) == ['memory']
+    assert 1 <= len(data['top']['memory']) <= 3
+    assert {'pid', 'name', 'cpu_percent', 'memory_rss', 'memory_percent',
+            'io_bytes_per_sec'} <= set(data['top']['memory'][0])
+    assert data['process_count'] >= 1
+
+
+def test_get_processes_rejects_bad_parameters(client):
+    """Test that unknown rankings and non-positive limits are rejected."""
+    assert client.get('/api/processes?by=threads').status_code == 400
+    assert client.get('/api/processes?limit=0').status_code == 400
@@ -0,0 +1,56 @@
+"""Smoke test of the benchmark suite."""
+
+import json
+
+import pytest
+from app.services.metrics import MetricsCollector
+from benchmarks.startup import STEPS, measure_startup
+from benchmarks.suite import compare, main, measure
+
+
+@pytest.fixture
+def restore_collector():
+    yield
+    collector = MetricsCollector()
+    collector.set_source(None)
+    collector.set_history_size(100)
+
+
+def test_measure_runs_at_least_once():
+    """Test that a case is timed at least once and until min_time."""
+    calls = []
+
+    result = measure(lambda: calls.append(1), min_time=0)
+
+    assert result['iterations'] == 1 == len(calls)
+    assert result['min_ms'] <= result['p50_ms'] <= result['max_ms']
+
+
+def test_suite_reports_json_and_regressions(tmp_path, restore_collector):
+    """Test a tiny run end to end, then compare it against a faster baseline."""
+    output = tmp_path / 'report.json'
+
+    status = main(['--sizes', '200', '--min-time', '0', '--output', str(output),
+                   '--only', 'collector.', '--only', 'serialize.', '--only', 'route'])
+
+    report = json.loads(output.read_text())
+    assert status == 0
+    names = {result['name'] for result in report['results']}
+    assert 'collector.sample' in names
+    assert 'route GET /api/metrics/history?layout=columns (cold)' in names
+    assert 'route POST /api/ingest' in names
+    assert all(result['size'] == 200 for result in report['results'])
+    assert report['environment']['python']
+
+    baseline = [{**result, 'mean_ms': result['mean_ms'] / 10} for result in report['results']]
+    regressions = compare(report['results'], baseline, tolerance=0.25)
+    assert {r['name'] for r in regressions} == names
+
+
+def test_startup_reports_every_step():
+    """Test the cold start benchmark with one fresh process."""
+    results = measure_startup('preload', runs=1)
+
+    assert [r['name'] for r in results] == [f'startup.preload.{step}'
+                                            for step in ('process', *STEPS)]
+    assert all(r['iterations'] == 1 and r['mean_ms'] > 0 for r in results)
@@ -0,0 +1,66 @@
+"""Tests for server-sent event broadcasting."""
+
+from app.services.broadcast import Broadcaster, format_event
+
+
+def test_format_event_splits_lines():
+    """Test SSE framing, including multi-line data."""
+    assert format_event('sample', 'a\nb') == b'event: sample\ndata: a\ndata: b\n\n'
+
+
+def test_publish_reaches_all_subscribers():
+    """Test that one publish is delivered to every subscriber."""
+    broadcaster = Broadcaster()
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+
+    broadcaster.publish('sample', '{}')
+
+    assert first.queue.get_nowait() == second.queue.get_nowait() == b'event: sample\ndata: {}\n\n'
+
+
+def test_new_subscriber_gets_last_event():
+    """Test that late subscribers start from the most recent event."""
+    broadcaster = Broadcaster()
+    broadcaster.publish('sample', '1')
+    broadcaster.publish('sample', '2')
+
+    subscription = broadcaster.subscribe()
+
+    assert subscription.queue.get_nowait() == format_event('sample', '2')
+
+
+def test_slow_subscriber_drops_oldest():
+    """Test that a full queue drops old events instead of blocking."""
+    broadcaster = Broadcaster(max_queue=2)
+    subscription = broadcaster.subscribe()
+    for i in range(5):
+        broadcaster.publish('sample', str(i))
+
+    assert subscription.dropped == 3
+    assert subscription.queue.get_nowait() == format_event('sample', '3')
+
+
+def test_stream_keepalive_and_unsubscribe():
+    """Test idle keepalives and cleanup when the consumer goes away."""
+    broadcaster = Broadcaster()
+    subscription = broadcaster.subscribe()
+    stream = broadcaster.stream(subscription, keepalive=0.01)
+
+    assert next(stream) == b': connected\n\n'
+    assert next(stream) == b': keepalive\n\n'
+    stream.close()
+
+    assert broadcaster.subscriber_count == 0
+
+
+def test_subscribers_are_capped():
+    """Test that subscribers past the limit are refused until one leaves."""
+    broadcaster = Broadcaster(max_subscribers=2)
+    first = broadcaster.subscribe()
+    second = broadcaster.subscribe()
+
+    assert broadcaster.subscribe() is None
+    broadcaster.unsubscribe(first)
+    assert broadcaster.subscribe() is not None
+    assert second is not None
@@ -0,0 +1,86 @@
+"""Tests for the versioned response cache."""
+
+import json
+import threading
+import time
+
+import pytest
+from app.services.cache import CachedResponse, ResponseCache
+
+
+def _entry(value):
+    return CachedResponse.build(value, json.dumps)
+
+
+def test_build_serializes_once_with_content_etag():
+    """Test the body and an ETag that depends only on the content."""
+    entry = CachedResponse.build({'a': 1}, json.dumps, {'X-Tier': 'raw'})
+
+    assert entry.body == b'{"a": 1}\n'
+    assert entry.etag == _entry({'a': 1}).etag
+    assert entry.etag != _entry({'a': 2}).etag
+    assert entry.headers == {'X-Tier': 'raw'}
+
+
+def test_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', _entry(1))
+    cache.put('b', _entry(2))
+    cache.get('a')
+    cache.put('c', _entry(3))
+
+    assert cache.get('b') is None
+    assert cache.get('a').value == 1
+    assert cache.get('c').value == 3
+    assert len(cache) == 2
+
+
+def test_get_or_compute_caches_result():
+    """Test that a key is computed once and then served from cache."""
+    cache = ResponseCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _entry('x')
+
+    assert cache.get_or_compute('k', compute).value == 'x'
+    assert cache.get_or_compute('k', compute).value == 'x'
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_concurrent_requests_compute_once():
+    """Test that concurrent misses on one key share a single computation."""
+    cache = ResponseCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return _entry('slow')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert [r.value for r in results] == ['slow'] * 8
+
+
+def test_failed_compute_is_not_cached():
+    """Test that exceptions propagate and leave the key uncached."""
+    cache = ResponseCache()
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('k', fail)
+    assert cache.get('k') is None
+    assert cache.get_or_compute('k', lambda: _entry(1)).value == 1
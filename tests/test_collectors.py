@@ -0,0 +1,163 @@
+"""Tests for the collector plugins."""
+
+import math
+
+import psutil
+import pytest
+from app.services.collectors import (
+    COLLECTORS, Collector, DiskCollector, PluginSource, parse_collectors,
+)
+from app.services.metrics import MetricsCollector
+from app.services.streaming import StreamingAnomalyDetector
+from app.services.wheel import TimerWheel
+
+SPEC = 'cpu:1,memory:1,disk:10,network:1,load:5'
+
+
+def test_parse_collectors():
+    """Test intervals, defaults and validation of the spec."""
+    collectors = parse_collectors('cpu:1, memory ,disk:30,network:2', default_interval=7)
+
+    assert [(c.name, c.interval) for c in collectors] == [
+        ('cpu', 1), ('memory', 7), ('disk', 30), ('network', 2)]
+    with pytest.raises(ValueError, match='Unknown collector'):
+        parse_collectors(SPEC + ',gpu:1')
+    with pytest.raises(ValueError, match='must be positive'):
+        parse_collectors(SPEC.replace('cpu:1', 'cpu:0'))
+    with pytest.raises(ValueError, match='network'):
+        parse_collectors('cpu:1,memory:1,disk:10')
+
+
+def test_samples_have_the_shape_of_read_metrics():
+    """Test that merged plugin values cover every psutil sample field."""
+    _, expected = MetricsCollector.read_metrics()
+
+    _, metrics = PluginSource(parse_collectors(SPEC))()
+
+    assert set(expected) <= set(metrics)
+    assert set(metrics['network']) == set(expected['network'])
+    assert metrics['disks']['/']['total'] == metrics['disk_total']
+    assert metrics['network']['bytes_recv'] == sum(
+        nic['bytes_recv'] for nic in metrics['interfaces'].values())
+    assert 'mountpoints' not in metrics
+    if 'load' in COLLECTORS and COLLECTORS['load'].available():
+        assert metrics['load_1'] >= 0
+
+
+class CountingCollector(Collector):
+    name = 'counting'
+
+    def __init__(self, interval=1.0):
+        super().__init__(interval)
+        self.facts_read = 0
+        self.collected = 0
+
+    def facts(self):
+        self.facts_read += 1
+        return {'static_value': 42}
+
+    def collect(self, facts):
+        self.collected += 1
+        return {'value': self.collected, 'static_seen': facts['static_value']}
+
+
+def test_plugin_must_implement_collect():
+    """Test that a plugin without ``collect`` cannot be created."""
+    class Incomplete(Collector):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_facts_are_cached_and_values_kept_between_collections():
+    """Test that facts are read once and samples reuse the latest values."""
+    plugin = CountingCollector()
+    source = PluginSource([plugin])
+
+    source()
+    _, metrics = source()
+    source.collect(plugin)
+    _, updated = source()
+
+    assert plugin.facts_read == 1
+    assert (metrics['value'], metrics['static_seen'], metrics['static_value']) == (1, 42, 42)
+    assert updated['value'] == 2
+
+
+def test_failing_plugin_keeps_last_values():
+    """Test that an exception in a plugin does not break sampling."""
+    plugin = CountingCollector()
+    source = PluginSource([plugin])
+    source()
+    plugin.collect = lambda facts: 1 / 0
+
+    source.collect(plugin)
+
+    assert source()[1]['value'] == 1
+
+
+def test_schedule_runs_plugins_on_the_wheel():
+    """Test that plugins run at their own intervals and can be paused."""
+    fast, slow = CountingCollector(1), CountingCollector(3)
+    slow.name = 'slow'
+    source = PluginSource([fast, slow])
+    paused = []
+    wheel = TimerWheel()
+    source.schedule(wheel, paused=lambda: bool(paused))
+
+    for _ in range(4):
+        wheel.run_tick()
+    paused.append(True)
+    wheel.run_tick()
+
+    assert (fast.collected, slow.collected) == (4, 2)
+    assert 'collector.facts' in wheel.stats()
+
+
+def test_disk_skips_unreadable_mountpoints():
+    """Test that a mount point disappearing does not fail the plugin."""
+    plugin = DiskCollector()
+    facts = plugin.facts()
+    facts['mountpoints']['/does/not/exist'] = 1
+
+    disks = plugin.collect(facts)['disks']
+
+    assert '/' in disks and '/does/not/exist' not in disks
+
+
+def test_unreadable_root_disk_is_recorded_as_missing(monkeypatch):
+    """Test that a failing ``/`` yields NaN, which history, stats and scoring accept."""
+    source = PluginSource(parse_collectors(SPEC))
+    collector = MetricsCollector()
+    detector = StreamingAnomalyDetector(warmup=10)
+    collector._enrichers, saved = [], collector._enrichers
+    collector.add_enricher(detector.enrich)
+    for i in range(20):
+        collector._record(float(i), {'cpu_percent': 20.0 + i % 3, 'memory_percent': 50.0,
+                                     'disk_percent': 40.0, 'network': {}})
+
+    def fail(mountpoint):
+        raise OSError('stale file handle')
+
+    monkeypatch.setattr(psutil, 'disk_usage', fail)
+    _, values = source()
+
+    assert values['disks'] == {}
+    assert all(math.isnan(values[name]) for name in ('disk_percent', 'disk_used', 'disk_free'))
+
+    collector.set_source(source)
+    try:
+        collector.get_current_metrics()
+        collector._record(100.0, {'cpu_percent': 99.0, 'memory_percent': 50.0,
+                                  'disk_percent': 40.0, 'network': {}})
+    finally:
+        collector.set_source(None)
+        collector._enrichers = saved
+    summary = collector.get_summary()
+    history = collector.get_history()
+
+    assert summary['samples'] == 22
+    assert history[-2]['disk_percent'] is None
+    # Scoring recovers from the missing value and still flags the spike
+    assert history[-1]['anomaly'] == 1.0
@@ -2,13 +2,13 @@
 
 import pytest
 from app import create_app
+from config import TestingConfig
 
 
 @pytest.fixture
 def client():
     """Create test client."""
-    app = create_app()
-    app.config['TESTING'] = True
+    app = create_app(TestingConfig)
     with app.test_client() as client:
         yield client
 
@@ -57,6 +57,7 @@ def test_dashboard_api_endpoints_referenced(client):
     assert response.status_code == 200
     assert b'/api/metrics' in response.data
     assert b'/api/anomalies' in response.data
+    assert b'/api/stream' in response.data
 
 
 def test_dashboard_content_type(client):
@@ -73,3 +74,29 @@ def test_health_endpoint_content_type(client):
 
     assert response.status_code == 200
     assert 'application/json' in response.content_type
+
+
+def test_prometheus_metrics_served_from_prebuilt_payload(client, monkeypatch):
+    """Test GET /metrics renders once per sample, never per scrape."""
+    from app.routes.api import exposition
+    from app.services.metrics import MetricsCollector
+
+    MetricsCollector().sample()
+    renders = exposition.renders
+
+    def fail():
+        raise AssertionError('scrape collected metrics')
+
+    monkeypatch.setattr(MetricsCollector, 'read_metrics', staticmethod(fail))
+    accept = 'application/openmetrics-text;version=1.0.0,text/plain;version=0.0.4;q=0.5'
+    for _ in range(3):
+        response = client.get('/metrics', headers={'Accept': accept})
+        assert response.status_code == 200
+
+    assert response.content_type.startswith('application/openmetrics-text')
+    assert b'system_monitor_cpu_usage_percent' in response.data
+    assert response.data.endswith(b'# EOF\n')
+    assert exposition.renders == renders
+
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
@@ -0,0 +1,80 @@
+"""Tests for history downsampling."""
+
+import numpy as np
+import pytest
+from app.services.downsample import downsample, lttb, minmax
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    """Test that LTTB keeps the ends and a visually dominant spike."""
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    y[437] = 25
+
+    kept = lttb(x, y, 50)
+
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_lttb_short_series_unchanged():
+    """Test that series shorter than the budget are kept whole."""
+    x = np.arange(5, dtype=float)
+
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_minmax_keeps_bucket_extremes():
+    """Test that min/max buckets keep each bucket's extremes."""
+    y = np.zeros(100)
+    y[13] = 5
+    y[71] = -5
+
+    kept = minmax(y, 10)
+
+    assert 13 in kept and 71 in kept
+    assert len(kept) <= 10 and kept[0] == 0 and kept[-1] == 99
+
+
+def test_downsample_aligns_fields():
+    """Test that all columns are reduced with the same indices."""
+    n = 500
+    columns = {
+        'timestamp': np.arange(n, dtype=float),
+        'a': np.sin(np.arange(n) / 10),
+        'b': np.cos(np.arange(n) / 10),
+    }
+
+    reduced = downsample(columns, ['a', 'b'], 60)
+
+    assert len(reduced['timestamp']) <= 60
+    assert np.array_equal(reduced['a'], np.sin(reduced['timestamp'] / 10))
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+@pytest.mark.parametrize('max_points', [1, 2, 5, 20, 61])
+def test_downsample_keeps_latest_sample(method, max_points):
+    """Test that the newest row survives however small the budget."""
+    n = 1000
+    columns = {
+        'timestamp': np.arange(n, dtype=float),
+        'a': np.sin(np.arange(n) / 10),
+        'b': np.cos(np.arange(n) / 7),
+    }
+
+    reduced = downsample(columns, ['a', 'b'], max_points, method)
+
+    assert len(reduced['timestamp']) <= max_points
+    assert reduced['timestamp'][-1] == n - 1
+    if max_points >= 2:
+        assert reduced['timestamp'][0] == 0
+
+
+def test_downsample_rejects_unknown_method():
+    """Test that unknown methods raise."""
+    columns = {'timestamp': np.arange(10.0), 'a': np.arange(10.0)}
+
+    with pytest.raises(ValueError):
+        downsample(columns, ['a'], 5, method='mean')
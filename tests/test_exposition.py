@@ -0,0 +1,75 @@
+"""Tests for the Prometheus exposition."""
+
+from app.services.exposition import Exposition, format_value, render
+
+SAMPLE = {
+    'timestamp': '2026-01-01T00:00:00+00:00',
+    'cpu_percent': 42.5,
+    'memory_percent': 50.0,
+    'disk_percent': 60.0,
+    'anomaly_score': float('nan'),
+    'load_1': 0.5,
+    'network': {'bytes_sent': 1024, 'bytes_recv': 2048, 'packets_sent': 1, 'packets_recv': 2},
+}
+SUMMARY = {'cpu': {'avg': 40.0, 'p95': 42.5}, 'samples': 3}
+ALERTS = {'alerts': [{'type': 'cpu', 'severity': 'warning'}], 'count': 1}
+RULES = [('cpu', 'warning'), ('cpu', 'critical')]
+
+
+def _lines(payload):
+    return payload.decode().splitlines()
+
+
+def test_format_value():
+    """Test integral, fractional and special values."""
+    assert format_value(3.0) == '3'
+    assert format_value(0.25) == '0.25'
+    assert format_value(float('nan')) == 'NaN'
+    assert format_value(None) == 'NaN'
+    assert format_value(float('-inf')) == '-Inf'
+
+
+def test_render_openmetrics():
+    """Test sample, summary, anomaly and alert families in OpenMetrics text."""
+    lines = _lines(render('web-1', SAMPLE, SUMMARY, ALERTS, RULES))
+
+    assert 'system_monitor_cpu_usage_percent{host="web-1"} 42.5' in lines
+    assert '# TYPE system_monitor_network_sent_bytes counter' in lines
+    assert 'system_monitor_network_sent_bytes_total{host="web-1"} 1024' in lines
+    assert 'system_monitor_anomaly_score{host="web-1"} NaN' in lines
+    assert 'system_monitor_load1{host="web-1"} 0.5' in lines
+    assert not any(line.startswith('system_monitor_load5') for line in lines)
+    assert 'system_monitor_usage_window_percent{host="web-1",resource="cpu",stat="p95"} 42.5' in lines
+    assert 'system_monitor_alert_active{host="web-1",alert="cpu",severity="warning"} 1' in lines
+    assert 'system_monitor_alert_active{host="web-1",alert="cpu",severity="critical"} 0' in lines
+    assert 'system_monitor_alerts_active{host="web-1"} 1' in lines
+    assert lines[-1] == '# EOF'
+
+
+def test_render_classic_text_format():
+    """Test that the 0.0.4 format names counter families with _total and has no EOF."""
+    lines = _lines(render('web-1', SAMPLE, SUMMARY, ALERTS, RULES, openmetrics=False))
+
+    assert '# TYPE system_monitor_network_sent_bytes_total counter' in lines
+    assert '# EOF' not in lines
+
+
+def test_render_before_first_sample_and_escaping():
+    """Test the payload without a sample and label escaping."""
+    lines = _lines(render('a"b', None, {}, {'alerts': [], 'count': 0}))
+
+    assert 'system_monitor_alerts_active{host="a\\"b"} 0' in lines
+    assert not any(line.startswith('system_monitor_cpu') for line in lines)
+
+
+def test_exposition_serves_prebuilt_payload():
+    """Test that payloads only change on update."""
+    exposition = Exposition('web-1')
+    assert exposition.payload() == b'# EOF\n'
+
+    exposition.update(SAMPLE, SUMMARY, ALERTS, RULES)
+    payload = exposition.payload()
+
+    assert payload is exposition.payload()
+    assert exposition.renders == 1
+    assert b'# EOF' not in exposition.payload(openmetrics=False)
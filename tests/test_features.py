@@ -0,0 +1,116 @@
+"""Tests for the windowed anomaly feature pipeline."""
+
+import numpy as np
+import pytest
+from app.services.anomaly import AnomalyDetector
+from app.services.features import FeaturePipeline, columns_from_rows
+from app.services.metrics import NETWORK_FIELDS, rows_from_columns
+from app.services.synthetic import SyntheticMetrics
+
+
+def _history(n, offset=0):
+    timestamps, columns = SyntheticMetrics().generate(offset, n)
+    return {'timestamp': timestamps, **columns}
+
+
+def test_features_match_naive_computation():
+    """Test deltas, rolling statistics and rates against plain Python."""
+    pipeline = FeaturePipeline(window=5)
+    history = _history(50)
+
+    features = pipeline.compute(history)
+
+    assert features.shape == (50, len(pipeline.names))
+    cpu = history['cpu_percent']
+    i = pipeline.names.index
+    for row in (0, 3, 4, 49):
+        window = [cpu[max(k, 0)] for k in range(row - 4, row + 1)]
+        assert features[row, i('cpu_percent')] == cpu[row]
+        assert features[row, i('cpu_percent_delta')] == pytest.approx(cpu[row] - cpu[max(row - 1, 0)])
+        assert features[row, i('cpu_percent_mean')] == pytest.approx(np.mean(window))
+        assert features[row, i('cpu_percent_std')] == pytest.approx(np.std(window))
+    sent = history['bytes_sent']
+    assert features[10, i('bytes_sent_rate')] == pytest.approx((sent[10] - sent[9]) / 5.0)
+    assert features[0, i('bytes_sent_rate')] == 0
+
+
+def test_counter_resets_have_zero_rate():
+    """Test that a counter going backwards is not a negative rate."""
+    history = {'timestamp': np.array([0.0, 5.0, 10.0, 10.0]),
+               'bytes_recv': np.array([100.0, 600.0, 50.0, 80.0])}
+
+    features = FeaturePipeline(window=2).compute(history)
+
+    rates = features[:, FeaturePipeline().names.index('bytes_recv_rate')]
+    assert rates.tolist() == [0.0, 100.0, 0.0, 0.0]
+
+
+def test_incremental_transform_computes_only_new_rows():
+    """Test that later versions reuse rows and match a full computation."""
+    pipeline = FeaturePipeline(window=5)
+    full = _history(130)
+
+    pipeline.transform({k: v[:100] for k, v in full.items()}, version=100)
+    computed = pipeline.rows_computed
+    features = pipeline.transform({k: v[30:130] for k, v in full.items()}, version=130)
+
+    # 30 new rows plus the 5 rows of context before them
+    assert pipeline.rows_computed - computed == 35
+    np.testing.assert_allclose(features, pipeline.compute(full)[30:])
+
+
+def test_transform_recomputes_after_a_gap():
+    """Test that a window not overlapping the cached rows is rebuilt."""
+    pipeline = FeaturePipeline(window=5)
+    pipeline.transform(_history(20), version=20)
+    later = _history(20, offset=100)
+
+    features = pipeline.transform(later, version=120)
+
+    np.testing.assert_allclose(features, pipeline.compute(later))
+
+
+def test_rows_and_columns_give_the_same_features():
+    """Test that collected-sample dictionaries are converted like columns."""
+    history = _history(30)
+    rows = rows_from_columns({**history, 'anomaly_score': np.zeros(30), 'anomaly': np.zeros(30)})
+    pipeline = FeaturePipeline(window=4)
+
+    assert set(rows[0]['network']) == set(NETWORK_FIELDS)
+    np.testing.assert_allclose(pipeline.transform(rows), pipeline.compute(history))
+    assert columns_from_rows([{'cpu_percent': None}], ['cpu_percent'])['cpu_percent'].tolist() == [0]
+
+
+def test_detector_fits_on_pipeline_features(tmp_path):
+    """Test that the detector uses the pipeline and records its schema."""
+    pipeline = FeaturePipeline(window=5)
+    detector = AnomalyDetector(feature_pipeline=pipeline,
+                               snapshot_path=str(tmp_path / 'anomaly.joblib'))
+    history = _history(60)
+
+    result = detector.detect(history, version=60)
+
+    assert result['status'] == 'ok'
+    assert detector.model.n_features_in_ == len(pipeline.names)
+    assert detector.snapshot['feature_fields'] == list(pipeline.names)
+    for anomaly in result['anomalies']:
+        assert set(anomaly['metrics']) == {'cpu_percent', 'memory_percent', 'disk_percent'}
+
+
+def test_switching_features_drops_the_model():
+    """Test that a model is never scored with features it was not fit on."""
+    detector = AnomalyDetector()
+    detector.detect(_history(30), version=30)
+
+    detector.set_feature_pipeline(FeaturePipeline(window=5))
+    result = detector.detect(_history(31), version=31)
+
+    assert result['status'] == 'ok'
+    assert detector.model.n_features_in_ == len(detector.feature_fields)
+    assert detector.generation == 3
+
+
+def test_window_must_cover_two_samples():
+    """Test that a degenerate window is rejected."""
+    with pytest.raises(ValueError):
+        FeaturePipeline(window=1)
@@ -0,0 +1,103 @@
+"""Tests for per-host series and bulk ingest."""
+
+import json
+
+import numpy as np
+import pytest
+from app.services.hosts import HostRegistry, IngestError, decode_ndjson
+
+
+def _record(host, ts, cpu=10.0, **extra):
+    return {'host': host, 'timestamp': ts, 'cpu_percent': cpu, 'memory_percent': 50.0,
+            'disk_percent': 40.0, **extra}
+
+
+def test_ingest_splits_batch_by_host():
+    """Test that one batch lands in each host's own series."""
+    registry = HostRegistry(capacity=10)
+
+    result = registry.ingest([_record('a', 1.0, 1.0), _record('b', 1.0, 2.0),
+                              _record('a', 2.0, 3.0)])
+
+    assert result == {'accepted': 3, 'rejected': 0, 'hosts': 2, 'errors': []}
+    assert registry.get('a').get_window()['cpu_percent'].tolist() == [1.0, 3.0]
+    assert registry.get('b').get_window()['cpu_percent'].tolist() == [2.0]
+    assert len(registry) == 2
+
+
+def test_ingest_orders_samples_by_time():
+    """Test that out-of-order samples in a batch are stored in time order."""
+    registry = HostRegistry()
+    registry.ingest([_record('a', 3.0, 3.0), _record('a', 1.0, 1.0), _record('a', 2.0, 2.0)])
+
+    assert registry.get('a').get_window()['timestamp'].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_network_counters_flat_or_nested():
+    """Test both accepted layouts of the network counters."""
+    registry = HostRegistry()
+    registry.ingest([_record('a', 1.0, bytes_sent=5), _record('a', 2.0, network={'bytes_sent': 7})])
+
+    assert registry.get('a').get_window()['bytes_sent'].tolist() == [5.0, 7.0]
+    assert registry.get('a').get_latest()['network']['bytes_sent'] == 7
+
+
+def test_invalid_records_are_rejected_individually():
+    """Test that bad records are reported while the rest are stored."""
+    registry = HostRegistry()
+    records = [_record('a', 1.0), {'timestamp': 2.0}, _record('bad host!', 3.0),
+               _record('a', 4.0, cpu='high'), _record('a', float('nan')), 'junk',
+               _record('a', 5.0)]
+
+    result = registry.ingest(records)
+
+    assert (result['accepted'], result['rejected']) == (2, 5)
+    assert result['errors'][0] == 'record 1: missing or invalid host'
+    assert 'cpu_percent must be a number' in result['errors'][2]
+    assert registry.get('a').get_window()['timestamp'].tolist() == [1.0, 5.0]
+
+
+def test_bulk_path_rejects_numeric_strings_and_booleans():
+    """Test that values float() would convert are rejected like per record."""
+    registry = HostRegistry()
+    records = [_record('a', 1.0, cpu='42'), _record('a', 2.0, cpu=True),
+               {**_record('a', 3.0), 'timestamp': '3'}, _record('a', 4.0)]
+
+    result = registry.ingest(records)
+
+    assert (result['accepted'], result['rejected']) == (1, 3)
+    assert result['errors'][:2] == ['record 0: cpu_percent must be a number',
+                                    'record 1: cpu_percent must be a number']
+    assert result['errors'][2] == 'record 2: missing or invalid timestamp'
+
+
+def test_max_hosts_limits_new_hosts():
+    """Test that hosts past the limit are rejected."""
+    registry = HostRegistry(max_hosts=1)
+
+    result = registry.ingest([_record('a', 1.0), _record('b', 1.0)])
+
+    assert (result['accepted'], result['rejected']) == (1, 1)
+    assert registry.get('b') is None
+
+
+def test_summary_matches_window():
+    """Test host summaries computed from the window."""
+    registry = HostRegistry()
+    registry.ingest([_record('a', float(i), float(i)) for i in range(10)])
+
+    summary = registry.get('a').get_summary()
+
+    assert summary['samples'] == 10
+    assert summary['cpu']['avg'] == 4.5
+    assert summary['cpu']['max'] == 9.0
+    assert summary['cpu']['current'] == 9.0
+
+
+def test_decode_ndjson():
+    """Test NDJSON and JSON-array bodies, and error reporting."""
+    body = b'{"host": "a"}\n\n{"host": "b"}\n'
+    assert decode_ndjson(body) == [{'host': 'a'}, {'host': 'b'}]
+    assert decode_ndjson(json.dumps([{'host': 'a'}]).encode()) == [{'host': 'a'}]
+    with pytest.raises(IngestError, match='line 2'):
+        decode_ndjson(b'{"host": "a"}\n{nope}\n')
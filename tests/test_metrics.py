@@ -1,5 +1,8 @@
 """Tests for metrics service."""
 
+import json
+import time
+
 import pytest
 from app.services.metrics import MetricsCollector
 
@@ -28,3 +31,251 @@ def test_metrics_history():
 
     history = collector.get_history()
     assert len(history) >= 5
+
+
+def test_history_round_trips_sample():
+    """Test that history rows match the collected sample."""
+    collector = MetricsCollector()
+    metrics = collector.get_current_metrics()
+
+    row = collector.get_history()[-1]
+    assert row['timestamp'] == metrics['timestamp']
+    assert row['cpu_count'] == metrics['cpu_count']
+    assert row['memory_total'] == metrics['memory_total']
+    assert row['network'] == metrics['network']
+
+
+def test_get_window_columns():
+    """Test that the columnar window exposes one array per field."""
+    collector = MetricsCollector()
+    for _ in range(3):
+        collector.get_current_metrics()
+
+    window = collector.get_window()
+    assert len(window['timestamp']) == 3
+    assert len(window['cpu_percent']) == 3
+    assert window['timestamp'][0] <= window['timestamp'][-1]
+
+
+def test_copied_window_is_not_changed_by_later_samples():
+    """Test that a copied window keeps its samples while sampling goes on."""
+    collector = MetricsCollector()
+    original = collector.history_size
+    try:
+        collector.set_history_size(2)
+        for _ in range(2):
+            collector.get_current_metrics()
+        view = collector.get_window()
+        copied = collector.get_window(copy=True)
+        timestamps = copied['timestamp'].tolist()
+        assert view['timestamp'].tolist() == timestamps
+
+        time.sleep(0.01)
+        collector.get_current_metrics()
+
+        assert copied['timestamp'].tolist() == timestamps
+        assert view['timestamp'].tolist() != timestamps
+    finally:
+        collector.set_history_size(original)
+
+
+def test_set_history_size_keeps_recent_samples():
+    """Test that resizing honors the new capacity and keeps recent data."""
+    collector = MetricsCollector()
+    original = collector.history_size
+    try:
+        for _ in range(4):
+            collector.get_current_metrics()
+        latest = collector.get_history()[-1]['timestamp']
+
+        collector.set_history_size(2)
+
+        history = collector.get_history()
+        assert collector.history_size == 2
+        assert len(history) == 2
+        assert history[-1]['timestamp'] == latest
+    finally:
+        collector.set_history_size(original)
+
+
+def test_summary_tracks_sliding_window():
+    """Test that the summary reflects only samples still in history."""
+    collector = MetricsCollector()
+    original = collector.history_size
+    collector.set_history_size(3)
+    try:
+        for i, cpu in enumerate([10.0, 90.0, 20.0, 30.0, 40.0]):
+            collector._record(float(i), {
+                'cpu_percent': cpu,
+                'memory_percent': 50.0,
+                'disk_percent': 60.0,
+                'network': {},
+            })
+
+        summary = collector.get_summary()
+        assert summary['samples'] == 3
+        assert summary['cpu']['current'] == 40.0
+        assert summary['cpu']['avg'] == pytest.approx(30.0)
+        assert summary['cpu']['min'] == 20.0
+        assert summary['cpu']['max'] == 40.0
+        assert summary['memory']['std'] == pytest.approx(0.0)
+        assert 'p95' in summary['disk']
+    finally:
+        collector.set_history_size(original)
+
+
+def test_summary_empty_history():
+    """Test that an empty history has an empty summary."""
+    assert MetricsCollector().get_summary() == {}
+
+
+def test_shared_history_reader_uses_writer_state(tmp_path):
+    """Test that a reader collector serves the writer's history and summary."""
+    from app.services.metrics import HISTORY_FIELDS
+    from app.services.shared import SharedRingBuffer
+
+    path = str(tmp_path / 'metrics.buf')
+    collector = MetricsCollector()
+    saved = (collector._history, collector._shared, collector._stats)
+    # Hold the writer role from a separate handle, as another worker would
+    writer = SharedRingBuffer(path, HISTORY_FIELDS, collector.history_size)
+    try:
+        collector.use_shared_history(path)
+        assert collector.is_reader
+        assert collector.sample() is None
+
+        writer.append(1.0, {'cpu_percent': 42.0})
+        writer.publish(b'{"latest": {"cpu_percent": 42.0}, "summary": {"samples": 1}, '
+                       b'"extras": {"forecasts": {"cpu": 1}}}')
+
+        assert collector.get_window()['cpu_percent'].tolist() == [42.0]
+        assert collector.get_latest() == {'cpu_percent': 42.0}
+        assert collector.get_summary() == {'samples': 1}
+        assert collector.get_shared('forecasts') == {'cpu': 1}
+        assert collector.get_shared('models') is None
+
+        writer.close()
+        assert collector.sample() is not None
+        assert not collector.is_reader
+        assert collector.get_summary()['samples'] == 2
+    finally:
+        collector._shared.close()
+        collector._history, collector._shared, collector._stats = saved
+        collector._published = (0, {})
+
+
+def test_shared_writer_publishes_oversized_samples(tmp_path):
+    """Test that detail too big for the blob slot is dropped, and errors do not stop listeners."""
+    from app.services.metrics import HISTORY_FIELDS
+    from app.services.shared import SharedRingBuffer
+
+    path = str(tmp_path / 'metrics.buf')
+    collector = MetricsCollector()
+    saved = (collector._history, collector._shared, collector._stats, collector._listeners)
+    seen = []
+    collector._listeners = [seen.append]
+    reader = None
+    try:
+        collector.use_shared_history(path)
+        assert not collector.is_reader
+        reader = SharedRingBuffer(path, HISTORY_FIELDS, collector.history_size)
+        disks = {f'/mnt/{i}': {'percent': 1.0, 'used': 1, 'free': 1, 'total': 2}
+                 for i in range(5000)}
+        collector._record(1.0, {'cpu_percent': 42.0, 'memory_percent': 50.0,
+                                'disk_percent': 40.0, 'network': {'bytes_sent': 1},
+                                'disks': disks})
+
+        latest = json.loads(reader.read_published()[1])['latest']
+        assert latest['cpu_percent'] == 42.0 and latest['network'] == {'bytes_sent': 1}
+        assert 'disks' not in latest
+
+        def fail(payload):
+            raise ValueError('payload exceeds the shared blob size')
+
+        collector._shared.publish = fail
+        collector._record(2.0, {'cpu_percent': 43.0, 'memory_percent': 50.0,
+                                'disk_percent': 40.0, 'network': {}})
+        assert [sample['cpu_percent'] for sample in seen] == [42.0, 43.0]
+    finally:
+        if reader is not None:
+            reader.close()
+        collector._shared.close()
+        (collector._history, collector._shared, collector._stats,
+         collector._listeners) = saved
+        collector._published = (0, {})
+
+
+def test_shared_values_are_published_with_samples(tmp_path):
+    """Test that values shared by the writer reach readers with the next sample."""
+    from app.services.metrics import HISTORY_FIELDS
+    from app.services.shared import SharedRingBuffer
+
+    path = str(tmp_path / 'metrics.buf')
+    collector = MetricsCollector()
+    saved = (collector._history, collector._shared, collector._stats, collector._extras)
+    collector._extras = {}
+    reader = None
+    try:
+        collector.use_shared_history(path)
+        reader = SharedRingBuffer(path, HISTORY_FIELDS, collector.history_size)
+        collector.share('forecasts', {'cpu': {'predicted': [50.0]}})
+        assert collector.get_shared('forecasts') == {'cpu': {'predicted': [50.0]}}
+
+        collector._record(1.0, {'cpu_percent': 42.0, 'memory_percent': 50.0,
+                                'disk_percent': 40.0, 'network': {}})
+
+        extras = json.loads(reader.read_published()[1])['extras']
+        assert extras == {'forecasts': {'cpu': {'predicted': [50.0]}}}
+    finally:
+        if reader is not None:
+            reader.close()
+        collector._shared.close()
+        (collector._history, collector._shared, collector._stats,
+         collector._extras) = saved
+        collector._published = (0, {})
+
+
+def test_store_errors_do_not_stop_sampling():
+    """Test that a failing store append still records and notifies."""
+    class FullDisk:
+        def append(self, timestamp, row):
+            raise OSError(28, 'No space left on device')
+
+    collector = MetricsCollector()
+    saved = (collector._store, collector._listeners)
+    seen = []
+    collector._store, collector._listeners = FullDisk(), [seen.append]
+    try:
+        collector._record(1.0, {'cpu_percent': 42.0, 'memory_percent': 50.0,
+                                'disk_percent': 40.0, 'network': {}})
+    finally:
+        collector._store, collector._listeners = saved
+
+    assert [sample['cpu_percent'] for sample in seen] == [42.0]
+    assert collector.get_window()['cpu_percent'].tolist() == [42.0]
+
+
+def test_store_restores_history_after_restart(tmp_path):
+    """Test that persisted samples refill an empty history."""
+    collector = MetricsCollector()
+    path = str(tmp_path / 'store')
+    try:
+        collector.use_store(path)
+        for _ in range(3):
+            collector.get_current_metrics()
+        expected = collector.get_history()
+        collector.flush()
+
+        # Simulate a restart: empty history, then reattach the store
+        collector.clear()
+        collector._store = None
+        collector.use_store(path)
+
+        assert collector.get_history() == expected
+        assert collector.get_summary()['samples'] == 3
+        now = time.time()
+        tier, columns = collector.get_range(now - 3600, now)
+        assert tier == 'raw'
+        assert len(columns['timestamp']) == 3
+    finally:
+        collector._store = None
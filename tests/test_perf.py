@@ -0,0 +1,98 @@
+"""Tests for self-instrumentation."""
+
+import threading
+import time
+
+import numpy as np
+from app.services.perf import LatencyHistogram, PerfRegistry, SamplingProfiler
+
+
+def test_histogram_quantiles_within_bucket_error():
+    """Test percentiles over several orders of magnitude."""
+    rng = np.random.default_rng(0)
+    values = np.exp(rng.uniform(np.log(1e-5), np.log(10.0), 5000))
+    histogram = LatencyHistogram()
+    for value in values.tolist():
+        histogram.record(value)
+
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q)
+        assert abs(histogram.quantile(q) - exact) / exact < 0.05
+    assert histogram.count == 5000
+    assert histogram.quantile(1.0) == values.max()
+
+
+def test_histogram_empty_and_out_of_range():
+    """Test an empty histogram and values outside the tracked range."""
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    assert histogram.summary()['mean_ms'] is None
+
+    histogram.record(0.0)
+    histogram.record(1e-9)
+    histogram.record(1e9)
+    assert histogram.count == 3
+    assert histogram.quantile(1.0) == 1e9
+
+
+def test_registry_timer_and_decorator():
+    """Test timing blocks and calls, and disabling the registry."""
+    registry = PerfRegistry()
+
+    @registry.timed('work')
+    def work():
+        time.sleep(0.01)
+        return 42
+
+    assert work() == 42
+    with registry.timer('block'):
+        pass
+
+    snapshot = registry.snapshot()
+    assert list(snapshot) == ['block', 'work']
+    assert snapshot['work']['count'] == 1
+    assert snapshot['work']['max_ms'] >= 10
+
+    registry.enabled = False
+    work()
+    assert registry.snapshot()['work']['count'] == 1
+
+    registry.reset()
+    assert registry.snapshot() == {}
+
+
+def _busy_wait(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_thread_stacks():
+    """Test that the profiler finds a busy thread's function."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_wait, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    try:
+        profiler.start()
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    status = profiler.status()
+    assert not status['running']
+    assert status['samples'] > 0
+    folded = profiler.folded()
+    assert '_busy_wait' in folded
+    stack, count = folded.splitlines()[0].rsplit(' ', 1)
+    assert int(count) >= 1
+
+
+def test_profiler_stops_after_duration():
+    """Test that a profile with a duration ends on its own."""
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start(duration=0.05)
+    time.sleep(0.3)
+
+    assert not profiler.running
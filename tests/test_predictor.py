@@ -0,0 +1,111 @@
+"""Tests for the Holt forecasting service."""
+
+import numpy as np
+from app.services.predictor import Predictor, forecast_series
+
+
+def _history(cpu, memory=None, disk=None):
+    n = len(cpu)
+    return {
+        'timestamp': np.arange(n, dtype=np.float64),
+        'cpu_percent': np.asarray(cpu, dtype=np.float64),
+        'memory_percent': np.full(n, 50.0) if memory is None else np.asarray(memory, dtype=np.float64),
+        'disk_percent': np.full(n, 40.0) if disk is None else np.asarray(disk, dtype=np.float64),
+    }
+
+
+def test_insufficient_data():
+    """Test that no forecast is made before min_samples."""
+    predictor = Predictor()
+    predictor.fit(_history([10.0, 11.0]))
+
+    assert predictor.predictions()['cpu'] == {'trend': 'stable', 'prediction': None}
+
+
+def test_linear_trend_is_extrapolated():
+    """Test that a clean line is forecast exactly with a tight band."""
+    predictor = Predictor(horizon=10)
+    predictor.fit(_history(np.arange(30, dtype=np.float64)))
+
+    cpu = predictor.predictions()['cpu']
+
+    assert cpu['trend'] == 'increasing'
+    assert abs(cpu['current'] - 29.0) < 1e-6
+    assert abs(cpu['predicted'] - 39.0) < 1e-6
+    assert abs(cpu['slope'] - 1.0) < 1e-6
+    assert cpu['lower'] <= cpu['predicted'] <= cpu['upper']
+    assert predictor.predictions()['memory']['trend'] == 'stable'
+
+
+def test_band_widens_with_noise_and_horizon():
+    """Test that noisier series and longer horizons widen the interval."""
+    rng = np.random.default_rng(0)
+    predictor = Predictor()
+    predictor.fit(_history(50 + rng.normal(0, 5, 100), memory=50 + rng.normal(0, 0.5, 100)))
+
+    near = predictor.forecast(1)
+    far = predictor.forecast(10)
+    width = lambda f: f['upper'] - f['lower']
+
+    assert width(near)[0] > width(near)[1]
+    assert np.all(width(far) >= width(near))
+
+
+def test_forecast_is_clipped_to_bounds():
+    """Test that percentages are never forecast outside [0, 100]."""
+    predictor = Predictor(horizon=50)
+    predictor.fit(_history(np.linspace(60, 99, 20)))
+
+    assert predictor.forecast()['predicted'][0] == 100.0
+
+
+def test_sync_matches_full_fit():
+    """Test that incremental sync equals refitting on the same samples."""
+    cpu = np.sin(np.arange(60) / 5.0) * 20 + 50
+    full = Predictor()
+    full.fit(_history(cpu))
+
+    incremental = Predictor()
+    for n in range(1, 61):
+        incremental.sync(n, _history(cpu[:n]))
+
+    np.testing.assert_allclose(incremental.forecast()['predicted'], full.forecast()['predicted'])
+    assert incremental.count == 60
+
+
+def test_sync_restarts_when_history_is_replaced():
+    """Test that a version going backwards refits from the window."""
+    predictor = Predictor()
+    predictor.sync(100, _history(np.arange(20, dtype=np.float64)))
+    predictor.sync(10, _history(np.full(10, 5.0)))
+
+    assert predictor.count == 10
+    assert abs(predictor.predictions()['cpu']['current'] - 5.0) < 1e-6
+
+
+def test_missing_values_are_skipped():
+    """Test that NaN samples leave the fit usable."""
+    cpu = np.arange(20, dtype=np.float64)
+    cpu[[3, 12]] = np.nan
+    predictor = Predictor()
+    predictor.fit(_history(cpu))
+
+    result = predictor.forecast()
+
+    assert np.all(np.isfinite(result['predicted']))
+    assert abs(result['slope'][0] - 1.0) < 0.1
+
+
+def test_forecast_series_damped_holt():
+    """Test the grid-searched background model on a noisy trend."""
+    rng = np.random.default_rng(1)
+    timestamps = np.arange(100, dtype=np.float64) * 5
+    values = 0.8 * np.arange(100) + rng.normal(0, 0.5, 100)
+
+    result = forecast_series('damped_holt', timestamps, values, horizon=10, confidence=0.95)
+
+    assert result['model'] == 'damped_holt'
+    assert result['trend'] == 'increasing'
+    assert 77 < result['current'] < 81
+    assert result['lower'] < result['predicted'] < result['upper']
+    assert forecast_series('damped_holt', timestamps[:5], values[:5], 10, 0.95) is None
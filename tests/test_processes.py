@@ -0,0 +1,71 @@
+"""Tests for the per-process top-N monitor."""
+
+import os
+import time
+
+import pytest
+from app.services.processes import ProcessMonitor
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_rankings_are_sorted_and_bounded():
+    """Test that each ranking holds the top processes, largest first."""
+    monitor = ProcessMonitor(top_n=3, interval=0)
+    monitor.refresh()
+    _busy(0.2)
+
+    snapshot = monitor.refresh()
+
+    assert snapshot['process_count'] >= 1
+    assert snapshot['interval'] > 0
+    assert set(snapshot['top']) == {'cpu', 'memory', 'io'}
+    for key, ranking in (('cpu_percent', snapshot['top']['cpu']),
+                         ('memory_rss', snapshot['top']['memory'])):
+        values = [process[key] for process in ranking]
+        assert 1 <= len(values) <= 3
+        assert values == sorted(values, reverse=True)
+    # This process was busy between the refreshes
+    assert os.getpid() in [process['pid'] for process in snapshot['top']['cpu']]
+
+
+def test_first_refresh_has_no_io_rates():
+    """Test that IO rates need two refreshes."""
+    snapshot = ProcessMonitor(interval=0).refresh()
+
+    assert snapshot['interval'] is None
+    assert snapshot['top']['io'] == []
+
+
+def test_io_ranking_can_be_disabled():
+    """Test that the IO ranking is skipped when io is off."""
+    snapshot = ProcessMonitor(interval=0, io=False).refresh()
+
+    assert 'io' not in snapshot['top']
+
+
+def test_maybe_refresh_respects_interval():
+    """Test that refreshes are rate-limited."""
+    monitor = ProcessMonitor(interval=3600)
+
+    monitor.maybe_refresh()
+    monitor.maybe_refresh()
+
+    assert monitor.refreshes == 1
+
+
+def test_snapshot_filters_and_limits():
+    """Test the by and limit options, and that the first call refreshes."""
+    monitor = ProcessMonitor(top_n=5, interval=3600)
+
+    snapshot = monitor.snapshot(by='memory', limit=2)
+
+    assert monitor.refreshes == 1
+    assert list(snapshot['top']) == ['memory']
+    assert len(snapshot['top']['memory']) <= 2
+    with pytest.raises(ValueError):
+        monitor.snapshot(by='threads')
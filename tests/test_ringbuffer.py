@@ -0,0 +1,82 @@
+"""Tests for the columnar ring buffer."""
+
+import numpy as np
+import pytest
+from app.services.ringbuffer import RingBuffer
+
+
+def test_append_and_window_order():
+    """Test that windows return samples oldest first."""
+    buf = RingBuffer(('a', 'b'), capacity=4)
+    for i in range(3):
+        buf.append(float(i), {'a': i, 'b': i * 10})
+
+    timestamps, data = buf.window()
+
+    assert len(buf) == 3
+    assert timestamps.tolist() == [0.0, 1.0, 2.0]
+    assert data[1].tolist() == [0.0, 10.0, 20.0]
+
+
+def test_wraparound_keeps_most_recent():
+    """Test that the oldest samples are evicted once capacity is reached."""
+    buf = RingBuffer(('a',), capacity=3)
+    for i in range(7):
+        buf.append(float(i), {'a': i})
+
+    assert len(buf) == 3
+    assert buf.total == 7
+    assert buf.column('a').tolist() == [4.0, 5.0, 6.0]
+    assert buf.column('a', 2).tolist() == [5.0, 6.0]
+
+
+def test_windows_are_views():
+    """Test that windows alias the underlying storage, even after wrapping."""
+    buf = RingBuffer(('a',), capacity=3)
+    for i in range(5):
+        buf.append(float(i), {'a': i})
+
+    timestamps, data = buf.window()
+
+    assert np.shares_memory(data, buf._data)
+    assert np.shares_memory(timestamps, buf._timestamps)
+
+
+def test_missing_field_is_nan():
+    """Test that fields absent from a sample are stored as NaN."""
+    buf = RingBuffer(('a', 'b'), capacity=2)
+    buf.append(0.0, {'a': 1})
+
+    assert np.isnan(buf.column('b')[0])
+
+
+def test_extend_matches_append():
+    """Test that batch appends behave like repeated single appends."""
+    single = RingBuffer(('a',), capacity=5)
+    batch = RingBuffer(('a',), capacity=5)
+    single.append(-1.0, {'a': -1})
+    batch.append(-1.0, {'a': -1})
+    values = np.arange(8, dtype=float)
+    for v in values:
+        single.append(v, {'a': v})
+    batch.extend(values, values[np.newaxis, :])
+
+    assert batch.total == single.total
+    assert batch.column('a').tolist() == single.column('a').tolist()
+    assert batch.column('timestamp').tolist() == single.column('timestamp').tolist()
+
+
+def test_clear():
+    """Test that clear empties the buffer."""
+    buf = RingBuffer(('a',), capacity=2)
+    buf.append(0.0, {'a': 1})
+    buf.clear()
+
+    assert len(buf) == 0
+    assert buf.column('a').size == 0
+
+
+def test_invalid_capacity():
+    """Test that a zero capacity is rejected."""
+    with pytest.raises(ValueError):
+        RingBuffer(('a',), capacity=0)
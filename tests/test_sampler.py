@@ -0,0 +1,95 @@
+"""Tests for the background metrics sampler."""
+
+import time
+
+import pytest
+from app import create_app
+from app.services.metrics import MetricsCollector
+from app.services.sampler import MetricsSampler
+from config import TestingConfig
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_sampler_collects_in_background():
+    """Test that the sampler fills history without any requests."""
+    collector = MetricsCollector()
+    sampler = MetricsSampler(collector, interval=0.05)
+    sampler.start()
+    try:
+        assert _wait_for(lambda: len(collector.get_history()) >= 3)
+    finally:
+        sampler.stop()
+
+    assert not sampler.running
+
+
+def test_sampler_start_is_idempotent():
+    """Test that starting twice keeps a single thread."""
+    sampler = MetricsSampler(MetricsCollector(), interval=10)
+    sampler.start()
+    thread = sampler._thread
+    sampler.start()
+    try:
+        assert sampler._thread is thread
+    finally:
+        sampler.stop()
+
+
+def test_sampler_rejects_invalid_interval():
+    """Test that a non-positive interval is rejected."""
+    with pytest.raises(ValueError):
+        MetricsSampler(MetricsCollector(), interval=0)
+
+
+def test_create_app_starts_and_stops_sampler():
+    """Test that create_app wires the sampler lifecycle."""
+
+    class SamplingConfig(TestingConfig):
+        METRICS_SAMPLER_ENABLED = True
+        METRICS_INTERVAL = 60
+
+    from app import stop_services
+
+    app = create_app(SamplingConfig)
+    sampler = app.extensions['metrics_sampler']
+    try:
+        assert sampler.running
+        assert _wait_for(lambda: MetricsCollector()._latest is not None)
+    finally:
+        stop_services(app)
+
+    assert not sampler.running
+    assert 'metrics_sampler' not in app.extensions
+
+
+def test_create_app_samples_with_collector_plugins():
+    """Test that COLLECTORS drives plugins and sampling from one timer wheel."""
+
+    class PluginConfig(TestingConfig):
+        METRICS_SAMPLER_ENABLED = True
+        METRICS_INTERVAL = 60
+        COLLECTORS = 'cpu:1,memory:1,disk:10,network:1'
+        COLLECTOR_TICK = 0.01
+
+    from app import stop_services
+
+    collector = MetricsCollector()
+    app = create_app(PluginConfig)
+    wheel = app.extensions['metrics_sampler']
+    try:
+        assert _wait_for(lambda: wheel.stats()['collector.cpu']['runs'] >= 3)
+        assert wheel.stats()['metrics.sample']['runs'] == 1
+        assert 'interfaces' in collector.get_latest()
+    finally:
+        stop_services(app)
+        collector.set_source(None)
+
+    assert not wheel.running
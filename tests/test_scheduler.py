@@ -0,0 +1,81 @@
+"""Tests for the background job scheduler."""
+
+import time
+
+import pytest
+from app.services.scheduler import JobScheduler
+
+
+def _echo(value, delay=0.0):
+    time.sleep(delay)
+    return value
+
+
+def _busy(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+    return 'done'
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = JobScheduler(max_workers=1, budget=5.0)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_results_are_published(scheduler):
+    """Test that a finished job's result is published with its version."""
+    scheduler.submit('cpu', _echo, {'trend': 'stable'}, version=7)
+
+    assert scheduler.wait(timeout=30)
+    result = scheduler.results['cpu']
+    assert result.value == {'trend': 'stable'}
+    assert result.version == 7
+    assert scheduler.generation == 1
+
+
+def test_published_results_are_immutable_snapshots(scheduler):
+    """Test that readers keep a consistent snapshot across publishes."""
+    scheduler.submit('cpu', _echo, 1)
+    scheduler.wait(timeout=30)
+    snapshot = scheduler.results
+
+    scheduler.submit('memory', _echo, 2)
+    scheduler.wait(timeout=30)
+
+    assert snapshot.keys() == {'cpu'}
+    assert scheduler.results.keys() == {'cpu', 'memory'}
+    with pytest.raises(TypeError):
+        snapshot['disk'] = 3
+
+
+def test_newer_job_supersedes_older(scheduler):
+    """Test cancel-on-supersede: only the latest job for a key publishes."""
+    scheduler.submit('cpu', _echo, 'running', 0.5)
+    scheduler.submit('cpu', _echo, 'queued')
+    scheduler.submit('cpu', _echo, 'latest')
+
+    assert scheduler.wait(timeout=30)
+    # Give the superseded running job time to finish and be discarded
+    time.sleep(0.6)
+    assert scheduler.results['cpu'].value == 'latest'
+    assert scheduler.generation == 1
+    assert scheduler.superseded == 2
+
+
+def test_job_over_budget_is_interrupted(scheduler):
+    """Test that a job past its time budget fails without publishing."""
+    scheduler.budget = 0.2
+    started = time.monotonic()
+    scheduler.submit('cpu', _busy, 10)
+
+    assert scheduler.wait(timeout=30)
+    assert time.monotonic() - started < 5
+    assert 'cpu' not in scheduler.results
+    assert scheduler.failed == 1
+
+    scheduler.submit('cpu', _echo, 'ok')
+    assert scheduler.wait(timeout=30)
+    assert scheduler.results['cpu'].value == 'ok'
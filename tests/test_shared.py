@@ -0,0 +1,112 @@
+"""Tests for history shared between processes."""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+from app.services.shared import SharedRingBuffer
+
+FIELDS = ('a', 'b')
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'metrics.buf')
+
+
+def test_first_opener_becomes_writer(path):
+    """Test that exactly one handle holds the writer role."""
+    writer = SharedRingBuffer(path, FIELDS, 8)
+    reader = SharedRingBuffer(path, FIELDS, 8)
+    try:
+        assert writer.is_writer
+        assert not reader.is_writer
+        assert not reader.try_acquire_writer()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_sees_writer_samples(path):
+    """Test that appends are visible to another handle as copies."""
+    writer = SharedRingBuffer(path, FIELDS, 4)
+    reader = SharedRingBuffer(path, FIELDS, 4)
+    try:
+        for i in range(6):
+            writer.append(float(i), {'a': i, 'b': -i})
+
+        total, columns = reader.snapshot()
+        assert total == 6
+        assert columns['a'].tolist() == [2.0, 3.0, 4.0, 5.0]
+        assert columns['timestamp'].tolist() == [2.0, 3.0, 4.0, 5.0]
+        assert not np.shares_memory(columns['a'], reader._data)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_cannot_write(path):
+    """Test that readers are rejected when appending."""
+    writer = SharedRingBuffer(path, FIELDS, 4)
+    reader = SharedRingBuffer(path, FIELDS, 4)
+    try:
+        with pytest.raises(RuntimeError):
+            reader.append(0.0, {'a': 1})
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_reader_takes_over_when_writer_closes(path):
+    """Test writer failover keeps the existing samples."""
+    writer = SharedRingBuffer(path, FIELDS, 4)
+    reader = SharedRingBuffer(path, FIELDS, 4)
+    writer.append(1.0, {'a': 1})
+    writer.close()
+    try:
+        assert reader.try_acquire_writer()
+        reader.append(2.0, {'a': 2})
+        assert reader.column('a').tolist() == [1.0, 2.0]
+    finally:
+        reader.close()
+
+
+def test_published_blob(path):
+    """Test that published state round-trips to readers."""
+    writer = SharedRingBuffer(path, FIELDS, 4)
+    reader = SharedRingBuffer(path, FIELDS, 4)
+    try:
+        assert reader.read_published() == (0, None)
+        writer.publish(b'{"x": 1}')
+        seq, payload = reader.read_published()
+        assert payload == b'{"x": 1}'
+        assert seq > 0
+        with pytest.raises(ValueError):
+            writer.publish(b'x' * (writer.blob_size + 1))
+    finally:
+        reader.close()
+        writer.close()
+
+
+def _append_in_child(path, count):
+    child = SharedRingBuffer(path, FIELDS, 16)
+    assert child.is_writer
+    for i in range(count):
+        child.append(float(i), {'a': i, 'b': i})
+    child.close()
+
+
+def test_samples_cross_process_boundary(path):
+    """Test that a writer in another process is visible to this one."""
+    ctx = multiprocessing.get_context('fork')
+    process = ctx.Process(target=_append_in_child, args=(path, 5))
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+    reader = SharedRingBuffer(path, FIELDS, 16)
+    try:
+        assert reader.total == 5
+        assert reader.column('b').tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    finally:
+        reader.close()
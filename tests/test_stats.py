@@ -0,0 +1,81 @@
+"""Tests for incremental sliding-window statistics."""
+
+import numpy as np
+import pytest
+from app.services.stats import HistogramSketch, RollingStats
+
+
+def test_rolling_stats_match_numpy():
+    """Test that sliding aggregates agree with a full recomputation."""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 100, 500)
+    capacity = 50
+    stats = RollingStats(capacity)
+
+    for i, value in enumerate(values):
+        evicted = values[i - capacity] if i >= capacity else None
+        stats.update(float(value), evicted)
+
+        window = values[max(0, i - capacity + 1):i + 1]
+        summary = stats.summary()
+        assert summary['current'] == value
+        assert summary['avg'] == pytest.approx(window.mean())
+        assert summary['std'] == pytest.approx(window.std(), abs=1e-6)
+        assert summary['min'] == window.min()
+        assert summary['max'] == window.max()
+
+    assert stats.count == capacity
+
+
+def test_rolling_stats_percentiles():
+    """Test that percentiles are accurate to the sketch resolution."""
+    values = np.linspace(0, 100, 1001)
+    stats = RollingStats(len(values))
+    for value in values:
+        stats.update(float(value))
+
+    summary = stats.summary()
+    assert summary['p50'] == pytest.approx(50, abs=0.1)
+    assert summary['p95'] == pytest.approx(95, abs=0.1)
+    assert summary['p99'] == pytest.approx(99, abs=0.1)
+
+
+def test_rolling_stats_empty_and_clear():
+    """Test that an empty or cleared window has no summary."""
+    stats = RollingStats(10)
+    assert stats.summary() == {}
+
+    stats.update(5.0)
+    stats.clear()
+    assert stats.summary() == {}
+    assert stats.variance == 0.0
+
+
+def test_histogram_sketch_clamps_out_of_range():
+    """Test that values outside the range land in the edge bins."""
+    sketch = HistogramSketch(0, 100)
+    sketch.add(-5)
+    sketch.add(150)
+
+    assert sketch.quantile(0.0) == 0
+    assert sketch.quantile(1.0) == 100
+
+    sketch.remove(-5)
+    sketch.remove(150)
+    assert sketch.quantile(0.5) is None
+
+
+def test_rolling_stats_skip_missing_values():
+    """Test that NaN takes a window slot without affecting statistics."""
+    stats = RollingStats(2)
+    stats.update(10.0)
+    stats.update(float('nan'), None)
+    assert stats.summary()['avg'] == 10.0
+
+    stats.update(30.0, 10.0)
+    stats.update(40.0, float('nan'))
+
+    summary = stats.summary()
+    assert stats.count == 2
+    assert summary['min'] == 30.0
+    assert summary['avg'] == pytest.approx(35.0)
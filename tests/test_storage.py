@@ -0,0 +1,119 @@
+"""Tests for the persistent time-series store."""
+
+import os
+
+import numpy as np
+import pytest
+from app.services.storage import TimeSeriesStore
+
+FIELDS = ('cpu_percent', 'memory_percent')
+# An hour boundary, so rollup buckets line up with the samples
+T0 = 1_767_225_600.0
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'store')
+
+
+def _fill(store, seconds, step=1):
+    for i in range(0, seconds, step):
+        store.append(T0 + i, {'cpu_percent': float(i % 60), 'memory_percent': 50.0})
+
+
+def test_raw_query_returns_range(store_path):
+    """Test that raw queries are inclusive on both ends."""
+    store = TimeSeriesStore(store_path, FIELDS, segment_records=16)
+    _fill(store, 100)
+
+    tier, columns = store.query(T0 + 10, T0 + 40, tier='raw')
+
+    assert tier == 'raw'
+    assert columns['timestamp'][0] == T0 + 10
+    assert columns['timestamp'][-1] == T0 + 40
+    assert len(columns['cpu_percent']) == 31
+
+
+def test_rollups_hold_min_max_mean_count(store_path):
+    """Test that closed minute buckets are aggregated correctly."""
+    store = TimeSeriesStore(store_path, FIELDS)
+    _fill(store, 181)
+
+    _, columns = store.query(T0, T0 + 3600, tier='1m')
+
+    assert columns['timestamp'].tolist() == [T0, T0 + 60, T0 + 120]
+    assert columns['count'].tolist() == [60, 60, 60]
+    assert columns['cpu_percent'][0] == pytest.approx(29.5)
+    assert columns['cpu_percent_min'][0] == 0
+    assert columns['cpu_percent_max'][0] == 59
+
+
+def test_long_range_reads_rollup_tier(store_path):
+    """Test that tier selection honors max_points."""
+    store = TimeSeriesStore(store_path, FIELDS)
+    _fill(store, 2 * 3600 + 1, step=5)
+    now = T0 + 2 * 3600
+
+    assert store.select_tier(T0, now, max_points=10000, now=now) == 'raw'
+    assert store.select_tier(T0, now, max_points=500, now=now) == '1m'
+    assert store.select_tier(T0, now, max_points=10, now=now) == '1h'
+
+
+def test_tier_selection_skips_expired_tiers(store_path):
+    """Test that a range older than raw retention is not read from raw."""
+    store = TimeSeriesStore(store_path, FIELDS, retention={'raw': 60})
+
+    assert store.select_tier(T0, T0 + 10, now=T0 + 3600) == '1m'
+
+
+def test_retention_deletes_old_segments(store_path):
+    """Test that segments past retention are removed on rollover."""
+    store = TimeSeriesStore(store_path, FIELDS, retention={'raw': 50}, segment_records=10)
+    _fill(store, 200)
+
+    raw_dir = os.path.join(store_path, 'raw')
+    _, columns = store.query(T0, T0 + 200, tier='raw')
+    assert len(os.listdir(raw_dir)) <= 8
+    assert columns['timestamp'][0] >= T0 + 200 - 50 - 10
+
+
+def test_read_only_store_releases_deleted_segments(store_path):
+    """Test that a reader drops its mappings of segments the writer deleted."""
+    writer = TimeSeriesStore(store_path, FIELDS, retention={'raw': 50}, segment_records=10)
+    _fill(writer, 30)
+    reader = TimeSeriesStore(store_path, FIELDS, read_only=True)
+    assert len(reader.query(T0, T0 + 30, tier='raw')[1]['timestamp']) == 30
+    assert len(reader._segments['raw']) == 3
+
+    for i in range(30, 200):
+        writer.append(T0 + i, {'cpu_percent': 1.0, 'memory_percent': 50.0})
+    _, columns = reader.query(T0, T0 + 200, tier='raw')
+
+    on_disk = set(os.listdir(os.path.join(store_path, 'raw')))
+    assert set(reader._segments['raw']) <= on_disk
+    assert columns['timestamp'][0] >= T0 + 200 - 50 - 10
+
+
+def test_reopen_restores_history_and_buckets(store_path):
+    """Test that a restart resumes open rollup buckets without duplicates."""
+    store = TimeSeriesStore(store_path, FIELDS)
+    _fill(store, 90)
+    store.flush()
+
+    reopened = TimeSeriesStore(store_path, FIELDS)
+    for i in range(90, 121):
+        reopened.append(T0 + i, {'cpu_percent': float(i % 60), 'memory_percent': 50.0})
+
+    _, columns = reopened.query(T0, T0 + 3600, tier='1m')
+    assert columns['count'].tolist() == [60, 60]
+    assert reopened.tail(3)['timestamp'].tolist() == [T0 + 118, T0 + 119, T0 + 120]
+
+
+def test_read_only_store_rejects_appends(store_path):
+    """Test that a read-only store can query but not write."""
+    TimeSeriesStore(store_path, FIELDS)
+    reader = TimeSeriesStore(store_path, FIELDS, read_only=True)
+
+    with pytest.raises(RuntimeError):
+        reader.append(T0, {'cpu_percent': 1.0})
+    assert len(reader.query(T0, T0 + 1, tier='raw')[1]['timestamp']) == 0
@@ -0,0 +1,109 @@
+"""Tests for streaming anomaly scoring."""
+
+import numpy as np
+import pytest
+from app.services.metrics import MetricsCollector
+from app.services.streaming import HalfSpaceTrees, RobustEWMA, StreamingAnomalyDetector
+
+
+def _normal_sample(rng):
+    return {
+        'cpu_percent': 50 + rng.normal(0, 2),
+        'memory_percent': 60 + rng.normal(0, 1),
+        'disk_percent': 40.0,
+    }
+
+
+def test_robust_ewma_flags_spike_without_shifting_baseline():
+    """Test that a spike scores high but barely moves the baseline."""
+    ewma = RobustEWMA(1)
+    for _ in range(50):
+        ewma.score(np.array([50.0]))
+    baseline = ewma._mean.copy()
+
+    z = ewma.score(np.array([90.0]))
+
+    assert z[0] > 10
+    assert ewma._mean[0] - baseline[0] < 1.0
+
+
+def test_robust_ewma_skips_missing_values():
+    """Test that NaN scores 0 and leaves the baseline usable."""
+    ewma = RobustEWMA(2)
+    first = ewma.score(np.array([np.nan, 40.0]))
+    for _ in range(50):
+        ewma.score(np.array([50.0, 40.0]))
+
+    missing = ewma.score(np.array([np.nan, 40.0]))
+    z = ewma.score(np.array([90.0, 40.0]))
+
+    assert first.tolist() == [0.0, 0.0] and missing.tolist() == [0.0, 0.0]
+    assert np.isfinite(ewma._mean).all()
+    assert z[0] > 10
+
+
+def test_half_space_trees_score_sparse_regions_lower():
+    """Test that points far from the reference data get less mass."""
+    rng = np.random.default_rng(0)
+    trees = HalfSpaceTrees(2, window_size=100)
+    for _ in range(200):
+        trees.score_and_update(rng.normal(0.5, 0.02, 2).clip(0, 1))
+
+    assert trees.ready
+    dense = trees.score_and_update(np.array([0.5, 0.5]))
+    sparse = trees.score_and_update(np.array([0.95, 0.05]))
+    assert sparse < dense
+
+
+def test_detector_flags_outlier_after_warmup():
+    """Test that an extreme sample is flagged once warm."""
+    rng = np.random.default_rng(0)
+    detector = StreamingAnomalyDetector(window_size=50)
+    for _ in range(100):
+        detector.score(_normal_sample(rng))
+
+    result = detector.score({'cpu_percent': 99, 'memory_percent': 60, 'disk_percent': 40})
+
+    assert result['anomaly'] == 1.0
+    assert result['anomaly_score'] > detector.threshold
+
+
+def test_detector_does_not_flag_during_warmup():
+    """Test that nothing is flagged before warmup completes."""
+    detector = StreamingAnomalyDetector(warmup=5)
+    results = [detector.score({'cpu_percent': v}) for v in (10, 90, 10, 90, 10)]
+
+    assert all(r['anomaly'] == 0.0 for r in results)
+
+
+def test_collector_stores_scores_with_samples():
+    """Test that enricher output is stored in history and looked up."""
+    collector = MetricsCollector()
+    detector = StreamingAnomalyDetector(warmup=10)
+    rng = np.random.default_rng(0)
+    collector._enrichers, saved = [], collector._enrichers
+    collector.add_enricher(detector.enrich)
+    try:
+        for i in range(20):
+            sample = _normal_sample(rng)
+            if i == 15:
+                sample['cpu_percent'] = 99.0
+            collector._record(float(i), {**sample, 'network': {}})
+
+        window = collector.get_window()
+        assert not np.isnan(window['anomaly_score']).any()
+
+        result = detector.detect(window)
+        assert result['status'] == 'ok'
+        assert [a['index'] for a in result['anomalies']] == [15]
+        assert collector.get_history()[15]['anomaly'] == 1.0
+    finally:
+        collector._enrichers = saved
+
+
+def test_detect_insufficient_data():
+    """Test lookup with fewer samples than the warmup."""
+    detector = StreamingAnomalyDetector()
+    window = {'timestamp': np.arange(3.0), 'anomaly': np.zeros(3), 'anomaly_score': np.zeros(3)}
+
+    assert detector.detect(window)['status'] == 'insufficient_data'
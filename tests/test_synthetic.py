@@ -0,0 +1,80 @@
+"""Tests for the synthetic metrics source."""
+
+import numpy as np
+import pytest
+from app.services.metrics import METRIC_FIELDS, MetricsCollector
+from app.services.synthetic import SyntheticMetrics
+
+
+@pytest.fixture
+def collector():
+    collector = MetricsCollector()
+    yield collector
+    collector.set_source(None)
+    collector.set_history_size(100)
+
+
+def test_columns_are_deterministic_and_sliceable():
+    """Test that any slice of the series is generated identically."""
+    _, full = SyntheticMetrics(seed=3).columns(1000)
+    _, again = SyntheticMetrics(seed=3).columns(1000)
+    _, part = SyntheticMetrics(seed=3).generate(400, 100)
+    _, other = SyntheticMetrics(seed=4).columns(1000)
+
+    for name in METRIC_FIELDS:
+        np.testing.assert_array_equal(full[name], again[name])
+        np.testing.assert_array_equal(full[name][400:500], part[name])
+    assert not np.array_equal(full['cpu_percent'], other['cpu_percent'])
+
+
+def test_values_are_plausible():
+    """Test ranges, spikes and monotonic counters."""
+    _, columns = SyntheticMetrics(spike_rate=0.01).columns(20000)
+
+    for name in ('cpu_percent', 'memory_percent', 'disk_percent'):
+        assert columns[name].min() >= 0 and columns[name].max() <= 100
+    assert 0.005 < np.mean(columns['cpu_percent'] >= 95) < 0.02
+    assert np.all(np.diff(columns['packets_sent']) > 0)
+
+
+def test_source_matches_read_metrics_shape():
+    """Test that samples look like psutil samples and follow the series."""
+    source = SyntheticMetrics()
+    timestamps, columns = source.columns(2)
+    real_ts, real = MetricsCollector.read_metrics()
+
+    ts, sample = source()
+    source()
+
+    assert set(sample) == set(real)
+    assert set(sample['network']) == set(real['network'])
+    assert ts == timestamps[0]
+    assert sample['cpu_percent'] == columns['cpu_percent'][0]
+    assert source.position == 2
+
+
+def test_collector_reads_from_source(collector):
+    """Test that a source replaces psutil in get_current_metrics."""
+    source = SyntheticMetrics()
+    collector.set_source(source)
+
+    metrics = collector.get_current_metrics()
+
+    assert metrics['memory_total'] == 16 * 1024 ** 3
+    assert collector.get_latest() is metrics
+
+
+def test_extend_history_rebuilds_summary(collector):
+    """Test bulk-loading synthetic history into the collector."""
+    collector.set_history_size(500)
+    timestamps, columns = SyntheticMetrics().columns(800)
+
+    collector.extend_history(timestamps, columns)
+
+    window = collector.get_window()
+    assert len(window['timestamp']) == 500
+    np.testing.assert_array_equal(window['cpu_percent'], columns['cpu_percent'][-500:])
+    assert np.isnan(window['anomaly_score']).all()
+    summary = collector.get_summary()
+    assert summary['samples'] == 500
+    assert summary['cpu']['max'] == pytest.approx(columns['cpu_percent'][-500:].max())
@@ -0,0 +1,135 @@
+"""Tests for the timer wheel scheduler."""
+
+import threading
+import time
+
+import pytest
+from app.services.wheel import TimerWheel
+
+
+def _record(runs, name, seconds=0.0):
+    def job():
+        runs.append(name)
+        if seconds:
+            time.sleep(seconds)
+    return job
+
+
+def test_jobs_run_at_their_intervals():
+    """Test that each job runs on the first tick and then every period."""
+    wheel = TimerWheel(tick=1.0, slots=4)
+    runs = []
+    wheel.schedule('fast', 1, _record(runs, 'fast'))
+    wheel.schedule('slow', 3, _record(runs, 'slow'))
+    # Longer than the wheel: waits for later turns of its slot
+    wheel.schedule('rare', 6, _record(runs, 'rare'))
+
+    ticks = [wheel.run_tick() for _ in range(7)]
+
+    assert ticks[0] == ['fast', 'slow', 'rare']
+    assert [tick.count('fast') for tick in ticks] == [1] * 7
+    assert [i for i, tick in enumerate(ticks) if 'slow' in tick] == [0, 3, 6]
+    assert [i for i, tick in enumerate(ticks) if 'rare' in tick] == [0, 6]
+
+
+def test_jobs_cancel_and_reschedule_while_running():
+    """Test cancelling from inside a running job, of itself and of others."""
+    wheel = TimerWheel(tick=1.0, slots=4)
+    runs = []
+
+    def once():
+        runs.append('once')
+        wheel.cancel('once')
+
+    def again():
+        runs.append('again')
+        wheel.schedule('again', 2, again)
+
+    def cancel_later():
+        runs.append('cancel_later')
+        wheel.cancel('later')
+
+    wheel.schedule('once', 1, once)
+    wheel.schedule('again', 1, again)
+    wheel.schedule('cancel_later', 1, cancel_later)
+    wheel.schedule('later', 2, _record(runs, 'later'))
+
+    ticks = [wheel.run_tick() for _ in range(4)]
+
+    # Rescheduling runs a job on the next tick, after the shorter periods
+    assert ticks == [['once', 'again', 'cancel_later']] + [['cancel_later', 'again']] * 3
+    assert 'later' not in runs
+    assert set(wheel.stats()) == {'again', 'cancel_later'}
+
+
+def test_budget_defers_long_period_jobs():
+    """Test that over-budget work moves to the next tick, shortest period first."""
+    wheel = TimerWheel(tick=1.0, budget=0.01)
+    runs = []
+    wheel.schedule('expensive', 30, _record(runs, 'expensive', 0.02))
+    wheel.schedule('other', 30, _record(runs, 'other'))
+    wheel.schedule('cheap', 1, _record(runs, 'cheap'))
+
+    first = wheel.run_tick()
+    second = wheel.run_tick()
+
+    assert first == ['cheap', 'expensive']
+    assert second == ['cheap', 'other']
+    assert wheel.stats()['other']['deferred'] == 1
+    assert wheel.stats()['expensive']['last_duration_ms'] >= 20
+
+
+def test_cancel_and_replace():
+    """Test that cancelled jobs stop and rescheduling replaces a job."""
+    wheel = TimerWheel()
+    runs = []
+    wheel.schedule('job', 1, _record(runs, 'old'))
+    wheel.schedule('job', 1, _record(runs, 'new'))
+    wheel.schedule('gone', 1, _record(runs, 'gone'))
+    wheel.cancel('gone')
+
+    wheel.run_tick()
+    wheel.run_tick()
+
+    assert runs == ['new', 'new']
+    assert set(wheel.stats()) == {'job'}
+
+
+def test_failing_job_keeps_its_schedule():
+    """Test that an exception is logged and the job runs again."""
+    wheel = TimerWheel()
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError('boom')
+
+    wheel.schedule('failing', 1, failing)
+    wheel.run_tick()
+    wheel.run_tick()
+
+    assert len(calls) == 2
+
+
+def test_thread_ticks_until_stopped():
+    """Test the background thread."""
+    wheel = TimerWheel(tick=0.01)
+    ran = threading.Event()
+    wheel.schedule('job', 0.01, ran.set)
+
+    wheel.start()
+    try:
+        assert ran.wait(5)
+        assert wheel.running
+    finally:
+        wheel.stop(timeout=5)
+
+    assert not wheel.running
+
+
+def test_invalid_settings_are_rejected():
+    """Test that non-positive ticks and intervals raise."""
+    with pytest.raises(ValueError):
+        TimerWheel(tick=0)
+    with pytest.raises(ValueError):
+        TimerWheel().schedule('job', 0, lambda: None)